@@ -1,19 +1,89 @@
-from sqlalchemy import create_engine
+from typing import Any, Dict, Optional
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.schema import CreateTable
 from .settings import settings # Importa a instância 'settings' configurada
 
 # Obtém a URL do banco de dados a partir do objeto settings.
 # 'settings' já terá carregado a DATABASE_URL de variáveis de ambiente ou do .env.
 DB_URL_FROM_SETTINGS = settings.DATABASE_URL
 
-engine_args = {}
-# Adiciona connect_args específico para SQLite.
-# Para PostgreSQL ou outros bancos, esses argumentos não são necessários ou podem ser diferentes.
-if DB_URL_FROM_SETTINGS.startswith("sqlite"):
-    engine_args["connect_args"] = {"check_same_thread": False}
+def _sqlite_em_memoria(url) -> bool:
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
 
-# Cria a engine do SQLAlchemy usando a URL e quaisquer argumentos específicos.
-engine = create_engine(DB_URL_FROM_SETTINGS, **engine_args)
+def engine_options(database_url: str, profile: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Argumentos de create_engine do perfil de armazenamento (DATABASE_PROFILE).
+
+    Perfis:
+        "auto"  - ajustado conforme o banco da URL. SQLite: pool de conexões
+                  dimensionado (StaticPool para banco em memória, compartilhado
+                  entre threads); os pragmas vêm de _aplicar_pragmas_sqlite.
+                  PostgreSQL e demais: pool dimensionado, com pre-ping e reciclagem.
+        "basic" - engine sem ajustes (apenas check_same_thread=False no SQLite)
+    """
+    url = make_url(database_url)
+    profile = (profile or settings.DATABASE_PROFILE).lower()
+    engine_args: Dict[str, Any] = {}
+    # Adiciona connect_args específico para SQLite.
+    if url.get_backend_name() == "sqlite":
+        engine_args["connect_args"] = {"check_same_thread": False}
+        if profile == "basic":
+            return engine_args
+        if _sqlite_em_memoria(url):
+            engine_args["poolclass"] = StaticPool
+        else:
+            engine_args.update(
+                poolclass=QueuePool,
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS
+            )
+        return engine_args
+
+    if profile == "basic":
+        return engine_args
+    engine_args.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=True
+    )
+    return engine_args
+
+def _aplicar_pragmas_sqlite(dbapi_connection, connection_record) -> None:
+    """
+    Pragmas de cada conexão SQLite do perfil "auto".
+
+    Em WAL, leitores não bloqueiam o gravador nem são bloqueados por ele, o que
+    importa com vários workers do gunicorn no mesmo arquivo; synchronous=NORMAL
+    é seguro em WAL (uma queda de energia pode perder só a última transação).
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")  # Negativo: tamanho em KiB
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE_BYTES}")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+def build_engine(database_url: str, profile: Optional[str] = None):
+    """Cria a engine com o perfil de armazenamento (ver engine_options)"""
+    profile = (profile or settings.DATABASE_PROFILE).lower()
+    engine = create_engine(database_url, **engine_options(database_url, profile))
+    if engine.dialect.name == "sqlite" and profile != "basic":
+        event.listen(engine, "connect", _aplicar_pragmas_sqlite)
+    return engine
+
+# Cria a engine do SQLAlchemy usando a URL e o perfil configurado.
+engine = build_engine(DB_URL_FROM_SETTINGS)
 
 # Cria uma fábrica de sessões (SessionLocal) que será usada para criar sessões de banco de dados.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -30,4 +100,116 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def upgrade_schema(tables, bind=None) -> None:
+    """
+    Acrescenta às tabelas já existentes as colunas e os índices novos do modelo
+    e remove NOT NULL das colunas que passaram a aceitar nulo. No PostgreSQL,
+    converte para JSONB as colunas JSON que o modelo passou a declarar como JSONB.
+
+    `create_all` só cria tabelas ausentes; bancos criados por versões anteriores
+    precisam receber as colunas novas (com o server_default do modelo) e os índices.
+    O SQLite não altera restrições de coluna, então a tabela é recriada com os dados.
+
+    Args:
+        tables: Tabelas do modelo (Model.__table__) a verificar
+        bind: Engine a usar (padrão: engine da aplicação)
+    """
+    bind = bind or engine
+    for table in tables:
+        inspector = inspect(bind)
+        if not inspector.has_table(table.name):
+            continue
+        existentes = {coluna["name"]: coluna for coluna in inspector.get_columns(table.name)}
+        with bind.begin() as conn:
+            for coluna in table.columns:
+                if coluna.name in existentes:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {coluna.name} {coluna.type.compile(dialect=bind.dialect)}"
+                if coluna.server_default is not None:
+                    ddl += f" DEFAULT '{coluna.server_default.arg}'"
+                if not coluna.nullable:
+                    ddl += " NOT NULL"
+                conn.execute(text(ddl))
+
+            if bind.dialect.name == "postgresql":
+                # Colunas JSON que o modelo agora declara como JSONB
+                for coluna in table.columns:
+                    if (
+                        coluna.name in existentes
+                        and coluna.type.compile(dialect=bind.dialect) == "JSONB"
+                        and str(existentes[coluna.name]["type"]).upper() != "JSONB"
+                    ):
+                        conn.execute(text(
+                            f"ALTER TABLE {table.name} ALTER COLUMN {coluna.name} TYPE JSONB USING {coluna.name}::jsonb"
+                        ))
+
+            relaxar = [
+                coluna.name for coluna in table.columns
+                if coluna.name in existentes and coluna.nullable and not existentes[coluna.name]["nullable"]
+            ]
+            if bind.dialect.name != "sqlite":
+                for nome in relaxar:
+                    conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {nome} DROP NOT NULL"))
+        if relaxar and bind.dialect.name == "sqlite":
+            _recriar_tabela_sqlite(bind, table)
+        for indice in table.indexes:
+            indice.create(bind=bind, checkfirst=True)
+
+def _recriar_tabela_sqlite(bind, table) -> None:
+    """
+    Recria a tabela com a definição atual do modelo, copiando as linhas existentes
+    (procedimento da documentação do SQLite para alterações de tabela).
+
+    As chaves estrangeiras ficam desligadas durante a recriação (o pragma só
+    muda fora de transação) e a tabela nova é criada com outro nome e renomeada
+    depois de a antiga sair: renomear a antiga faria o SQLite reescrever para
+    ela as chaves estrangeiras das outras tabelas.
+    """
+    nova = f"{table.name}__nova"
+    with bind.connect() as conn:
+        chaves_estrangeiras = conn.execute(text("PRAGMA foreign_keys")).scalar()
+        conn.execute(text("PRAGMA foreign_keys=OFF"))
+        conn.commit()
+        try:
+            for indice in inspect(conn).get_indexes(table.name):
+                conn.execute(text(f"DROP INDEX IF EXISTS {indice['name']}"))
+            ddl = str(CreateTable(table).compile(dialect=conn.dialect)).replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {nova} ", 1)
+            conn.execute(text(ddl))
+            colunas = ", ".join(coluna.name for coluna in table.columns)
+            conn.execute(text(f"INSERT INTO {nova} ({colunas}) SELECT {colunas} FROM {table.name}"))
+            conn.execute(text(f"DROP TABLE {table.name}"))
+            conn.execute(text(f"ALTER TABLE {nova} RENAME TO {table.name}"))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute(text(f"PRAGMA foreign_keys={chaves_estrangeiras}"))
+            conn.commit()
+
+def optimize_database(tables, vacuum: bool = False, bind=None) -> None:
+    """
+    Atualiza as estatísticas do planejador (ANALYZE) das tabelas e, se pedido,
+    devolve ao sistema o espaço liberado por remoções (VACUUM).
+
+    VACUUM não roda dentro de transação, por isso a conexão usa AUTOCOMMIT.
+    No SQLite ele reescreve o arquivo inteiro; no PostgreSQL é o VACUUM comum
+    (sem FULL), que não bloqueia leituras nem gravações.
+
+    Args:
+        tables: Tabelas do modelo (Model.__table__) a analisar
+        vacuum: Executar VACUUM antes do ANALYZE
+        bind: Engine a usar (padrão: engine da aplicação)
+    """
+    bind = bind or engine
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if vacuum:
+            if bind.dialect.name == "sqlite":
+                conn.execute(text("VACUUM"))
+            else:
+                for table in tables:
+                    conn.execute(text(f"VACUUM {table.name}"))
+        for table in tables:
+            conn.execute(text(f"ANALYZE {table.name}"))
@@ -14,6 +14,60 @@ class Settings(BaseSettings):
     DATABASE_URL: str  # Obrigatório: URL de conexão com o banco de dados
     JWT_SECRET: str    # Obrigatório: Chave secreta para JWT
 
+    # Modo de atendimento de GET /viticultura/dados:
+    #   "live" - raspa a Embrapa a cada requisição (comportamento original)
+    #   "swr"  - stale-while-revalidate: responde do banco e atualiza em background
+    #            quando os dados têm mais de VITICULTURA_MAX_AGE_SECONDS
+    VITICULTURA_SERVE_MODE: str = "live"
+    VITICULTURA_MAX_AGE_SECONDS: int = 6 * 60 * 60
+    # POST /viticultura/dados-especificos reaproveita as seções do banco mais novas
+    # que isto e raspa só as ausentes ou vencidas (0 = sempre raspar tudo). Vale só
+    # para os anos na janela de revisão (DELTA_REVISION_YEARS); anos fechados
+    # armazenados não vencem
+    DADOS_ESPECIFICOS_MAX_AGE_SECONDS: int = 6 * 60 * 60
+
+    # Cache em memória dos resultados de consultas ao banco (invalidado a cada gravação)
+    QUERY_CACHE_MAX_ENTRIES: int = 256     # 0 desativa o cache
+    QUERY_CACHE_TTL_SECONDS: int = 5 * 60  # Limita a defasagem quando outro worker grava
+
+    # Linhas por INSERT de várias linhas na gravação em lote (save_bulk)
+    SAVE_BULK_BATCH_SIZE: int = 1000
+
+    # Gravador único do processo (fila limitada de salvamentos das raspagens)
+    PERSISTENCE_QUEUE_MAX_SIZE: int = 64               # Salvamentos pendentes antes de aplicar contrapressão
+    PERSISTENCE_QUEUE_PUT_TIMEOUT_SECONDS: float = 5.0  # Espera por vaga na fila antes de recusar
+    PERSISTENCE_WRITER_MAX_BATCH: int = 5000           # Seções juntadas em uma transação
+    PERSISTENCE_WRITER_RETRIES: int = 3                # Tentativas quando o banco está bloqueado
+
+    # Retenção do histórico de raspagens (viticultura_data)
+    RETENTION_KEEP_DAYS: int = 90                 # Versões mais novas que isto são todas mantidas
+    RETENTION_MONTHLY_CHECKPOINTS: bool = True    # Antes disso, mantém a última versão do mês de cada seção
+    RETENTION_BATCH_SIZE: int = 1000              # Versões examinadas por transação
+    RETENTION_INTERVAL_SECONDS: int = 0           # Execução periódica na API (0 = desativada)
+    RETENTION_VACUUM_MIN_DELETED: int = 10000     # Versões removidas a partir das quais roda VACUUM
+
+    # Fila de jobs de raspagem (POST /viticultura/jobs)
+    SCRAPE_JOB_WORKERS: int = 1            # Raspagens simultâneas por processo
+    SCRAPE_JOB_MAX_PENDING: int = 4        # Jobs ativos aceitos antes de responder 429
+    SCRAPE_JOB_STALE_SECONDS: int = 15 * 60  # Sem heartbeat por este tempo, o job é considerado morto
+    SCRAPE_JOB_HEARTBEAT_SECONDS: float = 30.0  # Intervalo do heartbeat (e da gravação do progresso) dos jobs locais
+    SCRAPE_JOB_MAX_WAIT_SECONDS: float = 60.0
+    SCRAPE_JOB_POLL_SECONDS: float = 1.0
+
+    # Perfil de armazenamento (config/database.py):
+    #   "auto"  - ajustes conforme o banco da DATABASE_URL (pragmas/WAL no SQLite, pool dimensionado)
+    #   "basic" - engine sem ajustes (comportamento original)
+    DATABASE_PROFILE: str = "auto"
+    SQLITE_JOURNAL_MODE: str = "wal"                   # Leitores não bloqueiam o gravador
+    SQLITE_SYNCHRONOUS: str = "normal"
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024              # Cache de páginas por conexão
+    SQLITE_MMAP_SIZE_BYTES: int = 256 * 1024 * 1024
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000                 # Espera pelo lock de escrita antes de "database is locked"
+    DB_POOL_SIZE: int = 5                              # Conexões mantidas por processo (worker)
+    DB_MAX_OVERFLOW: int = 10                          # Conexões extras em picos
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    DB_POOL_RECYCLE_SECONDS: int = 30 * 60             # Só no PostgreSQL: evita conexões encerradas pelo servidor
+
     # Configurações opcionais com valores padrão, se necessário:
     # API_V1_STR: str = "/api/v1"
     # PROJECT_NAME: str = "Vitibrasil API"
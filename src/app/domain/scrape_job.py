@@ -0,0 +1,25 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+# Estados de um job de raspagem
+JOB_PENDENTE = "pending"
+JOB_EM_EXECUCAO = "running"
+JOB_CONCLUIDO = "succeeded"
+JOB_FALHOU = "failed"
+JOB_STATUS_ATIVOS = (JOB_PENDENTE, JOB_EM_EXECUCAO)
+
+class ScrapeJobResponse(BaseModel):
+    id: int = Field(..., description="Identificador do job, usado em GET /viticultura/jobs/{id}")
+    tipo: str = Field(..., description="Modo da raspagem: 'full' ou 'delta'")
+    status: str = Field(..., description="'pending', 'running', 'succeeded' ou 'failed'")
+    paginas_total: Optional[int] = Field(None, description="Páginas planejadas (conhecido após o planejamento)")
+    secoes_processadas: int = Field(0, description="Seções raspadas até o momento")
+    secoes_salvas: int = Field(0, description="Seções gravadas no banco até o momento")
+    erro: Optional[str] = None
+    criado_em: datetime
+    iniciado_em: Optional[datetime] = None
+    concluido_em: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -34,6 +34,7 @@ class ViticulturaListResponse(BaseModel):
     fonte: str = Field(..., description="Fonte dos dados (e.g., 'Embrapa (Raspagem Ao Vivo)', 'Cache (BD)')")
     dados: List[ViticulturaResponse] = Field(..., description="Lista de entradas de dados de viticultura")
     message: Optional[str] = Field(None, description="Mensagem adicional")
+    next_cursor: Optional[str] = Field(None, description="Cursor da próxima página (parâmetro cursor); None na última página")
 
 class DadosEspecificosRequest(BaseModel):
     ano_min: int = Field(..., ge=1970, le=2023, description="Ano mínimo (1970-2023)")
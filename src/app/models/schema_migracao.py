@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, DateTime
+from src.app.config.database import Base
+from datetime import datetime
+
+
+class SchemaMigracao(Base):
+    """Versões de migração já aplicadas ao banco (ver migration_service)"""
+    __tablename__ = "schema_migracoes"
+
+    versao = Column(Integer, primary_key=True, autoincrement=False)
+    aplicada_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+    def __repr__(self):
+        return f"<SchemaMigracao(versao={self.versao}, aplicada_em={self.aplicada_em})>"
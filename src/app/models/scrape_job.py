@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from src.app.config.database import Base
+from datetime import datetime
+
+
+class ScrapeJob(Base):
+    __tablename__ = "scrape_jobs"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    tipo = Column(String, nullable=False)                          # Modo da raspagem: "full" ou "delta"
+    status = Column(String, nullable=False, index=True, default="pending")
+    # Chave de deduplicação: preenchida enquanto o job está pendente/em execução e
+    # limpa ao terminar, então o índice único impede dois jobs ativos iguais
+    chave_ativa = Column(String, unique=True, nullable=True)
+
+    paginas_total = Column(Integer, nullable=True)
+    secoes_processadas = Column(Integer, nullable=False, default=0)
+    secoes_salvas = Column(Integer, nullable=False, default=0)
+    erro = Column(String, nullable=True)
+
+    criado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+    iniciado_em = Column(DateTime, nullable=True)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, nullable=False)  # Heartbeat do worker
+    concluido_em = Column(DateTime, nullable=True)
+
+
+    def __repr__(self):
+        return f"<ScrapeJob(id={self.id}, tipo='{self.tipo}', status='{self.status}', secoes_salvas={self.secoes_salvas})>"
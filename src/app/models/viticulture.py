@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime
+from sqlalchemy import Column, Integer, String, JSON, DateTime, Float, ForeignKey, Index, PrimaryKeyConstraint
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship
 from src.app.config.database import Base
 from datetime import datetime
 
+# JSON no SQLite; JSONB no PostgreSQL (armazenamento binário, indexável com GIN)
+JSON_DOCUMENTO = JSON().with_variant(JSONB(), "postgresql")
 
 class Viticultura(Base):
     __tablename__ = "viticultura_data" # Using a more descriptive table name
@@ -11,10 +15,111 @@ class Viticultura(Base):
     ano = Column(Integer, index=True, nullable=False)
     aba = Column(String, index=True, nullable=False) 
     subopcao = Column(String, index=True, nullable=True) 
+    option_code = Column(String, nullable=True)          # opt_02..opt_06 (resolve_option_code da aba); '' se a aba não for reconhecida
+    subopcao_key = Column(String, nullable=False, default="", server_default="")  # Subopção normalizada; '' sem subopção
     
-    dados_list_json = Column(JSON, nullable=False) 
+    # Conteúdo da seção, armazenado uma única vez por hash (versões sem mudança apontam para o mesmo conteúdo)
+    conteudo_id = Column(Integer, ForeignKey("viticultura_conteudos.id"), nullable=True, index=True)
+    conteudo = relationship("ViticulturaConteudo", lazy="joined")
+    # Cópia própria dos dados; só nas seções gravadas antes de viticultura_conteudos (ver backfill_content_store)
+    dados_inline = Column("dados_list_json", JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"), nullable=True)
     data_raspagem = Column(DateTime, default=datetime.utcnow, nullable=False, index=True) 
 
+    # Consultas por opção/seção usam igualdade exata nestas colunas
+    __table_args__ = (
+        Index("ix_viticultura_data_option_ano_raspagem", "option_code", "ano", "data_raspagem"),
+        Index("ix_viticultura_data_option_subopcao_ano_raspagem", "option_code", "subopcao_key", "ano", "data_raspagem"),
+        Index("ix_viticultura_data_secao_raspagem", "aba", "subopcao_key", "ano", "data_raspagem"),
+        # Ordem da paginação por cursor (ver _paginar_keyset)
+        Index("ix_viticultura_data_keyset", "ano", "aba", "subopcao_key", "id"),
+    )
+
+
+    @property
+    def dados_list_json(self):
+        """Linhas da tabela da seção, do conteúdo compartilhado ou da cópia própria"""
+        if self.conteudo is not None:
+            return self.conteudo.dados_list_json
+        return self.dados_inline
+
+    @dados_list_json.setter
+    def dados_list_json(self, dados):
+        self.dados_inline = dados
+
+    def __repr__(self):
+        return f"<Viticultura(id={self.id}, ano={self.ano}, aba='{self.aba}', subopcao='{self.subopcao}', records_count={len(self.dados_list_json) if self.dados_list_json else 0})>"
+
+
+class ViticulturaAtual(Base):
+    """
+    Versão atual de cada seção (aba, subopção, ano): aponta para o registro
+    mais recente em viticultura_data e é atualizada na mesma transação que o grava.
+    """
+    __tablename__ = "viticultura_atual"
+
+    aba = Column(String, nullable=False)
+    subopcao_key = Column(String, nullable=False)
+    ano = Column(Integer, nullable=False)
+    subopcao = Column(String, nullable=True)
+    option_code = Column(String, nullable=True)
+    viticultura_id = Column(Integer, ForeignKey("viticultura_data.id"), nullable=False, index=True)
+    data_raspagem = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("aba", "subopcao_key", "ano"),
+        Index("ix_viticultura_atual_option_ano", "option_code", "ano"),
+        Index("ix_viticultura_atual_ano", "ano"),
+    )
+
+
+    def __repr__(self):
+        return f"<ViticulturaAtual(aba='{self.aba}', subopcao_key='{self.subopcao_key}', ano={self.ano}, viticultura_id={self.viticultura_id})>"
+
+
+class ViticulturaConteudo(Base):
+    """Conteúdo (dados_list_json) de uma seção, endereçado pelo hash SHA-256 do JSON canônico"""
+    __tablename__ = "viticultura_conteudos"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hash = Column(String(64), unique=True, nullable=False)
+    dados_list_json = Column(JSON_DOCUMENTO, nullable=False)
+    criado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Só no PostgreSQL: consultas de contenção (@>) sobre as linhas dos conteúdos
+    __table_args__ = (
+        Index(
+            "ix_viticultura_conteudos_dados_gin", "dados_list_json",
+            postgresql_using="gin", postgresql_ops={"dados_list_json": "jsonb_path_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
+
+    # Linhas de dados_list_json normalizadas (gravadas uma vez, junto com o conteúdo)
+    fatos = relationship("ViticulturaFato", cascade="all, delete-orphan", passive_deletes=True, lazy="noload")
+
+
+    def __repr__(self):
+        return f"<ViticulturaConteudo(id={self.id}, hash='{self.hash[:12] if self.hash else None}', records_count={len(self.dados_list_json) if self.dados_list_json else 0})>"
+
+
+class ViticulturaFato(Base):
+    """Uma linha da tabela de um conteúdo, com as medidas em colunas (filtros e agregações em SQL)"""
+    __tablename__ = "viticultura_fatos"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conteudo_id = Column(Integer, ForeignKey("viticultura_conteudos.id", ondelete="CASCADE"), nullable=False)
+    categoria_tabela = Column(String, nullable=True)
+    item_tipo = Column(String, nullable=True)            # Coluna de rótulo da tabela: produto, paises, cultivar...
+    item = Column(String, nullable=True, index=True)
+    quantidade = Column(Float, nullable=True)
+    unidade_quantidade = Column(String, nullable=True)
+    valor = Column(Float, nullable=True)
+    unidade_valor = Column(String, nullable=True)
+
+    # Agregações por conteúdo (totais anuais) leem as medidas só do índice
+    __table_args__ = (
+        Index("ix_viticultura_fatos_conteudo_medidas", "conteudo_id", "quantidade", "valor"),
+    )
+
 
     def __repr__(self):
-        return f"<Viticultura(id={self.id}, ano={self.ano}, aba='{self.aba}', subopcao='{self.subopcao}', records_count={len(self.dados_list_json) if self.dados_list_json else 0})>"
\ No newline at end of file
+        return f"<ViticulturaFato(id={self.id}, conteudo_id={self.conteudo_id}, item='{self.item}', quantidade={self.quantidade}, valor={self.valor})>"
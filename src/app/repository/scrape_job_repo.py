@@ -0,0 +1,88 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, Sequence
+from datetime import datetime
+import logging
+from src.app.models.scrape_job import ScrapeJob as ScrapeJobModel
+from src.app.domain.scrape_job import JOB_PENDENTE, JOB_EM_EXECUCAO, JOB_CONCLUIDO, JOB_FALHOU, JOB_STATUS_ATIVOS
+logger = logging.getLogger(__name__)
+
+def create_job(db: Session, tipo: str, chave: str) -> Optional[ScrapeJobModel]:
+    """
+    Cria um job pendente. Retorna None se já existir um job ativo com a mesma chave.
+    """
+    job = ScrapeJobModel(tipo=tipo, status=JOB_PENDENTE, chave_ativa=chave)
+    try:
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+    except IntegrityError:
+        db.rollback()
+        logger.info(f"Já existe um job ativo com a chave '{chave}'")
+        return None
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao criar job de raspagem: {e}")
+        raise
+
+def get_job(db: Session, job_id: int) -> Optional[ScrapeJobModel]:
+    return db.query(ScrapeJobModel).filter(ScrapeJobModel.id == job_id).first()
+
+def get_active_job(db: Session, chave: str) -> Optional[ScrapeJobModel]:
+    return db.query(ScrapeJobModel).filter(ScrapeJobModel.chave_ativa == chave).first()
+
+def get_last_failed_job_id(db: Session, tipo: str, antes_de: int) -> Optional[int]:
+    """Id do último job do tipo anterior a `antes_de`, se ele tiver falhado (coleta a retomar)"""
+    anterior = (
+        db.query(ScrapeJobModel)
+        .filter(ScrapeJobModel.tipo == tipo, ScrapeJobModel.id < antes_de,
+                ScrapeJobModel.status.notin_(JOB_STATUS_ATIVOS))
+        .order_by(ScrapeJobModel.id.desc())
+        .first()
+    )
+    return anterior.id if anterior is not None and anterior.status == JOB_FALHOU else None
+
+def count_active_jobs(db: Session) -> int:
+    return db.query(ScrapeJobModel).filter(ScrapeJobModel.status.in_(JOB_STATUS_ATIVOS)).count()
+
+def get_last_success_time(db: Session, tipo: str) -> Optional[datetime]:
+    """Conclusão do último job bem-sucedido do tipo (UTC, sem fuso)"""
+    return (
+        db.query(ScrapeJobModel.concluido_em)
+        .filter(ScrapeJobModel.tipo == tipo, ScrapeJobModel.status == JOB_CONCLUIDO)
+        .order_by(ScrapeJobModel.concluido_em.desc())
+        .limit(1)
+        .scalar()
+    )
+
+def claim_job(db: Session, job_id: int) -> bool:
+    """
+    Passa o job de pendente para em execução. Retorna False se ele não estiver
+    mais pendente (ex.: marcado como falho por falta de heartbeat).
+    """
+    now = datetime.utcnow()
+    return _update_job(db, job_id, (JOB_PENDENTE,), status=JOB_EM_EXECUCAO, iniciado_em=now, atualizado_em=now)
+
+def update_job_progress(db: Session, job_id: int, **counters: int) -> bool:
+    """Atualiza contadores de progresso (paginas_total, secoes_processadas, secoes_salvas) e o heartbeat de um job ativo"""
+    return _update_job(db, job_id, JOB_STATUS_ATIVOS, atualizado_em=datetime.utcnow(), **counters)
+
+def finish_job(db: Session, job_id: int, status: str, erro: Optional[str] = None) -> None:
+    """Marca o job como concluído/falho e libera a chave de deduplicação"""
+    now = datetime.utcnow()
+    _update_job(db, job_id, None, status=status, erro=erro, chave_ativa=None, concluido_em=now, atualizado_em=now)
+
+def _update_job(db: Session, job_id: int, status_atual: Optional[Sequence[str]], **values) -> bool:
+    """Atualiza o job (só se o status estiver em `status_atual`, quando informado); True se alguma linha mudou"""
+    try:
+        query = db.query(ScrapeJobModel).filter(ScrapeJobModel.id == job_id)
+        if status_atual is not None:
+            query = query.filter(ScrapeJobModel.status.in_(status_atual))
+        updated = query.update(values, synchronize_session=False)
+        db.commit()
+        return updated > 0
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao atualizar job {job_id}: {e}")
+        raise
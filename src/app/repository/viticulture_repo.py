@@ -1,18 +1,66 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Dict
+from sqlalchemy import and_, or_, func, tuple_, update, insert, select, delete, exists, bindparam, cast, event, Text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from typing import Any, Iterator, List, Dict, Optional, Sequence, Set, Tuple
+import hashlib
+import json
 import logging
-from src.app.models.viticulture import Viticultura as ViticulturaModel
+from datetime import datetime
+from src.app.models.viticulture import Viticultura as ViticulturaModel, ViticulturaAtual, ViticulturaConteudo, ViticulturaFato
+from src.app.scraper.utils import resolve_option_code, normalize_suboption_key
+from src.app.config.settings import settings
 from src.app.domain.viticulture import ViticulturaCreate
+from src.app.utils.query_cache import bump_data_version
+from src.app.utils.pagination import CursorKey
 logger = logging.getLogger(__name__)
 
+def _paginar_keyset(query, after: Optional[CursorKey], limit: Optional[int]):
+    """
+    Aplica a ordem estável (ano, aba, subopcao_key, id) e a paginação por cursor,
+    servida pelo índice ix_viticultura_data_keyset.
+
+    Lê limit + 1 linhas: a linha extra indica que há próxima página (ver split_page).
+    """
+    ordem = (ViticulturaModel.ano, ViticulturaModel.aba, ViticulturaModel.subopcao_key, ViticulturaModel.id)
+    if after is not None:
+        query = query.filter(tuple_(*ordem) > tuple_(*after))
+    query = query.order_by(*ordem)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query
+
+# option_code das seções cuja aba não corresponde a nenhuma opção conhecida (já
+# examinadas pelo backfill; NULL fica só para as ainda não examinadas)
+OPCAO_NAO_RECONHECIDA = ""
+
+def _codigo_da_opcao(aba: Optional[str]) -> str:
+    return resolve_option_code(aba) or OPCAO_NAO_RECONHECIDA
+
+def _filtro_opcao(opcao: str, modelo=ViticulturaModel):
+    """
+    Filtro por opção: igualdade em option_code (índice composto) quando a opção
+    é reconhecida, mais a busca parcial pelo nome da aba nas seções sem opção
+    reconhecida (que a busca por nome sempre encontrou); senão, só a busca pelo nome.
+    """
+    option_code = resolve_option_code(opcao)
+    if option_code:
+        return or_(
+            modelo.option_code == option_code,
+            and_(
+                or_(modelo.option_code == OPCAO_NAO_RECONHECIDA, modelo.option_code.is_(None)),
+                modelo.aba.ilike(f"%{opcao}%")
+            )
+        )
+    return modelo.aba.ilike(f"%{opcao}%")
+
 def get_all_data_by_option(db: Session, opcao: str, ano_minimo: int) -> List[Dict]:
     """
     Busca todos os dados históricos para uma opção específica a partir de um ano mínimo
     """
     try:
         results = db.query(ViticulturaModel).filter(
-            ViticulturaModel.aba.ilike(f"%{opcao}%"),
+            _filtro_opcao(opcao),
             ViticulturaModel.ano >= ano_minimo
         ).order_by(ViticulturaModel.ano.asc()).all()
         
@@ -34,61 +82,556 @@ def get_all_data_by_option(db: Session, opcao: str, ano_minimo: int) -> List[Dic
         logger.error(f"Erro ao buscar dados por opção: {e}")
         raise
 
-def save_bulk(db: Session, data_list: List[ViticulturaCreate]):
+def get_yearly_totals_by_option(db: Session, opcao: str, ano_minimo: int) -> List[Tuple[int, float]]:
     """
-    Saves a list of ViticulturaCreate objects to the database.
-    This version does NOT delete old data, allowing for a history of scrapes.
+    Soma, por ano, a quantidade (ou o valor, se não houver quantidade) das linhas
+    da opção, usando só a raspagem mais recente de cada seção.
+
+    Returns:
+        Lista (ano, total) em ordem crescente de ano; vazia se não houver fatos
     """
-    db_data_list = []
-    for data_item in data_list:
-        db_item = ViticulturaModel(
-            ano=data_item.ano,
-            aba=data_item.aba,
-            subopcao=data_item.subopcao,
-            dados_list_json=data_item.dados, # Mapear para o nome correto da coluna
-            data_raspagem=data_item.data_raspagem # Salvar o timestamp
+    try:
+        medida = func.coalesce(ViticulturaFato.quantidade, ViticulturaFato.valor)
+        query = _join_current_sections(
+            db.query(ViticulturaModel.ano, func.sum(medida)).select_from(ViticulturaFato).join(
+                ViticulturaModel, ViticulturaFato.conteudo_id == ViticulturaModel.conteudo_id
+            ),
+            ano_minimo, None, opcao
         )
-        db_data_list.append(db_item)
-    
+        rows = query.filter(medida > 0).group_by(ViticulturaModel.ano).order_by(ViticulturaModel.ano).all()
+        return [(ano, float(total)) for ano, total in rows]
+    except Exception as e:
+        logger.error(f"Erro ao somar fatos por ano: {e}")
+        raise
+
+def backfill_content_store(db: Session, batch_size: int = 500) -> int:
+    """
+    Move para viticultura_conteudos os dados das seções gravadas antes do
+    armazenamento por conteúdo (cópia própria em dados_list_json), gerando os
+    fatos dos conteúdos novos.
+
+    Returns:
+        Número de seções processadas
+    """
+    total = 0
+    ultimo_id = 0
+    try:
+        while True:
+            pendentes = db.query(ViticulturaModel.id, ViticulturaModel.dados_inline).filter(
+                ViticulturaModel.conteudo_id.is_(None),
+                ViticulturaModel.dados_inline.isnot(None),
+                ViticulturaModel.id > ultimo_id
+            ).order_by(ViticulturaModel.id).limit(batch_size).all()
+            if not pendentes:
+                break
+
+            hashes = [content_hash(dados) for _, dados in pendentes]
+            conteudos = _gravar_conteudos(db, dict(zip(hashes, (dados for _, dados in pendentes))), batch_size)
+            db.execute(update(ViticulturaModel), [
+                {"id": secao_id, "conteudo_id": conteudos[hash_dados], "dados_inline": None}
+                for (secao_id, _), hash_dados in zip(pendentes, hashes)
+            ])
+            ultimo_id = pendentes[-1].id
+            db.commit()
+            total += len(pendentes)
+
+        if total:
+            bump_data_version()
+            logger.info(f"Dados de {total} seções gravadas anteriormente movidos para o armazenamento por conteúdo.")
+        return total
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao mover seções existentes para o armazenamento por conteúdo: {e}")
+        raise
+
+def backfill_option_codes(db: Session) -> int:
+    """
+    Preenche option_code e subopcao_key das seções gravadas antes dessas colunas
+    existirem (uma atualização por par aba/subopção distinto). Abas não
+    reconhecidas recebem OPCAO_NAO_RECONHECIDA, para não serem examinadas de novo.
+
+    Returns:
+        Número de seções atualizadas
+    """
     try:
-        db.add_all(db_data_list)
+        pares = db.query(ViticulturaModel.aba, ViticulturaModel.subopcao).filter(
+            ViticulturaModel.option_code.is_(None)
+        ).distinct().all()
+
+        total = 0
+        for aba, subopcao in pares:
+            option_code = _codigo_da_opcao(aba)
+            subopcao_key = normalize_suboption_key(subopcao)
+            filtro_subopcao = ViticulturaModel.subopcao.is_(None) if subopcao is None else ViticulturaModel.subopcao == subopcao
+            resultado = db.execute(
+                update(ViticulturaModel)
+                .where(ViticulturaModel.aba == aba, filtro_subopcao, ViticulturaModel.option_code.is_(None))
+                .values(option_code=option_code, subopcao_key=subopcao_key)
+            )
+            # Abas não reconhecidas ficam marcadas (não voltam a ser examinadas) e são consultadas pelo nome da aba
+            if option_code != OPCAO_NAO_RECONHECIDA:
+                total += resultado.rowcount or 0
         db.commit()
-        logger.info(f"Dados em lote salvos com sucesso: {len(db_data_list)} entradas.")
-        for db_item in db_data_list: # Para popular IDs se necessário, embora não usado diretamente aqui
-            db.refresh(db_item)
+
+        if total:
+            bump_data_version()
+            logger.info(f"Código de opção preenchido em {total} seções gravadas anteriormente.")
+        return total
     except Exception as e:
         db.rollback()
-        logger.error(f"Erro ao salvar dados em lote: {e}")
+        logger.error(f"Erro ao preencher códigos de opção das seções existentes: {e}")
+        raise
+
+def get_stored_section_keys(db: Session) -> Set[Tuple[str, Optional[str], int]]:
+    """
+    Retorna as seções (aba, subopcao, ano) que já possuem dados armazenados.
+    """
+    try:
+        rows = db.query(ViticulturaAtual.aba, ViticulturaAtual.subopcao, ViticulturaAtual.ano).all()
+        return {(aba, subopcao, ano) for aba, subopcao, ano in rows}
+    except Exception as e:
+        logger.error(f"Erro ao buscar seções armazenadas: {e}")
         raise
 
+def _join_current_sections(query, ano_min: Optional[int], ano_max: Optional[int], opcao: Optional[str]):
+    """Restringe a consulta à versão atual de cada seção (aba, subopcao, ano), pela tabela viticultura_atual"""
+    query = query.join(ViticulturaAtual, ViticulturaAtual.viticultura_id == ViticulturaModel.id)
+    if ano_min is not None:
+        query = query.filter(ViticulturaAtual.ano >= ano_min)
+    if ano_max is not None:
+        query = query.filter(ViticulturaAtual.ano <= ano_max)
+    if opcao:
+        query = query.filter(_filtro_opcao(opcao, ViticulturaAtual))
+    return query
 
+def _insert_do_dialeto(executor, tabela):
+    """INSERT com suporte a ON CONFLICT (PostgreSQL ou SQLite) para o banco do executor"""
+    dialeto = executor.get_bind().dialect.name if isinstance(executor, Session) else executor.dialect.name
+    return (postgresql.insert if dialeto == "postgresql" else sqlite.insert)(tabela)
 
-def get_latest_scrape_group(db: Session) -> List[ViticulturaModel]:
+def _upsert_secoes_atuais(executor, linhas: List[Dict[str, Any]]) -> None:
     """
-    Retrieves all viticulture data entries from the most recent scrape.
-    Returns a list of Viticultura SQLAlchemy model instances.
+    Aponta viticultura_atual para as versões informadas, sem voltar a uma
+    versão mais antiga que a atual (INSERT ... ON CONFLICT DO UPDATE).
+
+    Args:
+        executor: Session ou Connection da transação que gravou as versões
+        linhas: aba, subopcao_key, ano, subopcao, option_code, viticultura_id e data_raspagem de cada versão
+    """
+    # Uma linha por seção: a mais recente (e, no empate, a gravada por último)
+    por_secao: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+    for linha in linhas:
+        chave = (linha["aba"], linha["subopcao_key"], linha["ano"])
+        atual = por_secao.get(chave)
+        if atual is None or (linha["data_raspagem"], linha["viticultura_id"]) >= (atual["data_raspagem"], atual["viticultura_id"]):
+            por_secao[chave] = linha
+    if not por_secao:
+        return
+
+    tabela = ViticulturaAtual.__table__
+    stmt = _insert_do_dialeto(executor, tabela)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabela.c.aba, tabela.c.subopcao_key, tabela.c.ano],
+        set_={
+            "subopcao": stmt.excluded.subopcao,
+            "option_code": stmt.excluded.option_code,
+            "viticultura_id": stmt.excluded.viticultura_id,
+            "data_raspagem": stmt.excluded.data_raspagem
+        },
+        where=stmt.excluded.data_raspagem >= tabela.c.data_raspagem
+    )
+    executor.execute(stmt, list(por_secao.values()))
+
+@event.listens_for(ViticulturaModel, "before_insert")
+def _preencher_chaves_da_secao(mapper, connection, target) -> None:
+    # Registros criados pelo ORM (fora de save_bulk) recebem as mesmas chaves normalizadas
+    if target.option_code is None:
+        target.option_code = _codigo_da_opcao(target.aba)
+    if not target.subopcao_key:
+        target.subopcao_key = normalize_suboption_key(target.subopcao)
+
+@event.listens_for(ViticulturaModel, "after_insert")
+def _apontar_secao_atual(mapper, connection, target) -> None:
+    _upsert_secoes_atuais(connection, [{
+        "aba": target.aba,
+        "subopcao_key": target.subopcao_key,
+        "ano": target.ano,
+        "subopcao": target.subopcao,
+        "option_code": target.option_code,
+        "viticultura_id": target.id,
+        "data_raspagem": target.data_raspagem
+    }])
+
+def rebuild_current_sections(db: Session) -> int:
+    """
+    Reconstrói viticultura_atual a partir do histórico (bancos anteriores à
+    tabela, ou após remoções manuais em viticultura_data).
+
+    Returns:
+        Número de seções atuais
     """
     try:
-        # Encontrar o timestamp da raspagem mais recente
-        latest_timestamp = db.query(func.max(ViticulturaModel.data_raspagem)).scalar()
+        # Versão mais recente de cada seção (e, no empate, a gravada por último), calculada no banco
+        ordem = func.row_number().over(
+            partition_by=(ViticulturaModel.aba, ViticulturaModel.subopcao_key, ViticulturaModel.ano),
+            order_by=(ViticulturaModel.data_raspagem.desc(), ViticulturaModel.id.desc())
+        ).label("ordem")
+        versoes = select(
+            ViticulturaModel.aba, ViticulturaModel.subopcao_key, ViticulturaModel.ano, ViticulturaModel.subopcao,
+            ViticulturaModel.option_code, ViticulturaModel.id.label("viticultura_id"), ViticulturaModel.data_raspagem, ordem
+        ).subquery()
+        colunas = ["aba", "subopcao_key", "ano", "subopcao", "option_code", "viticultura_id", "data_raspagem"]
+        recentes = select(*(versoes.c[coluna] for coluna in colunas)).where(versoes.c.ordem == 1)
+
+        # Upsert em uma única instrução, sem esvaziar a tabela: leitores continuam vendo
+        # os ponteiros anteriores até o commit
+        tabela = ViticulturaAtual.__table__
+        stmt = _insert_do_dialeto(db, tabela).from_select(colunas, recentes)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabela.c.aba, tabela.c.subopcao_key, tabela.c.ano],
+            set_={coluna: stmt.excluded[coluna] for coluna in colunas[3:]}
+        )
+        db.execute(stmt)
+        # Seções sem nenhuma versão restante no histórico
+        db.execute(delete(ViticulturaAtual).where(
+            ~exists().where(ViticulturaModel.id == ViticulturaAtual.viticultura_id)
+        ))
+        db.commit()
+        total = db.query(func.count()).select_from(ViticulturaAtual).scalar()
+        bump_data_version()
+        logger.info(f"Tabela de seções atuais reconstruída: {total} seções.")
+        return total
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao reconstruir as seções atuais: {e}")
+        raise
 
-        if not latest_timestamp:
-            logger.info("Nenhum timestamp de raspagem encontrado no banco de dados.")
-            return []
+def get_latest_sections(
+    db: Session,
+    ano_min: Optional[int] = None,
+    ano_max: Optional[int] = None,
+    opcao: Optional[str] = None,
+    after: Optional[CursorKey] = None,
+    limit: Optional[int] = None
+) -> List[ViticulturaModel]:
+    """
+    Retorna, para cada seção (aba, subopcao, ano), o registro da raspagem mais recente
+    (apontado por viticultura_atual), na ordem (ano, aba, subopcao, id).
 
-        logger.info(f"Timestamp da raspagem mais recente encontrado: {latest_timestamp}")
-        return db.query(ViticulturaModel).filter(ViticulturaModel.data_raspagem == latest_timestamp).all()
+    Args:
+        ano_min, ano_max: Restringe as seções ao intervalo de anos (opcional)
+        opcao: Restringe as seções à aba correspondente (opcional, mesmo critério de get_specific_data_from_db)
+        after: Cursor de paginação; retorna só as seções posteriores a ele
+        limit: Tamanho da página (são lidas limit + 1 linhas)
+    """
+    try:
+        query = _join_current_sections(db.query(ViticulturaModel), ano_min, ano_max, opcao)
+        return _paginar_keyset(query, after, limit).all()
+    except Exception as e:
+        logger.error(f"Erro ao buscar seções mais recentes: {e}")
+        raise
+
+def _numero(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    return float(value) if isinstance(value, (int, float)) else None
+
+def build_fact_rows(dados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Normaliza as linhas de um conteúdo (dados_list_json) nas colunas de viticultura_fatos.
+
+    O rótulo da linha é a primeira coluna de texto (produto, paises, cultivar...);
+    quantidade e valor só são preenchidos quando numéricos. Ano, aba e opção vêm
+    das seções que apontam para o conteúdo.
+    """
+    fatos = []
+    for row in dados or []:
+        if not isinstance(row, dict):
+            continue
+        item_tipo = next((
+            key for key, value in row.items()
+            if isinstance(value, str) and key != "categoria_tabela" and not key.startswith("unidade_")
+        ), None)
+        fatos.append({
+            "categoria_tabela": row.get("categoria_tabela"),
+            "item_tipo": item_tipo,
+            "item": row.get(item_tipo) if item_tipo else None,
+            "quantidade": _numero(row.get("quantidade")),
+            "unidade_quantidade": row.get("unidade_quantidade"),
+            "valor": _numero(row.get("valor")),
+            "unidade_valor": row.get("unidade_valor")
+        })
+    return fatos
+
+def content_hash(dados: Any) -> str:
+    """SHA-256 do JSON canônico (chaves ordenadas, sem espaços) dos dados de uma seção"""
+    canonico = json.dumps(dados, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+def _em_lotes(items: Sequence[Any], batch_size: int) -> Iterator[Sequence[Any]]:
+    for inicio in range(0, len(items), batch_size):
+        yield items[inicio:inicio + batch_size]
+
+def _ids_dos_conteudos(db: Session, hashes: Sequence[str], batch_size: int) -> Dict[str, int]:
+    ids: Dict[str, int] = {}
+    for lote in _em_lotes(hashes, batch_size):
+        ids.update(db.execute(
+            select(ViticulturaConteudo.hash, ViticulturaConteudo.id).where(ViticulturaConteudo.hash.in_(lote))
+        ).all())
+    return ids
+
+def _gravar_conteudos(db: Session, dados_por_hash: Dict[str, Any], batch_size: int) -> Dict[str, int]:
+    """
+    Insere os conteúdos ainda não gravados, e os fatos deles, em INSERTs de
+    várias linhas (executemany), sem passar pela unidade de trabalho do ORM.
+    O JSON é serializado aqui, uma vez por conteúdo novo.
+
+    Returns:
+        id do conteúdo para cada hash informado
+    """
+    ids = _ids_dos_conteudos(db, list(dados_por_hash), batch_size)
+    novos = [hash_dados for hash_dados in dados_por_hash if hash_dados not in ids]
+    if not novos:
+        return ids
+
+    dados_json = bindparam("dados_json", type_=Text)
+    if db.get_bind().dialect.name == "postgresql":
+        # Parâmetros tipados como texto precisam de conversão explícita para a coluna JSON
+        dados_json = cast(dados_json, ViticulturaConteudo.__table__.c.dados_list_json.type)
+    inserir_conteudo = insert(ViticulturaConteudo.__table__).values(dados_list_json=dados_json)
+    for lote in _em_lotes(novos, batch_size):
+        db.execute(inserir_conteudo, [
+            {"hash": hash_dados, "dados_json": json.dumps(dados_por_hash[hash_dados], ensure_ascii=False)}
+            for hash_dados in lote
+        ])
+    ids_novos = _ids_dos_conteudos(db, novos, batch_size)
+    ids.update(ids_novos)
+
+    fatos = [
+        {"conteudo_id": ids_novos[hash_dados], **fato}
+        for hash_dados in novos
+        for fato in build_fact_rows(dados_por_hash[hash_dados])
+    ]
+    for lote in _em_lotes(fatos, batch_size):
+        db.execute(insert(ViticulturaFato.__table__), lote)
+    return ids
+
+def save_bulk(
+    db: Session,
+    data_list: List[ViticulturaCreate],
+    batch_size: Optional[int] = None,
+    return_ids: bool = False
+) -> Optional[List[int]]:
+    """
+    Saves a list of ViticulturaCreate objects to the database.
+    This version does NOT delete old data, allowing for a history of scrapes.
+    Each section version references its content by hash: unchanged sections
+    reuse the stored content, and only new content (and its fact rows) is written.
+
+    Rows are written with Core multi-row INSERTs of `batch_size` rows
+    (default settings.SAVE_BULK_BATCH_SIZE) in a single transaction, which
+    also points viticultura_atual at the new versions.
+
+    Args:
+        return_ids: Also return the ids of the new section rows
+
+    Returns:
+        The new row ids in input order when return_ids is True, otherwise None
+    """
+    batch_size = batch_size or settings.SAVE_BULK_BATCH_SIZE
+    tabela = ViticulturaModel.__table__
+
+    for tentativa in (1, 2):
+        try:
+            hashes = [content_hash(data_item.dados) for data_item in data_list]
+            conteudos = _gravar_conteudos(db, dict(zip(hashes, (data_item.dados for data_item in data_list))), batch_size)
+            linhas = [
+                {
+                    "ano": data_item.ano,
+                    "aba": data_item.aba,
+                    "subopcao": data_item.subopcao,
+                    "option_code": _codigo_da_opcao(data_item.aba),
+                    "subopcao_key": normalize_suboption_key(data_item.subopcao),
+                    "conteudo_id": conteudos[hash_dados],
+                    "data_raspagem": data_item.data_raspagem
+                }
+                for data_item, hash_dados in zip(data_list, hashes)
+            ]
+
+            novos_ids: List[int] = []
+            for lote in _em_lotes(linhas, batch_size):
+                resultado = db.execute(insert(tabela).returning(tabela.c.id, sort_by_parameter_order=True), lote)
+                novos_ids.extend(resultado.scalars())
+            # Versão atual de cada seção, na mesma transação
+            atuais = []
+            for linha, versao_id in zip(linhas, novos_ids):
+                atual = dict(linha, viticultura_id=versao_id)
+                del atual["conteudo_id"]
+                atuais.append(atual)
+            _upsert_secoes_atuais(db, atuais)
+
+            db.commit()
+            bump_data_version()
+            logger.info(f"Dados em lote salvos com sucesso: {len(linhas)} entradas ({len(set(hashes))} conteúdos distintos).")
+            return novos_ids if return_ids else None
+        except IntegrityError as e:
+            db.rollback()
+            if tentativa == 2:
+                logger.error(f"Erro ao salvar dados em lote: {e}")
+                raise
+            # Outro processo gravou o mesmo conteúdo entre a consulta e a inserção
+            logger.warning("Conteúdo gravado concorrentemente por outro processo, repetindo o lote.")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Erro ao salvar dados em lote: {e}")
+            raise
+
+
+
+def _remover_versoes(db: Session, versoes: List[Tuple[int, Optional[int]]]) -> Tuple[int, int]:
+    """
+    Remove versões do histórico (exceto as apontadas por viticultura_atual) e
+    os conteúdos, com seus fatos, que deixaram de ser referenciados.
+
+    Returns:
+        (versões removidas, conteúdos removidos)
+    """
+    removidas = db.execute(
+        delete(ViticulturaModel).where(
+            ViticulturaModel.id.in_([versao_id for versao_id, _ in versoes]),
+            ViticulturaModel.id.not_in(select(ViticulturaAtual.viticultura_id))
+        ),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+
+    candidatos = {conteudo_id for _, conteudo_id in versoes if conteudo_id is not None}
+    orfaos = db.execute(
+        select(ViticulturaConteudo.id).where(
+            ViticulturaConteudo.id.in_(candidatos),
+            ~exists().where(ViticulturaModel.conteudo_id == ViticulturaConteudo.id)
+        )
+    ).scalars().all() if candidatos else []
+    if orfaos:
+        # Remoção explícita dos fatos: não depende de ON DELETE CASCADE estar ativo no SQLite
+        db.execute(delete(ViticulturaFato).where(ViticulturaFato.conteudo_id.in_(orfaos)))
+        db.execute(delete(ViticulturaConteudo).where(ViticulturaConteudo.id.in_(orfaos)))
+    return removidas, len(orfaos)
+
+def prune_history(
+    db: Session,
+    corte: datetime,
+    checkpoints_mensais: bool = True,
+    batch_size: int = 1000
+) -> Tuple[int, int]:
+    """
+    Aplica a política de retenção ao histórico de raspagens, em lotes de
+    `batch_size` versões (uma transação por lote).
+
+    Versões com data_raspagem a partir de `corte` são todas mantidas. Das
+    anteriores, fica só a última de cada mês por seção (aba, subopcao, ano)
+    quando `checkpoints_mensais`, ou nenhuma. A versão atual de cada seção
+    (viticultura_atual) nunca é removida.
+
+    Returns:
+        (versões removidas, conteúdos removidos)
+    """
+    ordem = (ViticulturaModel.aba, ViticulturaModel.subopcao_key, ViticulturaModel.ano, ViticulturaModel.data_raspagem, ViticulturaModel.id)
+    versoes_removidas = conteudos_removidos = 0
+    ultimo: Optional[Tuple] = None
+    anterior: Optional[Tuple] = None  # (seção, mês, id, conteudo_id) da versão anterior na ordem
+    try:
+        while True:
+            query = db.query(*ordem, ViticulturaModel.conteudo_id).filter(ViticulturaModel.data_raspagem < corte)
+            if ultimo is not None:
+                query = query.filter(tuple_(*ordem) > tuple_(*ultimo))
+            lote = query.order_by(*ordem).limit(batch_size).all()
+            if not lote:
+                break
+
+            remover: List[Tuple[int, Optional[int]]] = []
+            for aba, subopcao_key, ano, data_raspagem, versao_id, conteudo_id in lote:
+                if not checkpoints_mensais:
+                    remover.append((versao_id, conteudo_id))
+                    continue
+                atual = ((aba, subopcao_key, ano), (data_raspagem.year, data_raspagem.month), versao_id, conteudo_id)
+                # Versão seguida de outra da mesma seção no mesmo mês: não é o checkpoint do mês
+                if anterior is not None and anterior[:2] == atual[:2]:
+                    remover.append(anterior[2:])
+                anterior = atual
+            ultimo = tuple(lote[-1])[:len(ordem)]
+
+            if remover:
+                versoes, conteudos = _remover_versoes(db, remover)
+                versoes_removidas += versoes
+                conteudos_removidos += conteudos
+            db.commit()
+
+        if versoes_removidas:
+            bump_data_version()
+        logger.info(
+            f"Retenção do histórico (corte {corte.isoformat()}): {versoes_removidas} versões e "
+            f"{conteudos_removidos} conteúdos removidos."
+        )
+        return versoes_removidas, conteudos_removidos
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao aplicar a retenção do histórico: {e}")
+        raise
+
+
+def get_latest_scrape_timestamp(db: Session) -> Optional[datetime]:
+    """
+    Retorna a data da raspagem mais recente entre as seções atuais, ou None se o banco estiver vazio.
+    """
+    try:
+        return db.query(func.max(ViticulturaAtual.data_raspagem)).scalar()
+    except Exception as e:
+        logger.error(f"Erro ao buscar a data da raspagem mais recente: {e}")
+        raise
+
+def get_latest_scrape_group(db: Session, after: Optional[CursorKey] = None, limit: Optional[int] = None) -> List[ViticulturaModel]:
+    """
+    Retrieves the current dataset: the latest stored version of every section,
+    via the viticultura_atual pointers (cost independent of history size).
+    Sections written by partial saves are included alongside full scrapes.
+    With `after`/`limit`, returns one keyset page (limit + 1 rows) ordered by (ano, aba, subopcao, id).
+    """
+    try:
+        query = _join_current_sections(db.query(ViticulturaModel), None, None, None)
+        if after is not None or limit is not None:
+            query = _paginar_keyset(query, after, limit)
+        else:
+            query = query.order_by(ViticulturaModel.id)
+        items = query.all()
+        if not items:
+            logger.info("Nenhuma seção atual encontrada no banco de dados.")
+        return items
     except Exception as e:
         logger.error(f"Erro ao buscar o grupo de raspagem mais recente: {e}")
         raise 
 
-def get_specific_data_from_db(db: Session, ano_min: int, ano_max: int, opcao: str):
+def get_specific_data_from_db(
+    db: Session,
+    ano_min: int,
+    ano_max: int,
+    opcao: str,
+    after: Optional[CursorKey] = None,
+    limit: Optional[int] = None
+):
+    """
+    Registros do intervalo para a opção, do mais recente ao mais antigo; com
+    `after`/`limit`, uma página por cursor na ordem (ano, aba, subopcao, id).
+    """
     try:
         query = db.query(ViticulturaModel).filter(
             ViticulturaModel.ano >= ano_min,
             ViticulturaModel.ano <= ano_max,
-            ViticulturaModel.aba.ilike(f"%{opcao}%")
-        ).order_by(ViticulturaModel.data_raspagem.desc())
+            _filtro_opcao(opcao)
+        )
+        if after is not None or limit is not None:
+            query = _paginar_keyset(query, after, limit)
+        else:
+            query = query.order_by(ViticulturaModel.data_raspagem.desc())
         return query.all()
     except Exception as e:
         logger.error(f"Erro ao buscar dados específicos do banco: {e}")
@@ -0,0 +1,475 @@
+# src/app/scraper/async_scraper.py
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Callable, List, Optional, Set
+
+import httpx
+from bs4 import BeautifulSoup
+
+from .base_scraper import BaseScraper, PageMetadata, ScrapedData, ScrapeUnit
+from .full_scraper import FullScraper
+from .delta_planner import DeltaPlanner, SectionKey
+from .checkpoint import ScrapeJournal
+from .partial_scraper import PartialScraper
+from .config import MAIN_OPTIONS_TO_SCRAPE, OPCOES_MAPPING, SCRAPING_CONFIG
+from .exceptions import PageNotFoundError, ScrapingError
+from .page_cache import FetchedPage, PageCache
+from .metadata_cache import MetadataCache
+from .rate_limiter import TokenBucketRateLimiter, get_rate_limiter
+from .utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+class AsyncBaseScraper(BaseScraper):
+    """
+    Contraparte assíncrona do BaseScraper, para uso dentro do event loop do FastAPI.
+
+    As requisições usam um `httpx.AsyncClient` com pool de conexões keep-alive
+    (limitado a MAX_CONCURRENT_PER_HOST conexões); o parsing das páginas, a
+    extração dos metadados e as leituras e gravações dos caches em disco rodam
+    em thread, para não bloquear os demais clientes do worker. A extração das
+    tabelas reaproveita os métodos de BaseScraper.
+
+    Deve ser usado como context manager assíncrono quando não receber um client:
+
+        async with AsyncFullScraper() as scraper:
+            dados = await scraper.scrape_all_data()
+    """
+
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        rate_limiter: Optional[TokenBucketRateLimiter] = None,
+        page_cache: Optional[PageCache] = None,
+        metadata_cache: Optional[MetadataCache] = None
+    ):
+        BaseScraper.__init__(self, rate_limiter=rate_limiter, page_cache=page_cache, metadata_cache=metadata_cache)
+        self._client = client
+        self._owns_client = client is None
+        # Vagas de conexão com o host (as mesmas do pool do client); o token de taxa só é pego com a vaga
+        self._host_slots = asyncio.Semaphore(max(1, self.config.MAX_CONCURRENT_PER_HOST))
+
+    async def __aenter__(self):
+        if self._client is None:
+            self._client = self._create_client()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """Cria client HTTP com pool de conexões para o host do Vitibrasil"""
+        connect_timeout, read_timeout = self.config.TIMEOUT
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.config.MAX_CONCURRENT_PER_HOST,
+                max_keepalive_connections=self.config.MAX_CONCURRENT_PER_HOST
+            ),
+            follow_redirects=True
+        )
+
+    async def fetch_page(self, url: str, description: str = "page") -> Optional[FetchedPage]:
+        """
+        Busca uma página, usando requisição condicional quando ela está no cache.
+
+        Raises:
+            PageNotFoundError: Se não conseguir carregar a página após tentativas
+        """
+        if self._client is None:
+            raise ScrapingError("AsyncBaseScraper deve ser usado com 'async with' ou receber um client")
+
+        memoized = self._take_memoized_page(url)
+        if memoized:
+            return memoized
+
+        cached = await asyncio.to_thread(self.page_cache.get, url) if self.page_cache else None
+        headers = cached.conditional_headers() if cached else {}
+
+        for attempt in range(1, self.config.MAX_RETRIES + 1):
+            try:
+                async with self._host_slots:
+                    if self.rate_limiter:
+                        await self.rate_limiter.acquire_async()
+                    resp = await self._client.get(url, headers=headers)
+                if resp.status_code == 304 and cached:
+                    not_modified = await asyncio.to_thread(self._not_modified_page, url, cached)
+                    if not_modified:
+                        return not_modified
+                    # Corpo do cache indisponível: repete sem requisição condicional
+                    cached, headers = None, {}
+                    continue
+                resp.raise_for_status()
+                # Hash do corpo (comparação com o cache) fora do event loop
+                return await asyncio.to_thread(self._build_fetched_page, url, resp.content, resp.headers, cached)
+            except httpx.HTTPError as e:
+                logger.warning(f"Tentativa {attempt}/{self.config.MAX_RETRIES} falhou para {description}: {e}")
+                if attempt == self.config.MAX_RETRIES:
+                    raise PageNotFoundError(f"Não foi possível carregar {description} após {self.config.MAX_RETRIES} tentativas")
+                await asyncio.sleep(2 * attempt)
+
+        return None
+
+    async def get_page_soup(self, url: str, description: str = "page") -> Optional[BeautifulSoup]:
+        """Busca e parseia uma página (parsing executado fora do event loop)"""
+        page = await self.fetch_page(url, description)
+        if not page:
+            return None
+
+        if self.page_cache and not page.unchanged:
+            await asyncio.to_thread(self.page_cache.store, page)
+        self._page_memo[url] = page
+        return await asyncio.to_thread(BeautifulSoup, page.content, 'lxml')
+
+    async def get_page_metadata(self, option_code: str, reference_year: Optional[int] = None) -> PageMetadata:
+        """Versão assíncrona de BaseScraper.get_page_metadata"""
+        cached = await asyncio.to_thread(self.metadata_cache.get, option_code) if self.metadata_cache else None
+        if cached:
+            logger.info(f"Metadados de {option_code} obtidos do cache")
+            return cached
+
+        if reference_year is None:
+            reference_year = self.config.DEFAULT_REFERENCE_YEAR
+
+        url = self._build_url({'ano': reference_year, 'opcao': option_code})
+        soup = await self.get_page_soup(url, f"metadata for {option_code}")
+
+        if not soup:
+            return PageMetadata(None, None, [], normalize_text(option_code) or option_code)
+
+        metadata = await asyncio.to_thread(self._parse_page_metadata, soup, option_code)
+
+        # Se não encontrou anos e há subopções, tenta com primeira subopção
+        if (metadata.min_year is None or metadata.max_year is None) and metadata.sub_options:
+            metadata.min_year, metadata.max_year = await self._try_get_years_from_suboption(
+                option_code, metadata.sub_options[0].code, reference_year
+            )
+
+        await asyncio.to_thread(self._store_metadata, option_code, metadata)
+        return metadata
+
+    async def _try_get_years_from_suboption(
+        self,
+        option_code: str,
+        suboption_code: str,
+        reference_year: int
+    ) -> tuple[Optional[int], Optional[int]]:
+        """Tenta obter anos usando uma subopção"""
+        try:
+            url = self._build_page_url(reference_year, option_code, suboption_code)
+            soup = await self.get_page_soup(url, f"metadata for {option_code} with suboption")
+            if soup:
+                return await asyncio.to_thread(self._extract_year_range, soup)
+        except Exception as e:
+            logger.warning(f"Erro ao tentar obter anos da subopção: {e}")
+
+        return None, None
+
+    async def scrape_data_from_page(
+        self,
+        year: int,
+        option_code: str,
+        suboption_code: Optional[str] = None,
+        option_display_name: Optional[str] = None,
+        suboption_display_name: Optional[str] = None
+    ) -> ScrapedData:
+        """Versão assíncrona de BaseScraper.scrape_data_from_page"""
+        url = self._build_page_url(year, option_code, suboption_code)
+        description = self._build_page_description(option_code, suboption_code, year)
+
+        page = await self.fetch_page(url, description)
+
+        final_option_name = option_display_name or normalize_text(option_code) or option_code
+
+        if not page:
+            logger.warning(f"Falha ao carregar dados de {url}")
+            return ScrapedData(year, final_option_name, suboption_display_name, [])
+
+        # Página inalterada desde a última coleta: reaproveita os dados já extraídos
+        cached_data = self._cached_table_data(page, description)
+        if cached_data is not None:
+            return ScrapedData(year, final_option_name, suboption_display_name, cached_data, unchanged=True)
+
+        table_data = await asyncio.to_thread(self._parse_and_cache_page, page, option_code)
+
+        return ScrapedData(year, final_option_name, suboption_display_name, table_data)
+
+    def _parse_and_cache_page(self, page: FetchedPage, option_code: str):
+        """Parseia o HTML, extrai a tabela de dados e atualiza o cache (executado em thread)"""
+        table_data = self._extract_page_table_data(page.content, page.url, option_code)
+        if self.page_cache:
+            self.page_cache.store(page, table_data)
+        return table_data
+
+    async def _gather_units(self, units: List[ScrapeUnit], max_workers: int) -> List[Optional[ScrapedData]]:
+        """Raspa unidades concorrentemente, com no máximo `max_workers` em andamento"""
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+
+        async def run(unit: ScrapeUnit) -> Optional[ScrapedData]:
+            async with semaphore:
+                return await self._scrape_unit(unit)
+
+        return await asyncio.gather(*(run(unit) for unit in units))
+
+    async def _scrape_unit(self, unit: ScrapeUnit) -> Optional[ScrapedData]:
+        """Raspa uma unidade (página); erros são registrados e resultam em None"""
+        logger.info(f"Raspando: {unit.option_code}/{unit.suboption_code or 'main'} - Ano {unit.year}")
+        try:
+            return await self.scrape_data_from_page(
+                unit.year, unit.option_code, unit.suboption_code,
+                unit.option_name, unit.suboption_name
+            )
+        except Exception as e:
+            logger.warning(f"Erro ao raspar {unit.option_code}/{unit.suboption_code} ano {unit.year}: {e}")
+            return None
+
+class AsyncFullScraper(AsyncBaseScraper, FullScraper):
+    """Contraparte assíncrona do FullScraper"""
+
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        max_workers: Optional[int] = None,
+        stored_sections: Optional[Set[SectionKey]] = None,
+        journal: Optional[ScrapeJournal] = None
+    ):
+        AsyncBaseScraper.__init__(self, client=client, rate_limiter=get_rate_limiter())
+        self.max_workers = max_workers or SCRAPING_CONFIG.MAX_WORKERS
+        self.delta_planner = DeltaPlanner(stored_sections) if stored_sections is not None else None
+        self.journal = journal
+
+    async def scrape_all_data(self) -> List[dict]:
+        """
+        Executa scraping completo de todas as opções e anos disponíveis.
+
+        Returns:
+            Lista de dicionários com dados raspados
+        """
+        all_units = await self._plan_all_units()
+        all_scraped_data = await self._scrape_units(all_units)
+        self._log_summary(all_scraped_data)
+
+        # Coleta concluída: o próximo ciclo começa do zero
+        if self.journal:
+            await asyncio.to_thread(self.journal.clear)
+
+        return self._convert_to_dict_format(all_scraped_data)
+
+    async def iter_scrape(self, on_plan: Optional[Callable[[int], None]] = None) -> AsyncIterator[dict]:
+        """
+        Versão assíncrona de FullScraper.iter_scrape: entrega cada seção assim
+        que é extraída, com no máximo `max_workers` páginas em andamento.
+
+        Args:
+            on_plan: Chamado com o número de páginas planejadas, antes da coleta
+
+        Yields:
+            Dicionário de uma seção (mesmo formato de scrape_all_data)
+        """
+        units = await self._plan_all_units()
+        if on_plan:
+            on_plan(len(units))
+        restored = await asyncio.to_thread(self._restored_units, units)
+        # O diário é lido linha a linha em thread, fora do event loop
+        entries = self._iter_restored(restored)
+        while (section := await asyncio.to_thread(next, entries, None)) is not None:
+            yield section
+
+        pending = [unit for unit in units if unit not in restored]
+        window = max(1, self.max_workers)
+        logger.info(f"Raspando {len(pending)} páginas em streaming com até {window} requisições simultâneas")
+
+        in_flight = deque()
+        try:
+            for unit in pending:
+                in_flight.append(asyncio.create_task(self._scrape_unit(unit)))
+                if len(in_flight) >= window:
+                    section = self._take_section(await in_flight.popleft())
+                    if section:
+                        yield section
+
+            while in_flight:
+                section = self._take_section(await in_flight.popleft())
+                if section:
+                    yield section
+        finally:
+            # Consumidor interrompeu a iteração: cancela as páginas em andamento
+            for task in in_flight:
+                task.cancel()
+
+        if self.journal:
+            await asyncio.to_thread(self.journal.clear)
+
+    async def _plan_all_units(self) -> List[ScrapeUnit]:
+        """Planeja as páginas de todas as opções concorrentemente"""
+        planned = await asyncio.gather(
+            *(self._plan_option_units(option_code) for option_code in MAIN_OPTIONS_TO_SCRAPE),
+            return_exceptions=True
+        )
+
+        all_units: List[ScrapeUnit] = []
+        for option_code, result in zip(MAIN_OPTIONS_TO_SCRAPE, planned):
+            if isinstance(result, ScrapingError):
+                logger.error(f"Erro ao processar opção {option_code}: {result}")
+            elif isinstance(result, Exception):
+                logger.error(f"Erro inesperado ao processar opção {option_code}: {result}")
+            else:
+                all_units.extend(result)
+        return all_units
+
+    async def _plan_option_units(self, option_code: str) -> List[ScrapeUnit]:
+        """Obtém metadados de uma opção e monta a lista de páginas a raspar"""
+        logger.info(f"Processando opção: {option_code}")
+        metadata = await self.get_page_metadata(option_code)
+
+        min_year = metadata.min_year or SCRAPING_CONFIG.FALLBACK_MIN_YEAR
+        max_year = metadata.max_year or SCRAPING_CONFIG.FALLBACK_MAX_YEAR
+
+        logger.info(f"Opção {option_code} ({metadata.display_name}): anos {min_year}-{max_year}")
+
+        # O plano delta lê do disco as seções vazias registradas: fora do event loop
+        return await asyncio.to_thread(
+            self._apply_delta_plan,
+            option_code, metadata, self.build_units(option_code, metadata, range(min_year, max_year + 1))
+        )
+
+    async def _scrape_units(self, units: List[ScrapeUnit]) -> List[ScrapedData]:
+        """Raspa as páginas concorrentemente; os resultados mantêm a ordem das unidades"""
+        if not units:
+            return []
+
+        restored = await asyncio.to_thread(self._restore_checkpoint, units)
+        pending = [unit for unit in units if unit not in restored]
+
+        logger.info(f"Raspando {len(pending)} páginas com até {self.max_workers} requisições simultâneas")
+        results = await self._gather_units(pending, self.max_workers)
+        return self._merge_results(units, restored, dict(zip(pending, results)))
+
+    async def _scrape_unit(self, unit: ScrapeUnit) -> Optional[ScrapedData]:
+        """Raspa uma unidade (página) e registra no checkpoint, se houver"""
+        data = await AsyncBaseScraper._scrape_unit(self, unit)
+        if data is not None and self.journal:
+            await asyncio.to_thread(self.journal.record, unit, data)
+        if data is not None and not data.data:
+            await asyncio.to_thread(self._mark_empty, unit)
+        return data
+
+class AsyncPartialScraper(AsyncBaseScraper, PartialScraper):
+    """Contraparte assíncrona do PartialScraper"""
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, max_workers: Optional[int] = None):
+        AsyncBaseScraper.__init__(self, client=client, rate_limiter=get_rate_limiter())
+        self.max_workers = max_workers or SCRAPING_CONFIG.MAX_WORKERS
+
+    async def scrape_by_params(
+        self,
+        ano_min: int,
+        ano_max: int,
+        opcao_nome: str,
+        skip_sections: Optional[Set[SectionKey]] = None,
+        on_plan: Optional[Callable[[List[SectionKey]], None]] = None
+    ) -> List[dict]:
+        """
+        Executa scraping por parâmetros específicos.
+
+        Args:
+            skip_sections: Seções (aba, subopcao, ano) já disponíveis no banco,
+                cujas páginas não são buscadas
+            on_plan: Chamado com as seções (aba, subopcao, ano) planejadas, antes da coleta
+
+        Raises:
+            InvalidOptionError: Se opção for inválida
+            YearRangeError: Se range de anos for inválido
+        """
+        self._validate_params(ano_min, ano_max, opcao_nome)
+
+        option_code = OPCOES_MAPPING[opcao_nome]
+        logger.info(f"Raspando {opcao_nome} ({option_code}) de {ano_min} a {ano_max}")
+
+        metadata = await self.get_page_metadata(option_code, ano_max)
+        units = self.build_units(option_code, metadata, range(ano_min, ano_max + 1))
+        if skip_sections:
+            planned = [unit for unit in units if (unit.option_name, unit.suboption_name, unit.year) not in skip_sections]
+            logger.info(f"{len(units) - len(planned)} de {len(units)} páginas já disponíveis no banco")
+            units = planned
+        if on_plan:
+            on_plan([(unit.option_name, unit.suboption_name, unit.year) for unit in units])
+
+        results = await self._gather_units(units, self.max_workers)
+        scraped_data = [data for data in results if data and data.data]
+
+        logger.info(f"Coleta concluída: {len(scraped_data)} conjuntos de dados")
+        return self._convert_to_dict_format(scraped_data)
+
+# Funções de conveniência para a camada de serviço
+async def run_full_scrape_async(
+    max_workers: Optional[int] = None,
+    stored_sections: Optional[Set[SectionKey]] = None,
+    journal: Optional[ScrapeJournal] = None
+) -> List[dict]:
+    """
+    Versão assíncrona de run_full_scrape.
+
+    Args:
+        max_workers: Número máximo de requisições simultâneas
+        stored_sections: Seções já armazenadas, para coleta incremental (modo "delta")
+        journal: Diário de checkpoint da execução (ver get_scrape_journal); None desativa a retomada
+
+    Returns:
+        Lista de dicionários com dados raspados
+    """
+    scraper = AsyncFullScraper(
+        max_workers=max_workers,
+        stored_sections=stored_sections,
+        journal=journal
+    )
+    async with scraper:
+        return await scraper.scrape_all_data()
+
+async def iter_full_scrape_async(
+    max_workers: Optional[int] = None,
+    stored_sections: Optional[Set[SectionKey]] = None,
+    journal: Optional[ScrapeJournal] = None,
+    on_plan: Optional[Callable[[int], None]] = None
+) -> AsyncIterator[dict]:
+    """
+    Versão em streaming de run_full_scrape_async: entrega cada seção assim que
+    é extraída, sem acumular o conjunto de dados em memória.
+
+    Args:
+        on_plan: Chamado com o número de páginas planejadas, antes da coleta
+
+    Yields:
+        Dicionário de uma seção raspada
+    """
+    scraper = AsyncFullScraper(
+        max_workers=max_workers,
+        stored_sections=stored_sections,
+        journal=journal
+    )
+    async with scraper:
+        async for section in scraper.iter_scrape(on_plan=on_plan):
+            yield section
+
+async def run_scrape_by_params_async(
+    ano_min: int,
+    ano_max: int,
+    opcao_nome: str,
+    skip_sections: Optional[Set[SectionKey]] = None,
+    on_plan: Optional[Callable[[List[SectionKey]], None]] = None
+) -> List[dict]:
+    """
+    Versão assíncrona de run_scrape_by_params.
+
+    Args:
+        skip_sections: Seções já disponíveis no banco, que não são raspadas
+        on_plan: Chamado com as seções planejadas (ausentes ou vencidas), antes da coleta
+
+    Returns:
+        Lista de dicionários com dados raspados
+    """
+    async with AsyncPartialScraper() as scraper:
+        return await scraper.scrape_by_params(ano_min, ano_max, opcao_nome, skip_sections=skip_sections, on_plan=on_plan)
@@ -4,13 +4,20 @@ from bs4 import BeautifulSoup
 from urllib.parse import urlencode
 import time
 import logging
+from contextlib import contextmanager
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 
 from src.app.utils.constants import BASE_URL_VITIBRASIL
-from .config import SCRAPING_CONFIG, NUMERIC_KEYWORDS, UNIT_PATTERNS
-from .utils import normalize_text, parse_numeric_value, extract_year_range
+from .config import SCRAPING_CONFIG
+from .utils import normalize_text, extract_year_range
 from .exceptions import PageNotFoundError, TableNotFoundError
+from .rate_limiter import TokenBucketRateLimiter, HostConcurrencyLimiter
+from .http_session import get_http_session
+from .page_cache import PageCache, CachedPage, FetchedPage, content_hash, get_page_cache
+from .metadata_cache import MetadataCache, get_metadata_cache
+from . import lxml_extractor
+from .column_plan import compile_column_plan, is_numeric_column, split_header_unit
 
 logger = logging.getLogger(__name__)
 
@@ -35,33 +42,94 @@ class ScrapedData:
     option_name: str
     sub_option_name: Optional[str]
     data: List[Dict[str, Any]]
+    unchanged: bool = False  # Página revalidada pelo cache (304 ou mesmo hash): dados não foram reprocessados
+
+@dataclass(frozen=True)
+class ScrapeUnit:
+    """Unidade de raspagem: uma página (opção × ano × subopção)"""
+    year: int
+    option_code: str
+    suboption_code: Optional[str]
+    option_name: str
+    suboption_name: Optional[str]
 
 class BaseScraper:
     """Classe base para scraping do Vitibrasil"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        rate_limiter: Optional[TokenBucketRateLimiter] = None,
+        host_limiter: Optional[HostConcurrencyLimiter] = None,
+        session: Optional[requests.Session] = None,
+        page_cache: Optional[PageCache] = None,
+        metadata_cache: Optional[MetadataCache] = None
+    ):
         self.base_url = BASE_URL_VITIBRASIL
         self.config = SCRAPING_CONFIG
+        self.rate_limiter = rate_limiter
+        self.host_limiter = host_limiter
+        self._session = session
+        self.page_cache = page_cache if page_cache is not None else get_page_cache()
+        self.metadata_cache = metadata_cache if metadata_cache is not None else get_metadata_cache()
+        # Páginas buscadas para metadados nesta execução, reaproveitadas como páginas de dados
+        self._page_memo: Dict[str, FetchedPage] = {}
     
-    def get_page_soup(self, url: str, description: str = "page") -> Optional[BeautifulSoup]:
+    @property
+    def session(self) -> requests.Session:
+        """Sessão HTTP com pool keep-alive compartilhado no processo (uma por thread)"""
+        return self._session or get_http_session()
+    
+    @contextmanager
+    def _request_slot(self, url: str):
         """
-        Busca e parseia uma página, retornando objeto BeautifulSoup.
+        Aguarda vaga de conexão com o host e, já com a vaga, o token do limitador
+        de taxa (se configurados). O token é consumido logo antes do envio: quem
+        espera vaga não gasta token, e a taxa não se acumula quando as vagas liberam.
+        """
+        if self.host_limiter:
+            with self.host_limiter.slot(url):
+                if self.rate_limiter:
+                    self.rate_limiter.acquire()
+                yield
+        else:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            yield
+    
+    def fetch_page(self, url: str, description: str = "page") -> Optional[FetchedPage]:
+        """
+        Busca uma página, usando requisição condicional quando ela está no cache.
         
         Args:
             url: URL da página
             description: Descrição para logs
             
         Returns:
-            BeautifulSoup object ou None se falhar
+            FetchedPage com o conteúdo (do servidor ou do cache, se inalterado)
             
         Raises:
             PageNotFoundError: Se não conseguir carregar a página após tentativas
         """
+        memoized = self._take_memoized_page(url)
+        if memoized:
+            return memoized
+        
+        cached = self.page_cache.get(url) if self.page_cache else None
+        headers = cached.conditional_headers() if cached else {}
+        
         for attempt in range(1, self.config.MAX_RETRIES + 1):
             try:
-                resp = requests.get(url, timeout=self.config.TIMEOUT)
+                with self._request_slot(url):
+                    resp = self.session.get(url, timeout=self.config.TIMEOUT, headers=headers)
+                if resp.status_code == 304 and cached:
+                    not_modified = self._not_modified_page(url, cached)
+                    if not_modified:
+                        return not_modified
+                    # Corpo do cache indisponível: repete sem requisição condicional
+                    cached, headers = None, {}
+                    continue
                 resp.raise_for_status()
-                return BeautifulSoup(resp.content, 'lxml')
+                return self._build_fetched_page(url, resp.content, resp.headers, cached)
             except requests.exceptions.RequestException as e:
                 logger.warning(f"Tentativa {attempt}/{self.config.MAX_RETRIES} falhou para {description}: {e}")
                 if attempt == self.config.MAX_RETRIES:
@@ -70,6 +138,53 @@ class BaseScraper:
         
         return None
     
+    def _take_memoized_page(self, url: str) -> Optional[FetchedPage]:
+        """Retorna (e descarta do memo) a página já buscada nesta execução, se houver"""
+        page = self._page_memo.pop(url, None)
+        if page:
+            logger.debug(f"Reaproveitando página já buscada: {url}")
+        return page
+    
+    def _not_modified_page(self, url: str, cached: CachedPage) -> Optional[FetchedPage]:
+        """Monta a página a partir do cache após resposta 304"""
+        body = cached.read_body()
+        if body is None:
+            return None
+        return FetchedPage(url, body, True, cached.etag, cached.last_modified, cached)
+    
+    def _build_fetched_page(
+        self, url: str, content: bytes, resp_headers, cached: Optional[CachedPage]
+    ) -> FetchedPage:
+        """Monta a página buscada, marcando-a como inalterada se o hash do corpo coincidir com o cache"""
+        unchanged = cached is not None and cached.content_hash == content_hash(content)
+        return FetchedPage(
+            url, content, unchanged,
+            resp_headers.get('ETag'), resp_headers.get('Last-Modified'), cached
+        )
+    
+    def get_page_soup(self, url: str, description: str = "page") -> Optional[BeautifulSoup]:
+        """
+        Busca e parseia uma página, retornando objeto BeautifulSoup.
+        
+        Args:
+            url: URL da página
+            description: Descrição para logs
+            
+        Returns:
+            BeautifulSoup object ou None se falhar
+            
+        Raises:
+            PageNotFoundError: Se não conseguir carregar a página após tentativas
+        """
+        page = self.fetch_page(url, description)
+        if not page:
+            return None
+        
+        if self.page_cache and not page.unchanged:
+            self.page_cache.store(page)
+        self._page_memo[url] = page
+        return BeautifulSoup(page.content, 'lxml')
+    
     def get_page_metadata(self, option_code: str, reference_year: Optional[int] = None) -> PageMetadata:
         """
         Obtém metadados de uma página de opção.
@@ -79,8 +194,13 @@ class BaseScraper:
             reference_year: Ano de referência para buscar metadados
             
         Returns:
-            PageMetadata com informações da página
+            PageMetadata com informações da página (do cache de metadados, se válido)
         """
+        cached = self.metadata_cache.get(option_code) if self.metadata_cache else None
+        if cached:
+            logger.info(f"Metadados de {option_code} obtidos do cache")
+            return cached
+        
         if reference_year is None:
             reference_year = self.config.DEFAULT_REFERENCE_YEAR
         
@@ -90,6 +210,24 @@ class BaseScraper:
         if not soup:
             return PageMetadata(None, None, [], normalize_text(option_code) or option_code)
         
+        metadata = self._parse_page_metadata(soup, option_code)
+        
+        # Se não encontrou anos e há subopções, tenta com primeira subopção
+        if (metadata.min_year is None or metadata.max_year is None) and metadata.sub_options:
+            metadata.min_year, metadata.max_year = self._try_get_years_from_suboption(
+                option_code, metadata.sub_options[0].code, reference_year
+            )
+        
+        self._store_metadata(option_code, metadata)
+        return metadata
+    
+    def _store_metadata(self, option_code: str, metadata: PageMetadata) -> None:
+        """Guarda no cache apenas metadados completos (com range de anos)"""
+        if self.metadata_cache and metadata.min_year is not None and metadata.max_year is not None:
+            self.metadata_cache.store(option_code, metadata)
+    
+    def _parse_page_metadata(self, soup: BeautifulSoup, option_code: str) -> PageMetadata:
+        """Extrai nome da opção, range de anos e subopções de uma página já carregada"""
         # Extrai nome da opção
         display_name = self._extract_option_display_name(soup, option_code)
         
@@ -99,14 +237,32 @@ class BaseScraper:
         # Extrai subopções
         sub_options = self._extract_sub_options(soup)
         
-        # Se não encontrou anos e há subopções, tenta com primeira subopção
-        if (min_year is None or max_year is None) and sub_options:
-            min_year, max_year = self._try_get_years_from_suboption(
-                option_code, sub_options[0].code, reference_year
-            )
-        
         return PageMetadata(min_year, max_year, sub_options, display_name)
     
+    def build_units(self, option_code: str, metadata: PageMetadata, years: range) -> List[ScrapeUnit]:
+        """
+        Monta a lista de páginas a raspar para uma opção.
+        
+        Args:
+            option_code: Código da opção
+            metadata: Metadados da opção (nome e subopções)
+            years: Anos a raspar
+            
+        Returns:
+            Lista de ScrapeUnit na ordem ano → subopção
+        """
+        units = []
+        for year in years:
+            if not metadata.sub_options:
+                units.append(ScrapeUnit(year, option_code, None, metadata.display_name, None))
+            else:
+                for sub_option in metadata.sub_options:
+                    units.append(ScrapeUnit(
+                        year, option_code, sub_option.code,
+                        metadata.display_name, sub_option.name
+                    ))
+        return units
+    
     def scrape_data_from_page(
         self, 
         year: int, 
@@ -128,31 +284,49 @@ class BaseScraper:
         Returns:
             ScrapedData com os dados extraídos
         """
-        params = {'ano': year, 'opcao': option_code}
-        if suboption_code:
-            params['subopcao'] = suboption_code
-        
-        url = self._build_url(params)
+        url = self._build_page_url(year, option_code, suboption_code)
         description = self._build_page_description(option_code, suboption_code, year)
         
-        soup = self.get_page_soup(url, description)
+        page = self.fetch_page(url, description)
         
         final_option_name = option_display_name or normalize_text(option_code) or option_code
         final_suboption_name = suboption_display_name
         
-        if not soup:
+        if not page:
             logger.warning(f"Falha ao carregar dados de {url}")
             return ScrapedData(year, final_option_name, final_suboption_name, [])
         
+        # Página inalterada desde a última coleta: reaproveita os dados já extraídos
+        cached_data = self._cached_table_data(page, description)
+        if cached_data is not None:
+            return ScrapedData(year, final_option_name, final_suboption_name, cached_data, unchanged=True)
+        
         # Extrai dados da tabela
-        table_data = self._extract_table_data(soup, url, option_code)
+        table_data = self._extract_page_table_data(page.content, url, option_code)
+        
+        if self.page_cache:
+            self.page_cache.store(page, table_data)
         
         return ScrapedData(year, final_option_name, final_suboption_name, table_data)
     
+    def _cached_table_data(self, page: FetchedPage, description: str) -> Optional[List[Dict[str, Any]]]:
+        """Retorna os dados do cache se a página não mudou e já foi processada"""
+        if page.unchanged and page.cached and page.cached.data is not None:
+            logger.info(f"Página inalterada, reaproveitando dados do cache: {description}")
+            return page.cached.data
+        return None
+    
     def _build_url(self, params: Dict[str, Any]) -> str:
         """Constrói URL com parâmetros"""
         return self.base_url + urlencode(params)
     
+    def _build_page_url(self, year: int, option_code: str, suboption_code: Optional[str] = None) -> str:
+        """Constrói URL da página de dados de um ano/opção/subopção"""
+        params = {'ano': year, 'opcao': option_code}
+        if suboption_code:
+            params['subopcao'] = suboption_code
+        return self._build_url(params)
+    
     def _build_page_description(self, option_code: str, suboption_code: Optional[str], year: int) -> str:
         """Constrói descrição da página para logs"""
         desc = f"data for {option_code}"
@@ -225,11 +399,7 @@ class BaseScraper:
     ) -> tuple[Optional[int], Optional[int]]:
         """Tenta obter anos usando uma subopção"""
         try:
-            url = self._build_url({
-                'ano': reference_year, 
-                'opcao': option_code, 
-                'subopcao': suboption_code
-            })
+            url = self._build_page_url(reference_year, option_code, suboption_code)
             soup = self.get_page_soup(url, f"metadata for {option_code} with suboption")
             if soup:
                 return self._extract_year_range(soup)
@@ -238,6 +408,96 @@ class BaseScraper:
         
         return None, None
     
+    def _extract_page_table_data(self, content: bytes, url: str, option_code: str) -> List[Dict[str, Any]]:
+        """Extrai dados da tabela principal com o motor configurado em PARSER_ENGINE"""
+        if self.config.PARSER_ENGINE == "bs4":
+            return self._extract_table_data(BeautifulSoup(content, 'lxml'), url, option_code)
+        return self._extract_table_data_lxml(content, url, option_code)
+    
+    def _extract_table_data_lxml(self, content: bytes, url: str, option_code: str) -> List[Dict[str, Any]]:
+        """Extrai dados da tabela principal parseando apenas `table.tb_dados` com lxml"""
+        table = lxml_extractor.parse_data_table(content)
+        if table is None:
+            logger.info(f"Tabela de dados não encontrada em {url}")
+            return []
+        
+        headers = self._extract_table_headers_lxml(table, url)
+        if not headers:
+            return []
+        
+        return self._extract_table_rows_lxml(table, headers, option_code)
+    
+    def _extract_table_headers_lxml(self, table, url: str) -> List[str]:
+        """Extrai cabeçalhos da tabela (mesmas regras de _extract_table_headers)"""
+        headers = [normalize_text(lxml_extractor.cell_text(cell)) for cell in lxml_extractor.header_cells(table)]
+        headers = [h for h in headers if h]
+        
+        if not headers:
+            logger.info(f"Não foi possível extrair cabeçalhos de {url}, usando genéricos")
+            rows = lxml_extractor.data_rows(table)
+            column_count = sum(1 for _ in lxml_extractor.row_cells(rows[0])) if rows else 0
+            if column_count:
+                headers = [f"coluna_{i+1}" for i in range(column_count)]
+            else:
+                headers = ["coluna_1", "coluna_2"]
+        
+        return headers
+    
+    def _extract_table_rows_lxml(self, table, headers: List[str], option_code: str) -> List[Dict[str, Any]]:
+        """
+        Extrai dados das linhas percorrendo cada linha uma única vez.
+        
+        Produz a mesma saída de _extract_table_rows: texto e classes de cada
+        célula são lidos uma vez e reaproveitados nas verificações de
+        categoria, total e na montagem da linha.
+        """
+        data = []
+        contextual_category = None
+        min_columns = min(len(headers), 2)
+        plan = compile_column_plan(headers, option_code)
+        
+        for row in lxml_extractor.data_rows(table):
+            cols = list(lxml_extractor.row_cells(row))
+            if not cols:
+                continue
+            
+            first_cell = cols[0]
+            first_text = lxml_extractor.cell_text(first_cell)
+            first_classes = lxml_extractor.cell_classes(first_cell)
+            
+            # Linha de categoria
+            is_category = (
+                len(cols) == 1 and (
+                    'colspan' in first_cell.attrib or lxml_extractor.has_descendant(first_cell, 'strong')
+                )
+            ) or (
+                option_code == "opt_03" and len(cols) >= 2 and
+                'tb_item' in first_classes and 'tb_item' in lxml_extractor.cell_classes(cols[1])
+            )
+            if is_category:
+                if first_text and not first_text.lower().startswith(("total", "subtotal")):
+                    contextual_category = first_text
+                continue
+            
+            # Linhas de total/subtotal
+            if first_text.lower().startswith(("total", "subtotal")):
+                continue
+            
+            if len(cols) < min_columns:
+                continue
+            
+            texts = [first_text] + [lxml_extractor.cell_text(cell) for cell in cols[1:len(headers)]]
+            row_data = plan.build_row(texts)
+            if row_data:
+                row_data["categoria_tabela"] = contextual_category
+                data.append(row_data)
+                
+                if option_code in ("opt_02", "opt_04") and 'tb_item' in first_classes:
+                    if first_text and not first_text.lower().startswith("total"):
+                        contextual_category = first_text
+        
+        return data
+    
     def _extract_table_data(self, soup: BeautifulSoup, url: str, option_code: str) -> List[Dict[str, Any]]:
         """Extrai dados da tabela principal"""
         # Encontra tabela
@@ -304,6 +564,7 @@ class BaseScraper:
         """Extrai dados das linhas da tabela"""
         data = []
         contextual_category = None
+        plan = compile_column_plan(headers, option_code)
         
         # Encontra linhas de dados
         body = table.find('tbody')
@@ -332,7 +593,7 @@ class BaseScraper:
                 continue
             
             # Extrai dados da linha
-            row_data = self._extract_row_data(cols, headers, option_code)
+            row_data = plan.build_row([cell.get_text(strip=True) for cell in cols[:len(headers)]])
             if row_data:
                 row_data["categoria_tabela"] = contextual_category
                 data.append(row_data)
@@ -370,66 +631,16 @@ class BaseScraper:
     
     def _extract_row_data(self, cols: List, headers: List[str], option_code: str) -> Optional[Dict[str, Any]]:
         """Extrai dados de uma linha"""
-        row_data = {}
-        
-        for i, cell in enumerate(cols):
-            if i >= len(headers):
-                break
-            
-            header = headers[i]
-            value_str = cell.get_text(strip=True)
-            
-            # Determina se deve tentar conversão numérica
-            is_numeric = self._should_convert_to_numeric(header, i, headers, option_code)
-            
-            # Converte valor
-            if is_numeric:
-                cleaned_value = parse_numeric_value(value_str)
-                if cleaned_value is None and value_str not in ['-', '']:
-                    cleaned_value = value_str  # Mantém string se não conseguir converter
-            else:
-                cleaned_value = value_str if value_str not in ['-', ''] else None
-            
-            # Processa chaves com unidades
-            self._process_header_with_units(header, cleaned_value, row_data)
-        
-        # Retorna apenas se tem dados válidos
-        return row_data if any(v is not None for v in row_data.values()) else None
+        plan = compile_column_plan(headers, option_code)
+        return plan.build_row([cell.get_text(strip=True) for cell in cols[:len(headers)]])
     
     def _should_convert_to_numeric(self, header: str, index: int, headers: List[str], option_code: str) -> bool:
         """Determina se um valor deve ser convertido para numérico"""
-        # Verifica palavras-chave no header
-        if any(keyword in header for keyword in NUMERIC_KEYWORDS):
-            return True
-        
-        # Última coluna geralmente é numérica
-        if len(headers) > 1 and index == len(headers) - 1:
-            return True
-        
-        # Regras específicas para certas opções
-        if option_code in ("opt_05", "opt_06"):
-            if (len(headers) > 1 and header == headers[1]) or \
-               (len(headers) > 2 and header == headers[2]):
-                return True
-        
-        return False
+        return is_numeric_column(header, index, headers, option_code)
     
     def _process_header_with_units(self, header: str, value: Any, row_data: Dict[str, Any]) -> None:
         """Processa header que pode ter unidades embutidas"""
-        
-        # Formato com duplo underscore: quantidade__kg
-        if "__" in header:
-            parts = header.split("__", 1)
-            base_name, unit = parts[0], parts[1]
-            row_data[base_name] = value
+        base_name, unit = split_header_unit(header)
+        row_data[base_name] = value
+        if unit is not None:
             row_data[f"unidade_{base_name}"] = unit
-        
-        # Formato com sufixo de unidade: quantidade_kg
-        elif re.match(r"^(.*)_(" + "|".join(UNIT_PATTERNS) + r")$", header):
-            match = re.match(r"^(.*)_(" + "|".join(UNIT_PATTERNS) + r")$", header)
-            base_name, unit = match.group(1), match.group(2)
-            row_data[base_name] = value
-            row_data[f"unidade_{base_name}"] = unit
-        
-        else:
-            row_data[header] = value
\ No newline at end of file
@@ -0,0 +1,191 @@
+# src/app/scraper/checkpoint.py
+import json
+import os
+import threading
+import time
+import logging
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from .base_scraper import ScrapedData, ScrapeUnit
+from .config import SCRAPING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Chave de uma unidade no diário: (opção, subopção, ano)
+UnitKey = Tuple[str, Optional[str], int]
+
+def unit_key(unit: ScrapeUnit) -> UnitKey:
+    return (unit.option_code, unit.suboption_code, unit.year)
+
+def journal_path(mode: str, run_id) -> str:
+    """Caminho do diário de uma execução: um arquivo por modo e id da execução (job)"""
+    return os.path.join(SCRAPING_CONFIG.CHECKPOINT_DIR, f"{mode}-{run_id}.jsonl")
+
+# Um lock por arquivo, compartilhado entre instâncias que abrem o mesmo diário
+_path_locks: Dict[str, threading.Lock] = {}
+_path_locks_guard = threading.Lock()
+
+def _lock_for(path: str) -> threading.Lock:
+    with _path_locks_guard:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+class ScrapeJournal:
+    """
+    Diário de checkpoint de uma coleta completa, em arquivo JSONL só de acréscimo.
+
+    Cada página concluída vira uma linha com a unidade e os dados extraídos,
+    gravada com flush + fsync. Se a coleta for interrompida (timeout do worker,
+    deploy), a próxima execução lê o diário e busca apenas as páginas que
+    faltam. O diário é removido quando a coleta termina com sucesso, e
+    descartado se estiver parado há mais de `max_age_seconds`.
+    """
+
+    def __init__(self, path: str, max_age_seconds: Optional[float] = None):
+        self.path = path
+        self.max_age_seconds = (
+            SCRAPING_CONFIG.CHECKPOINT_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+        )
+        self._lock = _lock_for(path)
+
+    def adopt(self, source_path: str) -> bool:
+        """
+        Assume o diário de uma execução anterior interrompida (rename atômico).
+
+        Só uma execução consegue assumir um mesmo diário; diários expirados
+        são descartados.
+
+        Returns:
+            True se o diário foi assumido
+        """
+        if source_path == self.path or not os.path.exists(source_path):
+            return False
+        with _lock_for(source_path), self._lock:
+            try:
+                if time.time() - os.path.getmtime(source_path) > self.max_age_seconds:
+                    os.remove(source_path)
+                    return False
+                os.replace(source_path, self.path)
+            except OSError as e:
+                logger.warning(f"Não foi possível retomar o diário de checkpoint {source_path}: {e}")
+                return False
+        logger.info(f"Diário de checkpoint {source_path} assumido por {self.path}")
+        return True
+
+    def load(self) -> Dict[UnitKey, ScrapedData]:
+        """
+        Lê as páginas já concluídas.
+
+        Returns:
+            Dicionário (opção, subopção, ano) → ScrapedData; vazio se não houver diário válido
+        """
+        return dict(self.iter_entries())
+
+    def completed_keys(self) -> Set[UnitKey]:
+        """Chaves das páginas já concluídas, sem manter os dados em memória"""
+        return {key for key, _ in self.iter_entries()}
+
+    def iter_entries(self) -> Iterator[Tuple[UnitKey, ScrapedData]]:
+        """
+        Percorre o diário linha a linha, sem carregá-lo inteiro.
+
+        Yields:
+            ((opção, subopção, ano), ScrapedData) de cada página concluída
+        """
+        if not os.path.exists(self.path):
+            return
+
+        if self._is_stale():
+            logger.info(f"Diário de checkpoint {self.path} expirado, iniciando coleta do zero")
+            self.clear()
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, start=1):
+                    try:
+                        entry = json.loads(line)
+                        key = (entry["option_code"], entry["suboption_code"], entry["year"])
+                        data = ScrapedData(
+                            entry["year"], entry["option_name"], entry["suboption_name"],
+                            entry["data"], entry.get("unchanged", False)
+                        )
+                    except (ValueError, KeyError, TypeError):
+                        # Última linha incompleta (processo morto durante a escrita)
+                        logger.warning(f"Linha {line_number} do diário de checkpoint ignorada")
+                        continue
+                    yield key, data
+        except OSError as e:
+            logger.warning(f"Não foi possível ler o diário de checkpoint {self.path}: {e}")
+
+    def record(self, unit: ScrapeUnit, data: ScrapedData) -> None:
+        """Registra uma página concluída de forma durável"""
+        line = json.dumps({
+            "option_code": unit.option_code,
+            "suboption_code": unit.suboption_code,
+            "year": unit.year,
+            "option_name": data.option_name,
+            "suboption_name": data.sub_option_name,
+            "data": data.data,
+            "unchanged": data.unchanged,
+        }, ensure_ascii=False)
+
+        try:
+            with self._lock:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError as e:
+            logger.warning(f"Não foi possível registrar checkpoint de {unit_key(unit)}: {e}")
+
+    def clear(self) -> None:
+        """Remove o diário (coleta concluída ou diário expirado)"""
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Não foi possível remover o diário de checkpoint {self.path}: {e}")
+
+    def _is_stale(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self.path) > self.max_age_seconds
+        except OSError:
+            return False
+
+def get_scrape_journal(mode: str, run_id, resume_from=None) -> Optional[ScrapeJournal]:
+    """
+    Retorna o diário de checkpoint de uma execução, ou None se desabilitado.
+
+    Args:
+        mode: Modo da coleta ('full' ou 'delta')
+        run_id: Identificador da execução (id do job)
+        resume_from: Id de uma execução anterior do mesmo modo, interrompida,
+            cujo diário é assumido para retomar a coleta
+    """
+    if not SCRAPING_CONFIG.CHECKPOINT_ENABLED:
+        return None
+    _remove_stale_journals()
+    journal = ScrapeJournal(journal_path(mode, run_id))
+    if resume_from is not None:
+        journal.adopt(journal_path(mode, resume_from))
+    return journal
+
+def _remove_stale_journals() -> None:
+    """Remove diários abandonados (execuções que falharam e nunca foram retomadas)"""
+    directory = SCRAPING_CONFIG.CHECKPOINT_DIR
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(".jsonl")]
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if time.time() - os.path.getmtime(path) > SCRAPING_CONFIG.CHECKPOINT_MAX_AGE_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass
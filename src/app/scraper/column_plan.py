@@ -0,0 +1,120 @@
+# src/app/scraper/column_plan.py
+"""
+Plano de colunas compilado uma vez por tabela.
+
+A análise dos cabeçalhos (conversão numérica, separação de unidades) depende
+apenas da lista de cabeçalhos e da opção raspada, então é feita uma única vez
+e reaproveitada em todas as linhas da tabela.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .config import NUMERIC_KEYWORDS, UNIT_PATTERNS
+from .utils import parse_numeric_value
+
+# Formato com sufixo de unidade: quantidade_kg
+UNIT_SUFFIX_RE = re.compile(r"^(.*)_(" + "|".join(UNIT_PATTERNS) + r")$")
+
+_EMPTY_VALUES = frozenset(["-", ""])
+
+@dataclass(frozen=True)
+class ColumnSpec:
+    """Regras de extração de uma coluna"""
+    key: str
+    unit_key: Optional[str]
+    unit: Optional[str]
+    numeric: bool
+
+@dataclass(frozen=True)
+class ColumnPlan:
+    """Plano de extração de uma tabela: uma ColumnSpec por cabeçalho"""
+    columns: Tuple[ColumnSpec, ...]
+
+    def build_row(self, texts: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """
+        Monta os dados de uma linha a partir dos textos das células.
+
+        Args:
+            texts: Texto de cada célula (células além dos cabeçalhos são ignoradas)
+
+        Returns:
+            Dicionário da linha, ou None se nenhum valor for válido
+        """
+        row_data: Dict[str, Any] = {}
+        for spec, value_str in zip(self.columns, texts):
+            if spec.numeric:
+                value = parse_numeric_value(value_str)
+                if value is None and value_str not in _EMPTY_VALUES:
+                    value = value_str  # Mantém string se não conseguir converter
+            else:
+                value = value_str if value_str not in _EMPTY_VALUES else None
+
+            row_data[spec.key] = value
+            if spec.unit_key:
+                row_data[spec.unit_key] = spec.unit
+
+        return row_data if any(v is not None for v in row_data.values()) else None
+
+def is_numeric_column(header: str, index: int, headers: Sequence[str], option_code: str) -> bool:
+    """Determina se os valores de uma coluna devem ser convertidos para numérico"""
+    # Verifica palavras-chave no header
+    if any(keyword in header for keyword in NUMERIC_KEYWORDS):
+        return True
+
+    # Última coluna geralmente é numérica
+    if len(headers) > 1 and index == len(headers) - 1:
+        return True
+
+    # Regras específicas para certas opções
+    if option_code in ("opt_05", "opt_06"):
+        if (len(headers) > 1 and header == headers[1]) or \
+           (len(headers) > 2 and header == headers[2]):
+            return True
+
+    return False
+
+def split_header_unit(header: str) -> Tuple[str, Optional[str]]:
+    """
+    Separa a unidade embutida no cabeçalho.
+
+    Returns:
+        (nome_base, unidade) — unidade é None quando o cabeçalho não tem unidade
+    """
+    # Formato com duplo underscore: quantidade__kg
+    if "__" in header:
+        base_name, unit = header.split("__", 1)
+        return base_name, unit
+
+    match = UNIT_SUFFIX_RE.match(header)
+    if match:
+        return match.group(1), match.group(2)
+
+    return header, None
+
+@lru_cache(maxsize=256)
+def _compile(headers: Tuple[str, ...], option_code: str) -> ColumnPlan:
+    columns = []
+    for index, header in enumerate(headers):
+        key, unit = split_header_unit(header)
+        columns.append(ColumnSpec(
+            key=key,
+            unit_key=f"unidade_{key}" if unit is not None else None,
+            unit=unit,
+            numeric=is_numeric_column(header, index, headers, option_code),
+        ))
+    return ColumnPlan(columns=tuple(columns))
+
+def compile_column_plan(headers: List[str], option_code: str) -> ColumnPlan:
+    """
+    Compila (ou reaproveita do cache) o plano de colunas de uma tabela.
+
+    Args:
+        headers: Cabeçalhos normalizados da tabela
+        option_code: Código da opção raspada
+
+    Returns:
+        ColumnPlan com uma ColumnSpec por cabeçalho
+    """
+    return _compile(tuple(headers), option_code)
@@ -1,5 +1,5 @@
 # src/app/scraper/config.py
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
 @dataclass
@@ -11,6 +11,40 @@ class ScrapingConfig:
     REQUEST_DELAY: float = 0.5
     MAX_RETRIES: int = 3
     TIMEOUT: Tuple[int, int] = (30, 60)
+    # Coleta concorrente (FullScraper)
+    MAX_WORKERS: int = 8
+    MAX_CONCURRENT_PER_HOST: int = 4
+    # Taxa global de requisições; None = 1 / REQUEST_DELAY (mesma cortesia da coleta sequencial)
+    RATE_LIMIT_PER_SECOND: Optional[float] = None
+    RATE_LIMIT_BURST: int = 1
+    # Sessão HTTP compartilhada (pool keep-alive + retry do adapter)
+    POOL_CONNECTIONS: int = 4
+    POOL_MAXSIZE: int = 8
+    ADAPTER_MAX_RETRIES: int = 2
+    RETRY_BACKOFF_FACTOR: float = 0.5
+    RETRY_STATUS_FORCELIST: Tuple[int, ...] = (429, 500, 502, 503, 504)
+    # Cache condicional em disco das páginas (ETag / Last-Modified / hash do corpo)
+    PAGE_CACHE_ENABLED: bool = True
+    PAGE_CACHE_DIR: str = ".cache/vitibrasil_pages"
+    # Motor de extração da tabela: "lxml" (árvore lxml só da tabela) ou "bs4" (caminho legado)
+    PARSER_ENGINE: str = "lxml"
+    # Cache de metadados das opções (range de anos e subopções), compartilhado entre workers
+    METADATA_CACHE_ENABLED: bool = True
+    METADATA_CACHE_DIR: str = ".cache/vitibrasil_metadata"
+    METADATA_CACHE_TTL_SECONDS: float = 24 * 60 * 60
+    # Coleta incremental ("delta"): últimos anos publicados que ainda são rebuscados por revisões
+    DELTA_REVISION_YEARS: int = 2
+    # Diários de checkpoint da coleta completa (retomada após interrupção), um arquivo por execução
+    CHECKPOINT_ENABLED: bool = True
+    CHECKPOINT_DIR: str = ".cache/vitibrasil_checkpoints"
+    CHECKPOINT_MAX_AGE_SECONDS: float = 24 * 60 * 60
+
+    @property
+    def requests_per_second(self) -> float:
+        """Taxa efetiva de requisições por segundo"""
+        if self.RATE_LIMIT_PER_SECOND:
+            return self.RATE_LIMIT_PER_SECOND
+        return 1.0 / self.REQUEST_DELAY if self.REQUEST_DELAY > 0 else float('inf')
 
 SCRAPING_CONFIG = ScrapingConfig()
 
@@ -0,0 +1,71 @@
+# src/app/scraper/delta_planner.py
+import logging
+from dataclasses import dataclass
+from typing import AbstractSet, List, Optional, Set, Tuple
+
+from .base_scraper import PageMetadata, ScrapeUnit
+from .config import SCRAPING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Chave de uma seção armazenada: (aba, subopcao, ano)
+SectionKey = Tuple[str, Optional[str], int]
+
+@dataclass
+class DeltaPlan:
+    """Resultado do planejamento incremental de uma opção"""
+    units: List[ScrapeUnit]
+    missing: int    # Seções ainda não armazenadas (anos/subopções novos)
+    revision: int   # Seções armazenadas, mas dentro da janela de revisão
+    empty: int = 0  # Seções ausentes puladas por terem vindo vazias recentemente
+
+class DeltaPlanner:
+    """
+    Planeja uma coleta incremental comparando os metadados da Embrapa com o
+    que já está armazenado em `viticultura_data`.
+
+    Uma página entra no plano se a seção (aba, subopcao, ano) ainda não está
+    armazenada — ano ou subopção novos — ou se o ano está entre os últimos
+    `revision_years` anos publicados, que a Embrapa ainda pode revisar.
+    Páginas sem tabela nunca viram linha armazenada; as registradas como
+    vazias no cache de metadados (dentro do TTL) contam como armazenadas.
+    """
+
+    def __init__(self, stored_sections: Set[SectionKey], revision_years: Optional[int] = None):
+        self.stored_sections = stored_sections
+        self.revision_years = SCRAPING_CONFIG.DELTA_REVISION_YEARS if revision_years is None else revision_years
+
+    def plan(
+        self,
+        units: List[ScrapeUnit],
+        metadata: PageMetadata,
+        empty_sections: AbstractSet[Tuple[Optional[str], int]] = frozenset()
+    ) -> DeltaPlan:
+        """
+        Filtra as páginas de uma opção para o plano incremental.
+
+        Args:
+            units: Todas as páginas da opção (ver BaseScraper.build_units)
+            metadata: Metadados da opção (define o último ano publicado)
+            empty_sections: Páginas (código da subopção, ano) sabidamente vazias
+
+        Returns:
+            DeltaPlan com as páginas a buscar
+        """
+        max_year = metadata.max_year or max((unit.year for unit in units), default=None)
+        revision_from = max_year - self.revision_years + 1 if max_year is not None else None
+
+        planned, missing, revision, empty = [], 0, 0, 0
+        for unit in units:
+            in_revision = revision_from is not None and unit.year >= revision_from
+            if (unit.option_name, unit.suboption_name, unit.year) in self.stored_sections:
+                if in_revision:
+                    planned.append(unit)
+                    revision += 1
+            elif (unit.suboption_code, unit.year) in empty_sections and not in_revision:
+                empty += 1
+            else:
+                planned.append(unit)
+                missing += 1
+
+        return DeltaPlan(planned, missing, revision, empty)
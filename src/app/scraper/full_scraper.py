@@ -1,15 +1,39 @@
 # src/app/scraper/full_scraper.py
 import logging
-from typing import List, Optional
-from .base_scraper import BaseScraper, ScrapedData
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Set
+from .base_scraper import BaseScraper, PageMetadata, ScrapedData, ScrapeUnit
 from .config import MAIN_OPTIONS_TO_SCRAPE, SCRAPING_CONFIG
 from .exceptions import ScrapingError
+from .rate_limiter import get_rate_limiter, get_host_limiter
+from .delta_planner import DeltaPlanner, SectionKey
+from .checkpoint import ScrapeJournal, unit_key
 
 logger = logging.getLogger(__name__)
 
 class FullScraper(BaseScraper):
     """Scraper para coleta completa de dados de todas as opções"""
     
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        stored_sections: Optional[Set[SectionKey]] = None,
+        journal: Optional[ScrapeJournal] = None
+    ):
+        """
+        Args:
+            max_workers: Número de workers do pool de coleta
+            stored_sections: Seções (aba, subopcao, ano) já armazenadas; se informado,
+                a coleta é incremental ("delta") e só busca o que falta ou pode ter sido revisado
+            journal: Diário de checkpoint; se informado, a coleta pode ser retomada após interrupção
+        """
+        # Limitadores globais do processo: a cortesia com a Embrapa vale para todos os scrapers
+        super().__init__(rate_limiter=get_rate_limiter(), host_limiter=get_host_limiter())
+        self.max_workers = max_workers or SCRAPING_CONFIG.MAX_WORKERS
+        self.delta_planner = DeltaPlanner(stored_sections) if stored_sections is not None else None
+        self.journal = journal
+    
     def scrape_all_data(self, output_filepath: Optional[str] = None) -> List[dict]:
         """
         Executa scraping completo de todas as opções e anos disponíveis.
@@ -20,14 +44,107 @@ class FullScraper(BaseScraper):
         Returns:
             Lista de dicionários com dados raspados
         """
-        all_scraped_data = []
+        all_units = self._plan_all_units()
+        
+        all_scraped_data = self._scrape_units(all_units)
+        
+        self._log_summary(all_scraped_data)
+        
+        if output_filepath and all_scraped_data:
+            self._save_to_file(all_scraped_data, output_filepath)
+        
+        # Coleta concluída: o próximo ciclo começa do zero
+        if self.journal:
+            self.journal.clear()
+        
+        return self._convert_to_dict_format(all_scraped_data)
+    
+    def iter_scrape(self, on_plan: Optional[Callable[[int], None]] = None) -> Iterator[dict]:
+        """
+        Executa o scraping completo entregando cada seção assim que é extraída.
+        
+        Ao contrário de scrape_all_data, não acumula o conjunto de dados: só
+        há no máximo 2 × max_workers páginas em andamento ou aguardando
+        consumo, então a memória fica constante qualquer que seja o número de
+        anos e opções. Páginas já concluídas no checkpoint saem primeiro, lidas
+        do diário linha a linha; as demais seguem a ordem do plano. Seções
+        vazias são descartadas.
+        
+        Args:
+            on_plan: Chamado com o número de páginas planejadas, antes da coleta
+        
+        Yields:
+            Dicionário de uma seção (mesmo formato de scrape_all_data)
+        """
+        units = self._plan_all_units()
+        if on_plan:
+            on_plan(len(units))
+        restored = self._restored_units(units)
+        yield from self._iter_restored(restored)
+        
+        pending = [unit for unit in units if unit not in restored]
+        workers = max(1, min(self.max_workers, len(pending)))
+        window = 2 * workers
+        logger.info(f"Raspando {len(pending)} páginas em streaming com {workers} worker(s)")
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vitibrasil-scraper") as executor:
+            in_flight = deque()
+            try:
+                for unit in pending:
+                    in_flight.append(executor.submit(self._scrape_unit, unit))
+                    if len(in_flight) >= window:
+                        section = self._take_section(in_flight.popleft().result())
+                        if section:
+                            yield section
+                
+                while in_flight:
+                    section = self._take_section(in_flight.popleft().result())
+                    if section:
+                        yield section
+            finally:
+                # Consumidor interrompeu a iteração: descarta as páginas ainda não iniciadas
+                for future in in_flight:
+                    future.cancel()
+        
+        if self.journal:
+            self.journal.clear()
+    
+    def _take_section(self, data: Optional[ScrapedData]) -> Optional[dict]:
+        """Converte o resultado de uma página para dicionário; páginas vazias ou com falha são descartadas"""
+        return self._to_dict(data) if data and data.data else None
+    
+    def _restored_units(self, units: List[ScrapeUnit]) -> Set[ScrapeUnit]:
+        """Páginas do plano já concluídas no checkpoint (só as chaves; os dados ficam no diário)"""
+        if not self.journal:
+            return set()
+        
+        completed = self.journal.completed_keys()
+        restored = {unit for unit in units if unit_key(unit) in completed}
+        if restored:
+            logger.info(f"Retomando coleta: {len(restored)}/{len(units)} páginas já concluídas no checkpoint")
+        return restored
+    
+    def _iter_restored(self, restored: Set[ScrapeUnit]) -> Iterator[dict]:
+        """Entrega as seções das páginas restauradas lendo o diário em streaming"""
+        if not restored:
+            return
+        remaining = {unit_key(unit) for unit in restored}
+        for key, data in self.journal.iter_entries():
+            if key in remaining:
+                remaining.discard(key)
+                section = self._take_section(data)
+                if section:
+                    yield section
+    
+    def _plan_all_units(self) -> List[ScrapeUnit]:
+        """Planeja as páginas de todas as opções; falhas de uma opção não interrompem as demais"""
+        all_units: List[ScrapeUnit] = []
         
         for option_code in MAIN_OPTIONS_TO_SCRAPE:
             logger.info(f"Processando opção: {option_code}")
             
             try:
-                option_data = self._scrape_option_data(option_code)
-                all_scraped_data.extend(option_data)
+                all_units.extend(self._plan_option_units(option_code))
                 
             except ScrapingError as e:
                 logger.error(f"Erro ao processar opção {option_code}: {e}")
@@ -36,15 +153,14 @@ class FullScraper(BaseScraper):
                 logger.error(f"Erro inesperado ao processar opção {option_code}: {e}")
                 continue
         
-        self._log_summary(all_scraped_data)
-        
-        if output_filepath and all_scraped_data:
-            self._save_to_file(all_scraped_data, output_filepath)
-        
-        return self._convert_to_dict_format(all_scraped_data)
+        return all_units
     
     def _scrape_option_data(self, option_code: str) -> List[ScrapedData]:
         """Raspa dados de uma opção específica"""
+        return self._scrape_units(self._plan_option_units(option_code))
+    
+    def _plan_option_units(self, option_code: str) -> List[ScrapeUnit]:
+        """Obtém metadados de uma opção e monta a lista de páginas a raspar"""
         metadata = self.get_page_metadata(option_code)
         
         min_year = metadata.min_year or SCRAPING_CONFIG.FALLBACK_MIN_YEAR
@@ -55,25 +171,85 @@ class FullScraper(BaseScraper):
         if metadata.sub_options:
             logger.info(f"Subopções encontradas: {[(s.code, s.name) for s in metadata.sub_options]}")
         
-        option_data = []
-        
-        for year in range(min_year, max_year + 1):
-            if not metadata.sub_options:
-                # Sem subopções
-                data = self._scrape_year_data(year, option_code, None, metadata.display_name, None)
-                if data and data.data:
-                    option_data.append(data)
-            else:
-                # Com subopções
-                for sub_option in metadata.sub_options:
-                    data = self._scrape_year_data(
-                        year, option_code, sub_option.code, 
-                        metadata.display_name, sub_option.name
-                    )
-                    if data and data.data:
-                        option_data.append(data)
-        
-        return option_data
+        return self._apply_delta_plan(
+            option_code, metadata, self.build_units(option_code, metadata, range(min_year, max_year + 1))
+        )
+    
+    def _apply_delta_plan(self, option_code: str, metadata: PageMetadata, units: List[ScrapeUnit]) -> List[ScrapeUnit]:
+        """No modo delta, mantém apenas as páginas novas ou dentro da janela de revisão"""
+        if self.delta_planner is None:
+            return units
+        
+        empty_sections = self.metadata_cache.empty_sections(option_code) if self.metadata_cache else frozenset()
+        plan = self.delta_planner.plan(units, metadata, empty_sections)
+        logger.info(
+            f"Plano delta para {option_code}: {len(plan.units)}/{len(units)} páginas "
+            f"({plan.missing} novas, {plan.revision} em revisão, {plan.empty} vazias puladas)"
+        )
+        return plan.units
+    
+    def _scrape_units(self, units: List[ScrapeUnit]) -> List[ScrapedData]:
+        """
+        Raspa as páginas usando um pool de workers.
+        
+        A taxa de requisições é controlada pelo limitador global, e não pelo
+        número de workers; os resultados mantêm a ordem das unidades.
+        """
+        if not units:
+            return []
+        
+        restored = self._restore_checkpoint(units)
+        pending = [unit for unit in units if unit not in restored]
+        
+        workers = min(self.max_workers, len(pending))
+        logger.info(f"Raspando {len(pending)} páginas com {workers} worker(s)")
+        
+        if workers <= 1:
+            results = [self._scrape_unit(unit) for unit in pending]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vitibrasil-scraper") as executor:
+                results = list(executor.map(self._scrape_unit, pending))
+        
+        return self._merge_results(units, restored, dict(zip(pending, results)))
+    
+    def _restore_checkpoint(self, units: List[ScrapeUnit]) -> Dict[ScrapeUnit, ScrapedData]:
+        """Páginas do plano já concluídas em uma execução anterior interrompida"""
+        if not self.journal:
+            return {}
+        
+        completed = self.journal.load()
+        restored = {unit: completed[unit_key(unit)] for unit in units if unit_key(unit) in completed}
+        if restored:
+            logger.info(f"Retomando coleta: {len(restored)}/{len(units)} páginas já concluídas no checkpoint")
+        return restored
+    
+    def _merge_results(
+        self,
+        units: List[ScrapeUnit],
+        restored: Dict[ScrapeUnit, ScrapedData],
+        scraped: Dict[ScrapeUnit, Optional[ScrapedData]]
+    ) -> List[ScrapedData]:
+        """Junta páginas restauradas e raspadas na ordem do plano, descartando as vazias"""
+        ordered = [restored.get(unit) or scraped.get(unit) for unit in units]
+        return [data for data in ordered if data and data.data]
+    
+    def _scrape_unit(self, unit: ScrapeUnit) -> Optional[ScrapedData]:
+        """Raspa uma unidade (página) de dados e registra no checkpoint, se houver"""
+        data = self._scrape_year_data(
+            unit.year, unit.option_code, unit.suboption_code,
+            unit.option_name, unit.suboption_name
+        )
+        # Falhas (None) não são registradas: serão tentadas novamente na retomada
+        if data is not None and self.journal:
+            self.journal.record(unit, data)
+        if data is not None and not data.data:
+            self._mark_empty(unit)
+        return data
+    
+    def _mark_empty(self, unit: ScrapeUnit) -> None:
+        """Registra a página sem tabela para a coleta incremental não buscá-la de novo antes do TTL"""
+        if self.metadata_cache:
+            self.metadata_cache.mark_empty(unit.option_code, unit.suboption_code, unit.year)
     
     def _scrape_year_data(
         self, 
@@ -83,13 +259,10 @@ class FullScraper(BaseScraper):
         option_name: str,
         suboption_name: Optional[str]
     ) -> Optional[ScrapedData]:
-        """Raspa dados de um ano específico com delay"""
-        import time
-        
+        """Raspa dados de um ano específico (o espaçamento entre requisições vem do limitador de taxa)"""
         logger.info(f"Raspando: {option_code}/{suboption_code or 'main'} - Ano {year}")
         
         try:
-            time.sleep(SCRAPING_CONFIG.REQUEST_DELAY)
             return self.scrape_data_from_page(
                 year, option_code, suboption_code, option_name, suboption_name
             )
@@ -99,15 +272,17 @@ class FullScraper(BaseScraper):
     
     def _convert_to_dict_format(self, scraped_data: List[ScrapedData]) -> List[dict]:
         """Converte ScrapedData para formato de dicionário legado"""
-        return [
-            {
-                "ano": data.year,
-                "aba": data.option_name,
-                "subopcao": data.sub_option_name,
-                "dados": data.data
-            }
-            for data in scraped_data
-        ]
+        return [self._to_dict(data) for data in scraped_data]
+    
+    def _to_dict(self, data: ScrapedData) -> dict:
+        """Converte uma seção para o formato de dicionário legado (sem copiar as linhas)"""
+        return {
+            "ano": data.year,
+            "aba": data.option_name,
+            "subopcao": data.sub_option_name,
+            "dados": data.data,
+            "inalterado": data.unchanged
+        }
     
     def _save_to_file(self, data: List[ScrapedData], filepath: str) -> None:
         """Salva dados em arquivo JSON"""
@@ -137,15 +312,27 @@ class FullScraper(BaseScraper):
         logger.info(f"- Total de registros individuais: {total_records}")
 
 # Função de compatibilidade
-def run_full_scrape(output_filepath: Optional[str] = None) -> List[dict]:
+def run_full_scrape(
+    output_filepath: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    stored_sections: Optional[Set[SectionKey]] = None,
+    journal: Optional[ScrapeJournal] = None
+) -> List[dict]:
     """
     Função de compatibilidade com a interface anterior.
     
     Args:
         output_filepath: Caminho para salvar arquivo JSON
+        max_workers: Número de workers do pool de coleta (padrão: SCRAPING_CONFIG.MAX_WORKERS)
+        stored_sections: Seções já armazenadas, para coleta incremental (modo "delta")
+        journal: Diário de checkpoint da execução (ver get_scrape_journal); None desativa a retomada
         
     Returns:
         Lista de dicionários com dados raspados
     """
-    scraper = FullScraper()
+    scraper = FullScraper(
+        max_workers=max_workers,
+        stored_sections=stored_sections,
+        journal=journal
+    )
     return scraper.scrape_all_data(output_filepath)
\ No newline at end of file
@@ -0,0 +1,81 @@
+# src/app/scraper/http_session.py
+import threading
+import logging
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .config import SCRAPING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+    "User-Agent": "vitibrasil-tech-challenge/1.0 (+https://github.com/heliojunior1/vitibrasil-tech-challenge)",
+}
+
+_adapter: Optional[HTTPAdapter] = None
+_adapter_lock = threading.Lock()
+_thread_local = threading.local()
+
+def _build_retry() -> Retry:
+    """Política de retry do adapter (erros transitórios do servidor, com backoff)"""
+    return Retry(
+        total=SCRAPING_CONFIG.ADAPTER_MAX_RETRIES,
+        connect=SCRAPING_CONFIG.ADAPTER_MAX_RETRIES,
+        read=SCRAPING_CONFIG.ADAPTER_MAX_RETRIES,
+        status=SCRAPING_CONFIG.ADAPTER_MAX_RETRIES,
+        backoff_factor=SCRAPING_CONFIG.RETRY_BACKOFF_FACTOR,
+        status_forcelist=SCRAPING_CONFIG.RETRY_STATUS_FORCELIST,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+
+def get_http_adapter() -> HTTPAdapter:
+    """
+    Retorna o adapter HTTP do processo.
+
+    O adapter mantém o pool de conexões keep-alive (urllib3, thread-safe) e é
+    montado em todas as sessões, de modo que as conexões com o Vitibrasil são
+    reaproveitadas entre requisições, threads e instâncias de scraper.
+    """
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            _adapter = HTTPAdapter(
+                pool_connections=SCRAPING_CONFIG.POOL_CONNECTIONS,
+                pool_maxsize=SCRAPING_CONFIG.POOL_MAXSIZE,
+                pool_block=True,
+                max_retries=_build_retry(),
+            )
+        return _adapter
+
+def get_http_session() -> requests.Session:
+    """
+    Retorna a sessão HTTP da thread atual.
+
+    `requests.Session` não é garantidamente thread-safe (cookies, estado de
+    redirecionamento), então cada thread tem a sua; todas compartilham o mesmo
+    adapter e, portanto, o mesmo pool de conexões.
+    """
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        adapter = get_http_adapter()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _thread_local.session = session
+    return session
+
+def close_http_session() -> None:
+    """
+    Fecha as conexões abertas do pool compartilhado (ex.: no shutdown da aplicação).
+    O pool é recriado sob demanda se houver novas requisições.
+    """
+    with _adapter_lock:
+        if _adapter is not None:
+            _adapter.close()
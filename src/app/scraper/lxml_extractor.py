@@ -0,0 +1,139 @@
+# src/app/scraper/lxml_extractor.py
+"""
+Extração da tabela `table.tb_dados` diretamente sobre uma árvore lxml.
+
+Equivalente ao caminho BeautifulSoup de BaseScraper (`_extract_table_data`),
+mas sem construir a árvore do documento inteiro: o HTML é decodificado, o
+trecho da tabela é recortado e só ele é parseado. O texto das células segue a
+mesma semântica de `Tag.get_text(strip=True)` (cada string aparada, vazias
+descartadas, comentários e conteúdo de <script>/<style> ignorados).
+"""
+import re
+from typing import Iterator, List, Optional
+
+from bs4.dammit import EncodingDetector
+from lxml import etree, html
+
+# Abertura da tabela de dados: <table ... class="... tb_dados ...">
+_DATA_TABLE_OPEN_RE = re.compile(
+    r"<table\b[^>]*\bclass\s*=\s*(?:\"[^\"]*\btb_dados\b[^\"]*\"|'[^']*\btb_dados\b[^']*'|[^\s>]*\btb_dados\b[^\s>]*)[^>]*>",
+    re.IGNORECASE
+)
+_TABLE_TAG_RE = re.compile(r"<(/?)table\b", re.IGNORECASE)
+_DATA_TABLE_XPATH = "//table[contains(concat(' ', normalize-space(@class), ' '), ' tb_dados ')]"
+_IGNORED_TEXT_TAGS = frozenset(["script", "style", "template"])
+
+def decode_html(content: bytes) -> str:
+    """Decodifica o HTML com a mesma ordem de tentativas do BeautifulSoup (declarado → utf-8 → windows-1252)"""
+    declared = EncodingDetector.find_declared_encoding(content, is_html=True)
+    for encoding in (declared, "utf-8"):
+        if not encoding:
+            continue
+        try:
+            return content.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return content.decode("windows-1252", errors="replace")
+
+def _slice_data_table(markup: str) -> Optional[str]:
+    """Recorta o trecho <table class="tb_dados">...</table>, respeitando tabelas aninhadas"""
+    opening = _DATA_TABLE_OPEN_RE.search(markup)
+    if not opening:
+        return None
+
+    depth = 1
+    for tag in _TABLE_TAG_RE.finditer(markup, opening.end()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            close_end = markup.find(">", tag.end())
+            if close_end == -1:
+                return None
+            return markup[opening.start():close_end + 1]
+    return None
+
+def parse_data_table(content: bytes) -> Optional[etree._Element]:
+    """
+    Retorna o elemento `table.tb_dados` da página, ou None se não existir.
+
+    Parseia apenas o trecho da tabela; se o recorte não for possível (HTML
+    malformado), parseia o documento inteiro.
+    """
+    if not content:
+        return None
+
+    markup = decode_html(content)
+    fragment = _slice_data_table(markup)
+    if fragment is not None:
+        tables = html.document_fromstring(fragment).xpath(_DATA_TABLE_XPATH)
+        if tables:
+            return tables[0]
+
+    try:
+        tables = html.document_fromstring(markup).xpath(_DATA_TABLE_XPATH)
+    except (etree.ParserError, ValueError):
+        return None
+    return tables[0] if tables else None
+
+def _collect_text(element: etree._Element, parts: List[str]) -> None:
+    if element.tag in _IGNORED_TEXT_TAGS:
+        return
+    if element.text:
+        text = element.text.strip()
+        if text:
+            parts.append(text)
+    for child in element:
+        # Comentários/instruções têm `tag` não-string: ignora o texto, mantém o tail
+        if isinstance(child.tag, str):
+            _collect_text(child, parts)
+        if child.tail:
+            tail = child.tail.strip()
+            if tail:
+                parts.append(tail)
+
+def cell_text(element: etree._Element) -> str:
+    """Equivalente a `Tag.get_text(strip=True)`"""
+    if len(element) == 0:
+        return element.text.strip() if element.text else ""
+    parts: List[str] = []
+    _collect_text(element, parts)
+    return "".join(parts)
+
+def cell_classes(element: etree._Element) -> List[str]:
+    """Lista de classes CSS do elemento (como `Tag.get('class', [])`)"""
+    return (element.get("class") or "").split()
+
+def has_descendant(element: etree._Element, tag: str) -> bool:
+    """Equivalente a `Tag.find(tag) is not None`"""
+    return next(element.iterdescendants(tag), None) is not None
+
+def find_descendant(element: etree._Element, tag: str) -> Optional[etree._Element]:
+    """Primeiro descendente com a tag informada (como `Tag.find(tag)`)"""
+    return next(element.iterdescendants(tag), None)
+
+def header_cells(table: etree._Element) -> List[etree._Element]:
+    """Células de cabeçalho, com as mesmas regras de BaseScraper._extract_table_headers"""
+    for thead in table.iterdescendants("thead"):
+        header_row = find_descendant(thead, "tr")
+        if header_row is not None:
+            return list(header_row.iterdescendants("th", "td"))
+
+    all_rows = list(table.iterdescendants("tr"))
+    for row in all_rows:
+        potential_headers = list(row.iterdescendants("th", "td"))
+        if any(cell.tag == "th" for cell in potential_headers) or has_descendant(row, "strong"):
+            return potential_headers
+
+    if all_rows:
+        return list(all_rows[0].iterdescendants("th", "td"))
+    return []
+
+def data_rows(table: etree._Element) -> List[etree._Element]:
+    """Linhas de dados: as do primeiro <tbody>, ou todas menos a primeira"""
+    body = find_descendant(table, "tbody")
+    if body is not None:
+        return list(body.iterdescendants("tr"))
+    return list(table.iterdescendants("tr"))[1:]
+
+def row_cells(row: etree._Element) -> Iterator[etree._Element]:
+    """Células <td> de uma linha (descendentes, como `find_all('td')`)"""
+    return row.iterdescendants("td")
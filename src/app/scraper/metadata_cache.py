@@ -0,0 +1,182 @@
+# src/app/scraper/metadata_cache.py
+import json
+import os
+import tempfile
+import threading
+import time
+import logging
+from dataclasses import asdict
+from typing import Callable, Dict, Optional, Set, Tuple, TYPE_CHECKING
+
+from .config import SCRAPING_CONFIG
+
+if TYPE_CHECKING:
+    from .base_scraper import PageMetadata
+
+logger = logging.getLogger(__name__)
+
+# Seção vazia de uma opção: (código da subopção, ano)
+EmptySectionKey = Tuple[Optional[str], int]
+
+class MetadataCache:
+    """
+    Cache com TTL dos metadados de cada opção (range de anos, subopções, nome).
+
+    Os metadados mudam raramente (uma vez por ano, quando a Embrapa publica um
+    novo ano), então são mantidos em memória e em disco (`<opção>.json`), o que
+    permite compartilhá-los entre requisições e entre workers do gunicorn.
+
+    Também registra, com o mesmo TTL, as páginas cuja tabela veio vazia
+    (`<opção>.empty.json`): elas nunca geram linha em `viticultura_data`, e sem
+    o registro a coleta incremental as buscaria de novo a cada execução.
+    """
+
+    def __init__(self, directory: Optional[str], ttl_seconds: float):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, dict]] = {}
+        self._empty: Dict[str, Dict[EmptySectionKey, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, option_code: str) -> Optional["PageMetadata"]:
+        """Retorna uma cópia dos metadados da opção, ou None se ausentes ou expirados"""
+        with self._lock:
+            entry = self._entries.get(option_code)
+        if entry is None:
+            entry = self._read_from_disk(option_code)
+            if entry is not None:
+                with self._lock:
+                    self._entries[option_code] = entry
+
+        if entry is None:
+            return None
+        stored_at, payload = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            return None
+        return self._to_metadata(payload)
+
+    def store(self, option_code: str, metadata: "PageMetadata") -> None:
+        """Armazena os metadados da opção em memória e em disco"""
+        entry = (time.time(), asdict(metadata))
+        with self._lock:
+            self._entries[option_code] = entry
+        self._write_to_disk(option_code, entry)
+
+    def mark_empty(self, option_code: str, suboption_code: Optional[str], year: int) -> None:
+        """Registra que a página (subopção, ano) da opção não tem dados"""
+        with self._lock:
+            sections = self._load_empty(option_code)
+            sections[(suboption_code, year)] = time.time()
+            snapshot = dict(sections)
+        self._write_json(
+            option_code, self._empty_path,
+            {"sections": [[sub, year, stored_at] for (sub, year), stored_at in snapshot.items()]}
+        )
+
+    def empty_sections(self, option_code: str) -> Set[EmptySectionKey]:
+        """Páginas da opção registradas como vazias e ainda dentro do TTL"""
+        now = time.time()
+        with self._lock:
+            sections = self._load_empty(option_code)
+            return {key for key, stored_at in sections.items() if now - stored_at <= self.ttl_seconds}
+
+    def invalidate(self, option_code: Optional[str] = None) -> None:
+        """Remove os metadados de uma opção (ou de todas) da memória e do disco"""
+        with self._lock:
+            codes = [option_code] if option_code else list(self._entries)
+            for code in codes:
+                self._entries.pop(code, None)
+            if option_code:
+                self._empty.pop(option_code, None)
+            else:
+                self._empty.clear()
+        if not self.directory:
+            return
+        if option_code is None and os.path.isdir(self.directory):
+            codes = [name[:-5] for name in os.listdir(self.directory)
+                     if name.endswith(".json") and not name.endswith(".empty.json")]
+        for code in codes:
+            for path in (self._path(code), self._empty_path(code)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _path(self, option_code: str) -> str:
+        return os.path.join(self.directory, f"{option_code}.json")
+
+    def _empty_path(self, option_code: str) -> str:
+        return os.path.join(self.directory, f"{option_code}.empty.json")
+
+    def _load_empty(self, option_code: str) -> Dict[EmptySectionKey, float]:
+        """Seções vazias da opção em memória, carregadas do disco no primeiro acesso (chamar com o lock)"""
+        sections = self._empty.get(option_code)
+        if sections is None:
+            sections = {}
+            if self.directory:
+                try:
+                    with open(self._empty_path(option_code), "r", encoding="utf-8") as f:
+                        raw = json.load(f)
+                    sections = {(sub, int(year)): float(stored_at) for sub, year, stored_at in raw["sections"]}
+                except (OSError, ValueError, KeyError, TypeError):
+                    sections = {}
+            self._empty[option_code] = sections
+        return sections
+
+    def _read_from_disk(self, option_code: str) -> Optional[Tuple[float, dict]]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(option_code), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            return float(raw["stored_at"]), raw["metadata"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_to_disk(self, option_code: str, entry: Tuple[float, dict]) -> None:
+        stored_at, payload = entry
+        self._write_json(option_code, self._path, {"stored_at": stored_at, "metadata": payload})
+
+    def _write_json(self, option_code: str, path_for: Callable[[str], str], document: dict) -> None:
+        """Grava o documento da opção de forma atômica (arquivo temporário + rename)"""
+        if not self.directory:
+            return
+        content = json.dumps(document, ensure_ascii=False)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(content)
+                os.replace(tmp_path, path_for(option_code))
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar metadados de {option_code}: {e}")
+
+    def _to_metadata(self, payload: dict) -> "PageMetadata":
+        from .base_scraper import PageMetadata, SubOption
+        return PageMetadata(
+            min_year=payload.get("min_year"),
+            max_year=payload.get("max_year"),
+            sub_options=[SubOption(**sub) for sub in payload.get("sub_options", [])],
+            display_name=payload.get("display_name")
+        )
+
+_metadata_cache: Optional[MetadataCache] = None
+_metadata_cache_lock = threading.Lock()
+
+def get_metadata_cache() -> Optional[MetadataCache]:
+    """Retorna o cache de metadados do processo, ou None se desabilitado"""
+    global _metadata_cache
+    if not SCRAPING_CONFIG.METADATA_CACHE_ENABLED:
+        return None
+    with _metadata_cache_lock:
+        if _metadata_cache is None:
+            _metadata_cache = MetadataCache(
+                SCRAPING_CONFIG.METADATA_CACHE_DIR,
+                SCRAPING_CONFIG.METADATA_CACHE_TTL_SECONDS
+            )
+        return _metadata_cache
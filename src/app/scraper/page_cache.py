@@ -0,0 +1,149 @@
+# src/app/scraper/page_cache.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import logging
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .config import SCRAPING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+def content_hash(content: bytes) -> str:
+    """Hash SHA-256 do corpo de uma página"""
+    return hashlib.sha256(content).hexdigest()
+
+@dataclass
+class CachedPage:
+    """Entrada do cache de páginas: validadores HTTP e dados já extraídos"""
+    url: str
+    content_hash: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: Optional[str] = None
+    data: Optional[List[Dict[str, Any]]] = None
+    body_path: Optional[str] = field(default=None, repr=False)
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Cabeçalhos para requisição condicional (If-None-Match / If-Modified-Since)"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def read_body(self) -> Optional[bytes]:
+        """Lê o HTML bruto armazenado"""
+        if not self.body_path:
+            return None
+        try:
+            with open(self.body_path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+@dataclass
+class FetchedPage:
+    """Resultado de uma busca de página, possivelmente revalidada pelo cache"""
+    url: str
+    content: bytes
+    unchanged: bool = False
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    cached: Optional[CachedPage] = None
+
+class PageCache:
+    """
+    Cache persistente em disco das páginas do Vitibrasil, indexado pela URL.
+
+    Cada entrada guarda o HTML bruto (`<chave>.html`) e um JSON com os
+    validadores (ETag, Last-Modified, hash do corpo) e os dados já extraídos
+    da tabela (`<chave>.json`). As gravações são atômicas (arquivo temporário
+    + os.replace), então o cache pode ser compartilhado entre threads e
+    entre workers do gunicorn.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, url: str) -> tuple[str, str]:
+        key = self._key(url)
+        return (
+            os.path.join(self.directory, f"{key}.json"),
+            os.path.join(self.directory, f"{key}.html"),
+        )
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """Retorna a entrada do cache para a URL, ou None"""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get("url") != url:
+            return None
+        meta["body_path"] = body_path
+        return CachedPage(**meta)
+
+    def store(self, page: FetchedPage, data: Optional[List[Dict[str, Any]]] = None) -> None:
+        """
+        Armazena o corpo e os validadores de uma página.
+
+        Args:
+            page: Página buscada
+            data: Dados extraídos da tabela (None para páginas só de metadados)
+        """
+        meta_path, body_path = self._paths(page.url)
+        entry = CachedPage(
+            url=page.url,
+            content_hash=content_hash(page.content),
+            etag=page.etag,
+            last_modified=page.last_modified,
+            fetched_at=datetime.now(timezone.utc).isoformat(),
+            data=data,
+        )
+        meta = asdict(entry)
+        meta.pop("body_path")
+
+        try:
+            with self._lock:
+                os.makedirs(self.directory, exist_ok=True)
+                self._atomic_write(body_path, page.content)
+                self._atomic_write(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar cache de {page.url}: {e}")
+
+    def _atomic_write(self, path: str, content: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+_page_cache: Optional[PageCache] = None
+_page_cache_lock = threading.Lock()
+
+def get_page_cache() -> Optional[PageCache]:
+    """Retorna o cache de páginas do processo, ou None se desabilitado"""
+    global _page_cache
+    if not SCRAPING_CONFIG.PAGE_CACHE_ENABLED:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache(SCRAPING_CONFIG.PAGE_CACHE_DIR)
+        return _page_cache
@@ -104,7 +104,8 @@ class PartialScraper(BaseScraper):
                 "ano": data.year,
                 "aba": data.option_name, 
                 "subopcao": data.sub_option_name,
-                "dados": data.data
+                "dados": data.data,
+                "inalterado": data.unchanged
             }
             for data in scraped_data
         ]
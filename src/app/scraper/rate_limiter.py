@@ -0,0 +1,126 @@
+# src/app/scraper/rate_limiter.py
+import asyncio
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from .config import SCRAPING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+class TokenBucketRateLimiter:
+    """
+    Limitador de taxa do tipo token bucket, seguro para uso entre threads.
+
+    Substitui o `time.sleep(REQUEST_DELAY)` antes de cada requisição: a taxa
+    média de requisições continua a mesma, mas várias threads podem aguardar
+    tokens em paralelo enquanto outras requisições estão em andamento.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate deve ser maior que zero")
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    def try_acquire(self) -> bool:
+        """Consome um token se disponível, sem bloquear"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self) -> float:
+        """
+        Bloqueia até um token estar disponível.
+
+        Returns:
+            Tempo total aguardado, em segundos
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+            waited += wait_time
+
+    async def acquire_async(self) -> float:
+        """Versão não bloqueante de `acquire` para uso dentro do event loop"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait_time = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait_time)
+            waited += wait_time
+
+class HostConcurrencyLimiter:
+    """Limita o número de requisições simultâneas por host"""
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _get_semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_concurrent)
+                self._semaphores[host] = semaphore
+            return semaphore
+
+    @contextmanager
+    def slot(self, url: str):
+        """Reserva uma vaga de conexão para o host da URL"""
+        semaphore = self._get_semaphore(urlsplit(url).netloc)
+        semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+_rate_limiter: Optional[TokenBucketRateLimiter] = None
+_host_limiter: Optional[HostConcurrencyLimiter] = None
+_singletons_lock = threading.Lock()
+
+def get_rate_limiter() -> TokenBucketRateLimiter:
+    """Retorna o limitador de taxa global do processo (compartilhado entre scrapers)"""
+    global _rate_limiter
+    with _singletons_lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucketRateLimiter(
+                SCRAPING_CONFIG.requests_per_second, SCRAPING_CONFIG.RATE_LIMIT_BURST
+            )
+        return _rate_limiter
+
+def get_host_limiter() -> HostConcurrencyLimiter:
+    """Retorna o limitador de concorrência por host global do processo"""
+    global _host_limiter
+    with _singletons_lock:
+        if _host_limiter is None:
+            _host_limiter = HostConcurrencyLimiter(SCRAPING_CONFIG.MAX_CONCURRENT_PER_HOST)
+        return _host_limiter
@@ -3,6 +3,8 @@ import unicodedata
 import re
 from typing import Optional
 
+from .config import OPCOES_MAPPING
+
 def normalize_text(text: Optional[str]) -> Optional[str]:
     """
     Normaliza texto removendo acentos e caracteres especiais.
@@ -79,4 +81,22 @@ def extract_year_range(text: str) -> tuple[Optional[int], Optional[int]]:
         year = int(single_match.group(1))
         return year, year
     
-    return None, None
\ No newline at end of file
+    return None, None
+
+def resolve_option_code(aba: Optional[str]) -> Optional[str]:
+    """
+    Código canônico da opção (opt_02...) a partir do nome da aba ou da opção.
+
+    Aceita o nome de exibição normalizado ('producao'), o nome com acentos
+    ('Produção') ou o próprio código; retorna None se não reconhecer.
+    """
+    normalized = normalize_text(aba)
+    if not normalized:
+        return None
+    if normalized in OPCOES_MAPPING.values():
+        return normalized
+    return OPCOES_MAPPING.get(normalized)
+
+def normalize_suboption_key(subopcao: Optional[str]) -> str:
+    """Chave normalizada da subopção; '' quando a opção não tem subopções"""
+    return normalize_text(subopcao) or ""
@@ -0,0 +1,124 @@
+import argparse
+import logging
+import os
+from contextlib import contextmanager
+from typing import List, Optional
+
+from sqlalchemy import func, inspect, text
+from sqlalchemy.orm import Session
+
+from src.app.config.database import Base, engine, upgrade_schema
+from src.app.models.schema_migracao import SchemaMigracao
+from src.app.models.viticulture import Viticultura, ViticulturaConteudo
+from src.app.repository.viticulture_repo import backfill_option_codes, backfill_content_store, rebuild_current_sections
+
+# Importação condicional: sem fcntl (Windows), migrações concorrentes no SQLite não são serializadas
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Versão do esquema e dos dados que esta migração produz; incrementar ao acrescentar passos
+VERSAO_SCHEMA = 1
+
+# Chave do advisory lock do PostgreSQL que serializa as migrações
+CHAVE_TRAVA_POSTGRES = 7_140_019
+
+@contextmanager
+def _trava_de_migracao(bind):
+    """
+    Serializa as migrações entre processos: advisory lock no PostgreSQL, lock de
+    arquivo ao lado do banco no SQLite. Bancos em memória não são compartilhados.
+    """
+    url = bind.url
+    if bind.dialect.name == "postgresql":
+        with bind.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": CHAVE_TRAVA_POSTGRES})
+            conn.commit()  # A trava é da sessão: não mantém transação aberta durante as migrações
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_TRAVA_POSTGRES})
+                conn.commit()
+        return
+    if bind.dialect.name != "sqlite" or url.database in (None, "", ":memory:") or url.query.get("mode") == "memory":
+        yield
+        return
+    if not FCNTL_AVAILABLE:
+        logger.warning("fcntl indisponível: migrações concorrentes neste banco SQLite não são serializadas.")
+        yield
+        return
+    with open(f"{os.path.abspath(url.database)}.migracao.lock", "w") as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+def versao_aplicada(bind=None) -> int:
+    """Maior versão de migração registrada no banco (0 se nenhuma)"""
+    bind = bind or engine
+    if not inspect(bind).has_table(SchemaMigracao.__tablename__):
+        return 0
+    with Session(bind=bind) as db:
+        return db.query(func.max(SchemaMigracao.versao)).scalar() or 0
+
+def _descartar_fatos_por_secao(bind) -> None:
+    # viticultura_fatos é derivada dos conteúdos: a versão por seção (sem conteudo_id) é descartada e regerada
+    inspector = inspect(bind)
+    if inspector.has_table("viticultura_fatos") and "conteudo_id" not in {
+        coluna["name"] for coluna in inspector.get_columns("viticultura_fatos")
+    }:
+        with bind.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS viticultura_fatos"))
+
+def executar_migracoes(bind=None) -> bool:
+    """
+    Leva o banco ao esquema atual: cria as tabelas ausentes, acrescenta colunas e
+    índices novos (upgrade_schema), preenche os dados das seções gravadas por
+    versões anteriores e reconstrói viticultura_atual.
+
+    Roda uma vez, antes de iniciar os workers da API: os processos que chegam
+    juntos esperam a trava, e quem a obtém depois de a versão ter sido
+    registrada não refaz nada.
+
+    Returns:
+        True se as migrações foram aplicadas; False se o banco já estava na versão atual
+    """
+    bind = bind or engine
+    with _trava_de_migracao(bind):
+        versao = versao_aplicada(bind)
+        if versao >= VERSAO_SCHEMA:
+            logger.info(f"Banco já está na versão {versao} do esquema; nenhuma migração aplicada.")
+            return False
+
+        _descartar_fatos_por_secao(bind)
+        Base.metadata.create_all(bind=bind)
+        upgrade_schema([Viticultura.__table__, ViticulturaConteudo.__table__], bind=bind)
+
+        # Seções gravadas antes das colunas option_code/subopcao_key e do armazenamento por conteúdo
+        with Session(bind=bind, autoflush=False) as db:
+            backfill_option_codes(db)
+            backfill_content_store(db)
+            rebuild_current_sections(db)
+            db.add(SchemaMigracao(versao=VERSAO_SCHEMA))
+            db.commit()
+    logger.info(f"Migrações aplicadas: banco na versão {VERSAO_SCHEMA} do esquema (antes: {versao}).")
+    return True
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Linha de comando: python -m src.app.service.migration_service
+    """
+    parser = argparse.ArgumentParser(description="Aplica as migrações de esquema e dados pendentes (antes de iniciar a API).")
+    parser.parse_args(argv)
+    aplicadas = executar_migracoes()
+    print(f"Versão do esquema: {VERSAO_SCHEMA} | migrações aplicadas: {'sim' if aplicadas else 'não'}")
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    raise SystemExit(main())
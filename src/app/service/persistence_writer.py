@@ -0,0 +1,194 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from src.app.config.database import SessionLocal
+from src.app.config.settings import settings
+from src.app.domain.viticulture import ViticulturaCreate
+from src.app.repository.viticulture_repo import content_hash, save_bulk
+
+logger = logging.getLogger(__name__)
+
+class PersistenceQueueFullError(Exception):
+    """Fila de gravação cheia por mais tempo que o limite de espera (contrapressão)"""
+    pass
+
+def _mesclar_pendentes(listas: List[List[ViticulturaCreate]]) -> List[ViticulturaCreate]:
+    """
+    Junta os salvamentos pendentes. Só versões da mesma seção (aba, subopcao, ano)
+    com o mesmo conteúdo são fundidas, mantendo a raspagem mais recente; versões
+    com conteúdo diferente são todas gravadas (o histórico não perde nenhuma).
+    """
+    secoes: Dict[Tuple[str, Optional[str], int, str], ViticulturaCreate] = {}
+    for lista in listas:
+        for vc in lista:
+            chave = (vc.aba, vc.subopcao, vc.ano, content_hash(vc.dados))
+            atual = secoes.get(chave)
+            if atual is None or vc.data_raspagem >= atual.data_raspagem:
+                secoes[chave] = vc
+    return list(secoes.values())
+
+class PersistenceWriter:
+    """
+    Gravador único do processo para as seções raspadas.
+
+    As requisições enfileiram listas de ViticulturaCreate em uma fila limitada;
+    uma thread dedicada retira todos os salvamentos pendentes, junta-os em um
+    único lote e grava em uma só transação (save_bulk), com uma única sessão
+    de cada vez. Assim as gravações do processo não disputam o lock de escrita
+    do SQLite entre si. Com a fila cheia, `submit` espera vaga por até
+    `put_timeout` segundos antes de recusar o salvamento.
+    """
+
+    # Intervalo em que a thread, sem nada na fila, verifica se deve encerrar
+    _INTERVALO_ENCERRAMENTO = 0.5
+
+    def __init__(
+        self,
+        max_queue: Optional[int] = None,
+        put_timeout: Optional[float] = None,
+        max_batch: Optional[int] = None,
+        retries: Optional[int] = None,
+        session_factory: Callable[[], Session] = SessionLocal
+    ):
+        self.max_queue = max_queue or settings.PERSISTENCE_QUEUE_MAX_SIZE
+        self.put_timeout = put_timeout if put_timeout is not None else settings.PERSISTENCE_QUEUE_PUT_TIMEOUT_SECONDS
+        self.max_batch = max_batch or settings.PERSISTENCE_WRITER_MAX_BATCH
+        self.retries = retries or settings.PERSISTENCE_WRITER_RETRIES
+        self.session_factory = session_factory
+        self._queue: "queue.Queue[Optional[Tuple[List[ViticulturaCreate], Future]]]" = queue.Queue(maxsize=self.max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._encerrar: Optional[threading.Event] = None
+        self._lock = threading.Lock()
+
+    def submit(self, data_list: List[ViticulturaCreate]) -> Future:
+        """
+        Enfileira seções para gravação.
+
+        Args:
+            data_list: Seções a gravar
+
+        Returns:
+            Future concluído com o número de seções do lote gravado (ou com o erro da gravação)
+
+        Raises:
+            PersistenceQueueFullError: Se a fila continuar cheia após `put_timeout` segundos
+        """
+        self._ensure_started()
+        future: Future = Future()
+        try:
+            self._queue.put((list(data_list), future), timeout=self.put_timeout)
+        except queue.Full:
+            raise PersistenceQueueFullError(f"Fila de gravação cheia ({self.max_queue} salvamentos pendentes)")
+        return future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Aguarda a gravação de tudo o que já foi enfileirado.
+
+        Returns:
+            False se o tempo limite acabar antes
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: self._queue.unfinished_tasks == 0, timeout)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Grava os salvamentos pendentes e encerra a thread de gravação.
+
+        Com a fila cheia, o sinal de parada não espera vaga indefinidamente: após
+        `put_timeout` segundos a thread é avisada para encerrar assim que esvaziar a fila.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            encerrar, self._encerrar = self._encerrar, None
+        if thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=self.put_timeout)
+        except queue.Full:
+            logger.warning(f"Fila de gravação cheia no encerramento; a thread termina após gravar os {self._queue.qsize()} salvamentos pendentes.")
+            encerrar.set()
+        if wait:
+            thread.join()
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._encerrar = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._encerrar,), name="persistence-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self, encerrar: threading.Event) -> None:
+        parar = False
+        while not parar:
+            try:
+                item = self._queue.get(timeout=self._INTERVALO_ENCERRAMENTO)
+            except queue.Empty:
+                if encerrar.is_set():
+                    return
+                continue
+            if item is None:
+                self._queue.task_done()
+                return
+
+            pendentes = [item]
+            secoes = len(item[0])
+            while secoes < self.max_batch:
+                try:
+                    proximo = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if proximo is None:
+                    self._queue.task_done()
+                    parar = True
+                    break
+                pendentes.append(proximo)
+                secoes += len(proximo[0])
+
+            try:
+                self._gravar(pendentes)
+            finally:
+                for _ in pendentes:
+                    self._queue.task_done()
+
+    def _gravar(self, pendentes: List[Tuple[List[ViticulturaCreate], Future]]) -> None:
+        lote = _mesclar_pendentes([data_list for data_list, _ in pendentes])
+        erro: Optional[Exception] = None
+        for tentativa in range(1, self.retries + 1):
+            db = self.session_factory()
+            try:
+                save_bulk(db, lote)
+                erro = None
+                break
+            except OperationalError as e:
+                # Ex.: "database is locked" enquanto outro processo grava
+                erro = e
+                logger.warning(f"Gravação de {len(lote)} seções falhou (tentativa {tentativa}/{self.retries}): {e}")
+                time.sleep(0.2 * tentativa)
+            except Exception as e:
+                erro = e
+                break
+            finally:
+                db.close()
+
+        if erro is None:
+            logger.info(f"Gravador: {len(lote)} seções de {len(pendentes)} salvamentos gravadas em uma transação.")
+        else:
+            logger.error(f"Gravador: erro ao gravar {len(lote)} seções de {len(pendentes)} salvamentos: {erro}")
+        for _, future in pendentes:
+            if erro is None:
+                future.set_result(len(lote))
+            else:
+                future.set_exception(erro)
+
+persistence_writer = PersistenceWriter()
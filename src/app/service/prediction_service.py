@@ -35,14 +35,20 @@ class PredictionService:
             if request.opcao not in self.supported_options:
                 raise ValueError(f"Opção '{request.opcao}' não suportada. Opções disponíveis: {self.supported_options}")
             
-            # Buscar dados históricos
-            historical_data = self._get_historical_data(db, request.opcao, request.ano_minimo)
+            # Totais anuais agregados em SQL na tabela de fatos
+            yearly_totals = self._get_yearly_totals(db, request.opcao, request.ano_minimo)
             
-            if not historical_data:
-                raise ValueError(f"Nenhum dado histórico encontrado para '{request.opcao}' a partir de {request.ano_minimo}")
-            
-            # Preparar dados para o modelo
-            df_prepared = self._prepare_data_for_prediction(historical_data)
+            if yearly_totals:
+                df_prepared = self._prepare_data_from_totals(yearly_totals)
+            else:
+                # Seções gravadas antes da tabela de fatos: soma a partir do JSON
+                historical_data = self._get_historical_data(db, request.opcao, request.ano_minimo)
+                
+                if not historical_data:
+                    raise ValueError(f"Nenhum dado histórico encontrado para '{request.opcao}' a partir de {request.ano_minimo}")
+                
+                # Preparar dados para o modelo
+                df_prepared = self._prepare_data_for_prediction(historical_data)
             
             if df_prepared.empty or len(df_prepared) < 2:
                 raise ValueError(f"Dados insuficientes para previsão. Necessário pelo menos 2 anos de dados.")
@@ -99,14 +105,38 @@ class PredictionService:
             detalhes={"trend": "crescente", "note": "Previsão mock para testes"}
         )
     
+    def _get_yearly_totals(self, db: Session, opcao: str, ano_minimo: int) -> Dict[int, float]:
+        """
+        Busca o total por ano da opção, agregado no banco (tabela viticultura_fatos)
+        """
+        try:
+            from src.app.repository.viticulture_repo import get_yearly_totals_by_option
+            from src.app.utils.query_cache import get_query_cache
+            chave = ("totais_anuais", opcao.strip().lower(), ano_minimo)
+            return dict(get_query_cache().get_or_load(chave, lambda: get_yearly_totals_by_option(db, opcao, ano_minimo)))
+        except Exception as e:
+            logger.error(f"Erro ao buscar totais anuais: {str(e)}")
+            return {}
+    
+    def _prepare_data_from_totals(self, yearly_totals: Dict[int, float], unit: str = "L") -> pd.DataFrame:
+        """
+        Monta o DataFrame do Prophet a partir dos totais anuais já agregados
+        """
+        rows = [
+            {'ds': pd.to_datetime(f'{ano}-12-31'), 'y': total, 'unidade': unit}
+            for ano, total in sorted(yearly_totals.items()) if total > 0
+        ]
+        return pd.DataFrame(rows)
+    
     def _get_historical_data(self, db: Session, opcao: str, ano_minimo: int) -> List[Dict]:
         """
         Busca dados históricos do banco de dados
         """
         try:
             from src.app.repository.viticulture_repo import get_all_data_by_option
-            all_data = get_all_data_by_option(db, opcao, ano_minimo)
-            return all_data
+            from src.app.utils.query_cache import get_query_cache
+            chave = ("dados_por_opcao", opcao.strip().lower(), ano_minimo)
+            return get_query_cache().get_or_load(chave, lambda: get_all_data_by_option(db, opcao, ano_minimo))
         except Exception as e:
             logger.error(f"Erro ao buscar dados históricos: {str(e)}")
             return []
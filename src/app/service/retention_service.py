@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from src.app.config.database import SessionLocal, optimize_database
+from src.app.config.settings import settings
+from src.app.models.viticulture import Viticultura, ViticulturaConteudo, ViticulturaFato
+from src.app.repository.viticulture_repo import prune_history
+
+logger = logging.getLogger(__name__)
+
+TABELAS_DO_HISTORICO = [Viticultura.__table__, ViticulturaConteudo.__table__, ViticulturaFato.__table__]
+
+@dataclass(frozen=True)
+class RetentionResult:
+    """Resultado de uma execução da retenção do histórico"""
+    corte: datetime
+    versoes_removidas: int
+    conteudos_removidos: int
+    vacuum: bool
+    duracao_segundos: float
+
+def _utc_sem_fuso(momento: datetime) -> datetime:
+    """Converte para UTC sem fuso, como data_raspagem é gravada; datas sem fuso já são tratadas como UTC"""
+    if momento.tzinfo is None:
+        return momento
+    return momento.astimezone(timezone.utc).replace(tzinfo=None)
+
+def executar_retencao(
+    dias: Optional[int] = None,
+    checkpoints_mensais: Optional[bool] = None,
+    batch_size: Optional[int] = None,
+    vacuum: Optional[bool] = None,
+    session_factory: Callable[[], Session] = SessionLocal,
+    agora: Optional[datetime] = None
+) -> RetentionResult:
+    """
+    Aplica a política de retenção ao histórico (ver prune_history) e, se algo
+    foi removido, atualiza as estatísticas do banco (ANALYZE).
+
+    O corte é calculado em UTC, como data_raspagem; `agora` sem fuso é tratado
+    como UTC. Os parâmetros omitidos vêm das configurações RETENTION_*. Com `vacuum`
+    None, o VACUUM roda só quando a remoção passa de RETENTION_VACUUM_MIN_DELETED
+    versões, para não reescrever o banco a cada execução.
+
+    Returns:
+        RetentionResult
+    """
+    dias = settings.RETENTION_KEEP_DAYS if dias is None else dias
+    checkpoints_mensais = settings.RETENTION_MONTHLY_CHECKPOINTS if checkpoints_mensais is None else checkpoints_mensais
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    corte = _utc_sem_fuso(agora or datetime.now(timezone.utc)) - timedelta(days=dias)
+
+    inicio = time.monotonic()
+    db = session_factory()
+    try:
+        versoes, conteudos = prune_history(db, corte, checkpoints_mensais=checkpoints_mensais, batch_size=batch_size)
+        if vacuum is None:
+            vacuum = versoes >= settings.RETENTION_VACUUM_MIN_DELETED
+        if versoes or vacuum:
+            optimize_database(TABELAS_DO_HISTORICO, vacuum=vacuum, bind=db.get_bind())
+    finally:
+        db.close()
+
+    resultado = RetentionResult(
+        corte=corte,
+        versoes_removidas=versoes,
+        conteudos_removidos=conteudos,
+        vacuum=vacuum,
+        duracao_segundos=time.monotonic() - inicio
+    )
+    logger.info(
+        f"Retenção concluída em {resultado.duracao_segundos:.1f}s: {versoes} versões e {conteudos} conteúdos removidos"
+        f"{' (com VACUUM)' if vacuum else ''}."
+    )
+    return resultado
+
+async def executar_retencao_periodicamente(intervalo_segundos: float) -> None:
+    """Executa a retenção a cada `intervalo_segundos` (tarefa de background da API)"""
+    while True:
+        await asyncio.sleep(intervalo_segundos)
+        try:
+            await asyncio.to_thread(executar_retencao)
+        except Exception as e:
+            logger.error(f"Erro na execução periódica da retenção: {e}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Linha de comando: python -m src.app.service.retention_service [opções]
+    """
+    parser = argparse.ArgumentParser(description="Aplica a política de retenção ao histórico de raspagens.")
+    parser.add_argument("--dias", type=int, default=None,
+                        help=f"Manter todas as versões dos últimos N dias (padrão: {settings.RETENTION_KEEP_DAYS})")
+    parser.add_argument("--checkpoints-mensais", action=argparse.BooleanOptionalAction, default=None,
+                        help="Manter a última versão de cada mês antes do corte (padrão: RETENTION_MONTHLY_CHECKPOINTS)")
+    parser.add_argument("--lote", type=int, default=None,
+                        help=f"Versões examinadas por transação (padrão: {settings.RETENTION_BATCH_SIZE})")
+    parser.add_argument("--vacuum", action=argparse.BooleanOptionalAction, default=None,
+                        help=f"Forçar ou impedir o VACUUM (padrão: a partir de {settings.RETENTION_VACUUM_MIN_DELETED} versões removidas)")
+    args = parser.parse_args(argv)
+
+    resultado = executar_retencao(
+        dias=args.dias,
+        checkpoints_mensais=args.checkpoints_mensais,
+        batch_size=args.lote,
+        vacuum=args.vacuum
+    )
+    print(
+        f"Corte: {resultado.corte.isoformat()} | versões removidas: {resultado.versoes_removidas} | "
+        f"conteúdos removidos: {resultado.conteudos_removidos} | VACUUM: {'sim' if resultado.vacuum else 'não'}"
+    )
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    raise SystemExit(main())
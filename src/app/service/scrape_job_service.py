@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.app.config.database import SessionLocal
+from src.app.config.settings import settings
+from src.app.domain.scrape_job import ScrapeJobResponse, JOB_CONCLUIDO, JOB_FALHOU, JOB_STATUS_ATIVOS
+from src.app.repository.scrape_job_repo import (
+    create_job, get_job, get_active_job, get_last_failed_job_id, get_last_success_time, count_active_jobs,
+    claim_job, update_job_progress, finish_job
+)
+from src.app.scraper.checkpoint import ScrapeJournal, get_scrape_journal
+from src.app.service.viticulture_service import salvar_raspagem_em_streaming
+
+logger = logging.getLogger(__name__)
+
+class ScrapeJobQueueFullError(Exception):
+    """Fila de jobs de raspagem cheia (controle de admissão)"""
+    pass
+
+class ScrapeJobService:
+    """
+    Fila de jobs de raspagem com pool de workers limitado.
+
+    Os jobs ficam na tabela `scrape_jobs`, então o status pode ser consultado
+    por qualquer worker do gunicorn. Um job pendente ou em execução com a
+    mesma chave (modo da raspagem) é reaproveitado em vez de duplicado; a
+    unicidade é garantida pelo banco. Cada processo executa no máximo
+    `max_workers` raspagens ao mesmo tempo (jobs do pool e raspagens ao vivo,
+    ver executar) e recusa novos jobs quando há `max_pending` jobs ativos.
+
+    Os jobs do processo, pendentes ou em execução, recebem heartbeat a cada
+    `heartbeat_seconds` (com o progresso acumulado em memória), então só jobs
+    de processos que morreram são considerados abandonados.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+        heartbeat_seconds: Optional[float] = None
+    ):
+        self.max_workers = max_workers or settings.SCRAPE_JOB_WORKERS
+        self.max_pending = max_pending or settings.SCRAPE_JOB_MAX_PENDING
+        self.session_factory = session_factory
+        self.heartbeat_seconds = heartbeat_seconds or settings.SCRAPE_JOB_HEARTBEAT_SECONDS
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Dict[int, Future] = {}
+        # Jobs deste processo (pendentes ou em execução) → contadores de progresso ainda não gravados
+        self._locais: Dict[int, Dict[str, int]] = {}
+        self._vagas = threading.BoundedSemaphore(self.max_workers)
+        self._heartbeat: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+
+    def submit(self, modo: str) -> Tuple[ScrapeJobResponse, bool]:
+        """
+        Enfileira uma raspagem, reaproveitando um job ativo idêntico.
+
+        Args:
+            modo: Modo da raspagem ('full' ou 'delta')
+
+        Returns:
+            (job, criado) - criado é False quando um job ativo foi reaproveitado
+
+        Raises:
+            ScrapeJobQueueFullError: Se já houver `max_pending` jobs ativos
+        """
+        resposta, criado = self._admitir(modo)
+        if not criado:
+            return resposta, False
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scrape-job")
+            future = self._executor.submit(self._run, resposta.id, modo)
+            self._futures[resposta.id] = future
+        future.add_done_callback(lambda _: self._futures.pop(resposta.id, None))
+
+        logger.info(f"Job de raspagem {resposta.id} ({modo}) enfileirado")
+        return resposta, True
+
+    async def executar(self, modo: str, **opcoes: Any) -> Tuple[ScrapeJobResponse, Optional[int]]:
+        """
+        Executa a raspagem no event loop de quem chama (ex.: GET /dados ao vivo),
+        com a mesma deduplicação e o mesmo limite de workers dos jobs enfileirados.
+
+        Args:
+            modo: Modo da raspagem ('full' ou 'delta')
+            opcoes: Repassadas a salvar_raspagem_em_streaming (ex.: ao_raspar, db)
+
+        Returns:
+            (job, total salvo) - total é None quando um job ativo idêntico foi
+            reaproveitado; nesse caso o job é aguardado por até SCRAPE_JOB_MAX_WAIT_SECONDS
+
+        Raises:
+            ScrapeJobQueueFullError: Se já houver `max_pending` jobs ativos ou
+                nenhum worker ficar livre dentro de SCRAPE_JOB_MAX_WAIT_SECONDS
+        """
+        job, criado = await asyncio.to_thread(self._admitir, modo)
+        if not criado:
+            logger.info(f"Raspagem ao vivo aguardando job idêntico {job.id} ({modo})")
+            return await self.wait(job.id, settings.SCRAPE_JOB_MAX_WAIT_SECONDS) or job, None
+
+        try:
+            if not await self._ocupar_vaga(settings.SCRAPE_JOB_MAX_WAIT_SECONDS):
+                erro = f"Nenhum dos {self.max_workers} workers de raspagem ficou livre"
+                await asyncio.to_thread(self._finalizar, job.id, JOB_FALHOU, erro)
+                raise ScrapeJobQueueFullError(erro)
+            try:
+                total = await self._executar_job(job.id, modo, **opcoes)
+            finally:
+                self._vagas.release()
+        finally:
+            self._esquecer(job.id)
+        return await asyncio.to_thread(self.get, job.id) or job, total
+
+    def get(self, job_id: int) -> Optional[ScrapeJobResponse]:
+        """Retorna o estado atual do job, ou None se não existir"""
+        db = self.session_factory()
+        try:
+            job = get_job(db, job_id)
+            return ScrapeJobResponse.model_validate(job) if job else None
+        finally:
+            db.close()
+
+    def get_active(self, modo: str) -> Optional[ScrapeJobResponse]:
+        """Job pendente ou em execução do modo, se houver"""
+        db = self.session_factory()
+        try:
+            job = get_active_job(db, modo)
+            return ScrapeJobResponse.model_validate(job) if job else None
+        finally:
+            db.close()
+
+    def last_success_time(self, modo: str) -> Optional[datetime]:
+        """Conclusão do último job bem-sucedido do modo (UTC, sem fuso)"""
+        db = self.session_factory()
+        try:
+            return get_last_success_time(db, modo)
+        finally:
+            db.close()
+
+    async def wait(self, job_id: int, timeout: float) -> Optional[ScrapeJobResponse]:
+        """
+        Aguarda a conclusão do job por até `timeout` segundos.
+
+        Returns:
+            Estado do job ao fim da espera (concluído ou ainda ativo)
+        """
+        future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return await asyncio.to_thread(self.get, job_id)
+
+        # Job executado por outro worker (ou ao vivo): acompanha pelo banco
+        loop = asyncio.get_running_loop()
+        prazo = loop.time() + timeout
+        while True:
+            job = await asyncio.to_thread(self.get, job_id)
+            if job is None or job.status not in JOB_STATUS_ATIVOS or loop.time() >= prazo:
+                return job
+            await asyncio.sleep(min(settings.SCRAPE_JOB_POLL_SECONDS, max(0.0, prazo - loop.time())))
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._parar.set()
+            self._heartbeat = None
+        # Fora do lock: os jobs em andamento precisam dele para registrar o resultado
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _admitir(self, modo: str) -> Tuple[ScrapeJobResponse, bool]:
+        """Reaproveita o job ativo idêntico ou cria um novo, registrado como job local"""
+        db = self.session_factory()
+        try:
+            ativo = get_active_job(db, modo)
+            if ativo and not self._is_stale(ativo):
+                logger.info(f"Reaproveitando job de raspagem ativo {ativo.id} ({modo})")
+                return ScrapeJobResponse.model_validate(ativo), False
+            if ativo:
+                logger.warning(f"Job {ativo.id} sem heartbeat há mais de {settings.SCRAPE_JOB_STALE_SECONDS}s, marcando como falho")
+                finish_job(db, ativo.id, JOB_FALHOU, "Job interrompido (sem heartbeat do worker)")
+
+            if count_active_jobs(db) >= self.max_pending:
+                raise ScrapeJobQueueFullError(f"Limite de {self.max_pending} jobs de raspagem ativos atingido")
+
+            job = create_job(db, modo, chave=modo)
+            if job is None:
+                # Outro worker criou o job entre a consulta e a inserção
+                return ScrapeJobResponse.model_validate(get_active_job(db, modo)), False
+
+            resposta = ScrapeJobResponse.model_validate(job)
+        finally:
+            db.close()
+
+        with self._lock:
+            self._locais[resposta.id] = {}
+            self._iniciar_heartbeat()
+        return resposta, True
+
+    def _run(self, job_id: int, modo: str) -> None:
+        """Executa o job no pool de workers (thread própria, com event loop próprio)"""
+        try:
+            with self._vagas:
+                asyncio.run(self._executar_job(job_id, modo))
+        except Exception:
+            pass  # Falha já registrada no job por _executar_job
+        finally:
+            self._esquecer(job_id)
+
+    async def _executar_job(self, job_id: int, modo: str, **opcoes: Any) -> Optional[int]:
+        """
+        Assume o job, raspa em streaming e registra o resultado.
+
+        Returns:
+            Total de seções salvas, ou None se o job não estava mais pendente
+        """
+        if not await asyncio.to_thread(self._assumir, job_id):
+            logger.warning(f"Job de raspagem {job_id} não está mais pendente; raspagem descartada")
+            return None
+
+        try:
+            journal = await asyncio.to_thread(self._diario, job_id, modo)
+            total = await salvar_raspagem_em_streaming(
+                modo, progresso=self._progresso_de(job_id), journal=journal, **opcoes
+            )
+        except Exception as e:
+            logger.error(f"Job de raspagem {job_id} falhou: {e}")
+            await asyncio.to_thread(self._finalizar, job_id, JOB_FALHOU, str(e))
+            raise
+
+        await asyncio.to_thread(self._finalizar, job_id, JOB_CONCLUIDO)
+        logger.info(f"Job de raspagem {job_id} concluído: {total} seções salvas")
+        return total
+
+    def _assumir(self, job_id: int) -> bool:
+        db = self.session_factory()
+        try:
+            return claim_job(db, job_id)
+        finally:
+            db.close()
+
+    def _diario(self, job_id: int, modo: str) -> Optional[ScrapeJournal]:
+        """Diário próprio do job; retoma o do último job do mesmo modo, se ele falhou"""
+        db = self.session_factory()
+        try:
+            return get_scrape_journal(modo, job_id, resume_from=get_last_failed_job_id(db, modo, job_id))
+        finally:
+            db.close()
+
+    def _finalizar(self, job_id: int, status: str, erro: Optional[str] = None) -> None:
+        """Grava o progresso acumulado e o resultado do job"""
+        with self._lock:
+            contadores = dict(self._locais.get(job_id) or {})
+        db = self.session_factory()
+        try:
+            if contadores:
+                update_job_progress(db, job_id, **contadores)
+            finish_job(db, job_id, status, erro)
+        except Exception as e:
+            logger.error(f"Não foi possível registrar o resultado do job {job_id}: {e}")
+        finally:
+            db.close()
+
+    def _progresso_de(self, job_id: int) -> Callable[..., None]:
+        """Callback de progresso: acumula os contadores em memória (gravados pelo heartbeat)"""
+        def progresso(**contadores: int) -> None:
+            with self._lock:
+                if job_id in self._locais:
+                    self._locais[job_id].update(contadores)
+        return progresso
+
+    async def _ocupar_vaga(self, timeout: float) -> bool:
+        """Aguarda uma vaga do limite de workers sem bloquear o event loop"""
+        tarefa = asyncio.ensure_future(asyncio.to_thread(self._vagas.acquire, True, timeout))
+        try:
+            return await asyncio.shield(tarefa)
+        except asyncio.CancelledError:
+            # Quem esperava desistiu: a vaga obtida depois disso é devolvida
+            tarefa.add_done_callback(lambda t: t.cancelled() or not t.result() or self._vagas.release())
+            raise
+
+    def _esquecer(self, job_id: int) -> None:
+        with self._lock:
+            self._locais.pop(job_id, None)
+
+    def _iniciar_heartbeat(self) -> None:
+        """Inicia a thread de heartbeat, se ainda não estiver rodando (chamar com o lock)"""
+        if self._heartbeat is None or not self._heartbeat.is_alive():
+            self._parar.clear()
+            self._heartbeat = threading.Thread(target=self._pulsar, name="scrape-job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _pulsar(self) -> None:
+        """Renova o heartbeat dos jobs locais e grava o progresso acumulado"""
+        while not self._parar.wait(self.heartbeat_seconds):
+            with self._lock:
+                locais = {job_id: dict(contadores) for job_id, contadores in self._locais.items()}
+            if not locais:
+                continue
+            db = self.session_factory()
+            try:
+                for job_id, contadores in locais.items():
+                    try:
+                        update_job_progress(db, job_id, **contadores)
+                    except Exception as e:
+                        logger.warning(f"Não foi possível atualizar progresso do job {job_id}: {e}")
+            finally:
+                db.close()
+
+    def _is_stale(self, job) -> bool:
+        # Jobs deste processo (inclusive os ainda na fila) recebem heartbeat: nunca estão abandonados
+        with self._lock:
+            if job.id in self._locais:
+                return False
+        return datetime.utcnow() - job.atualizado_em > timedelta(seconds=settings.SCRAPE_JOB_STALE_SECONDS)
+
+scrape_job_service = ScrapeJobService()
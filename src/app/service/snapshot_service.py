@@ -0,0 +1,86 @@
+import gzip
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from src.app.domain.viticulture import ViticulturaListResponse
+from src.app.utils.query_cache import get_query_cache
+from src.app.service.viticulture_service import obter_secoes_mais_recentes
+
+# Importação condicional: sem brotli, o snapshot é servido em gzip
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class DatasetSnapshot:
+    """Conjunto de dados mais recente já serializado e comprimido, pronto para envio"""
+    etag: str
+    total: int
+    json_bytes: bytes
+    gzip_bytes: bytes
+    brotli_bytes: Optional[bytes]
+
+    def encode_for(self, accept_encoding: Optional[str]) -> tuple[bytes, Optional[str]]:
+        """
+        Escolhe a variante conforme o cabeçalho Accept-Encoding do cliente.
+
+        Returns:
+            (corpo, content-encoding) - content-encoding é None para JSON sem compressão
+        """
+        aceitas = {
+            parte.split(";")[0].strip().lower()
+            for parte in (accept_encoding or "").split(",")
+            if not parte.strip().endswith("q=0")
+        }
+        if self.brotli_bytes is not None and "br" in aceitas:
+            return self.brotli_bytes, "br"
+        if "gzip" in aceitas:
+            return self.gzip_bytes, "gzip"
+        return self.json_bytes, None
+
+def _montar_snapshot(db: Session) -> Optional[DatasetSnapshot]:
+    secoes = obter_secoes_mais_recentes(db)
+    if not secoes:
+        return None
+
+    ultima_raspagem = max(item.data_raspagem for item in secoes)
+    resposta = ViticulturaListResponse(
+        fonte=f"Cache (Banco de Dados - Snapshot, dados de {ultima_raspagem.isoformat()})",
+        dados=secoes,
+        message=f"Versão mais recente de {len(secoes)} seções armazenadas."
+    )
+    json_bytes = resposta.model_dump_json().encode("utf-8")
+
+    # ETag derivada das datas de raspagem: muda só quando alguma seção é regravada
+    assinatura = hashlib.sha256()
+    for item in secoes:
+        assinatura.update(f"{item.id}:{item.data_raspagem.isoformat()};".encode("utf-8"))
+    etag = f'W/"{assinatura.hexdigest()[:32]}"'
+
+    snapshot = DatasetSnapshot(
+        etag=etag,
+        total=len(secoes),
+        json_bytes=json_bytes,
+        gzip_bytes=gzip.compress(json_bytes, compresslevel=6),
+        brotli_bytes=brotli.compress(json_bytes, quality=5) if BROTLI_AVAILABLE else None
+    )
+    logger.info(f"Snapshot do conjunto de dados montado: {snapshot.total} seções, {len(json_bytes)} bytes ({len(snapshot.gzip_bytes)} em gzip)")
+    return snapshot
+
+def obter_snapshot(db: Session) -> Optional[DatasetSnapshot]:
+    """
+    Retorna o snapshot do conjunto de dados mais recente, montado uma vez por
+    versão dos dados (ver QueryCache) e compartilhado entre requisições.
+
+    Returns:
+        DatasetSnapshot, ou None se o banco estiver vazio
+    """
+    return get_query_cache().get_or_load(("snapshot",), lambda: _montar_snapshot(db))
@@ -1,11 +1,18 @@
+import asyncio
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional, Set, Tuple
 from fastapi import BackgroundTasks 
-from src.app.scraper.full_scraper import run_full_scrape
-from src.app.scraper.partial_scraper import run_scrape_by_params
-from src.app.repository.viticulture_repo import save_bulk, get_latest_scrape_group # Alterado aqui
+from src.app.scraper.async_scraper import run_scrape_by_params_async, iter_full_scrape_async
+from src.app.scraper.checkpoint import ScrapeJournal
+from src.app.scraper.config import SCRAPING_CONFIG
+from src.app.repository.viticulture_repo import get_latest_scrape_group, get_stored_section_keys, get_latest_sections, get_latest_scrape_timestamp
 from src.app.domain.viticulture import ViticulturaCreate, ViticulturaResponse, ViticulturaListResponse
 from src.app.config.database import SessionLocal 
+from src.app.config.settings import settings
+from src.app.service.persistence_writer import persistence_writer, PersistenceQueueFullError
+from src.app.utils.singleflight import AsyncSingleFlight
+from src.app.utils.query_cache import get_query_cache
+from src.app.utils.pagination import CursorKey, paginate_items, split_page
 import logging
 from datetime import datetime, timezone  # Add timezone import here
 from src.app.domain.viticulture import DadosEspecificosRequest
@@ -16,104 +23,465 @@ from src.app.repository.viticulture_repo import get_specific_data_from_db
 
 logger = logging.getLogger(__name__)
 
-def _save_data_in_background(data_to_save: List[ViticulturaCreate]):
-    db_bg = SessionLocal()
+# Modos de atualização de GET /dados
+MODO_COMPLETO = "full"   # Raspa todas as páginas de todas as opções
+MODO_DELTA = "delta"     # Raspa apenas anos/subopções novos e os anos recentes ainda sujeitos a revisão
+
+# Seções por lote na gravação em streaming
+TAMANHO_LOTE_SALVAMENTO = 200
+
+async def _agendar_salvamento(data_to_save: List[ViticulturaCreate]) -> None:
+    """
+    Enfileira as seções no gravador do processo (persistence_writer). Com a fila
+    cheia, a requisição espera vaga (contrapressão); se o limite de espera
+    acabar, o salvamento é descartado e registrado.
+    """
+    try:
+        await asyncio.to_thread(persistence_writer.submit, data_to_save)
+        logger.info(f"{len(data_to_save)} seções enfileiradas para gravação.")
+    except PersistenceQueueFullError as e:
+        logger.error(f"Seções não enfileiradas para gravação: {e}")
+
+async def _gravar_e_aguardar(lote: List[ViticulturaCreate]) -> None:
+    """Grava um lote pelo gravador do processo e aguarda a confirmação"""
+    await asyncio.wrap_future(await asyncio.to_thread(persistence_writer.submit, lote))
+
+def _secoes_para_salvar(db: Session, scraped_data_list: List[Dict[str, Any]], viticultura_create_list: List[ViticulturaCreate]) -> List[ViticulturaCreate]:
+    """
+    Descarta do salvamento as seções cuja página não mudou desde a última coleta
+    (marcadas como 'inalterado' pelo cache de páginas) e que já estão no banco.
+    """
+    inalteradas = {
+        (item['aba'], item.get('subopcao'), item['ano'])
+        for item in scraped_data_list if item.get('inalterado')
+    }
+    if not inalteradas:
+        return viticultura_create_list
+
+    try:
+        ja_salvas = inalteradas & get_stored_section_keys(db)
+    except Exception as e:
+        logger.warning(f"Não foi possível verificar seções já salvas, salvando todas: {e}")
+        return viticultura_create_list
+
+    if ja_salvas:
+        logger.info(f"{len(ja_salvas)} seções inalteradas já estão no banco e não serão salvas novamente.")
+    return [vc for vc in viticultura_create_list if (vc.aba, vc.subopcao, vc.ano) not in ja_salvas]
+
+def _resposta_ao_vivo(vc: ViticulturaCreate) -> ViticulturaResponse:
+    """
+    Monta a resposta de uma seção recém-raspada (id=None, ainda não salva).
+
+    Usa model_construct para compartilhar a lista `dados` já validada em
+    ViticulturaCreate em vez de copiá-la novamente.
+    """
+    return ViticulturaResponse.model_construct(
+        id=None,
+        ano=vc.ano,
+        aba=vc.aba,
+        subopcao=vc.subopcao,
+        dados=vc.dados,
+        data_raspagem=vc.data_raspagem
+    )
+
+def _resposta_armazenada(db_item) -> ViticulturaResponse:
+    """Monta a resposta de uma seção lida do banco"""
+    return ViticulturaResponse(
+        id=db_item.id,
+        ano=db_item.ano,
+        aba=db_item.aba,
+        subopcao=db_item.subopcao,
+        dados=db_item.dados_list_json,
+        data_raspagem=db_item.data_raspagem
+    )
+
+def obter_secoes_mais_recentes(
+    db: Session,
+    ano_min: Optional[int] = None,
+    ano_max: Optional[int] = None,
+    opcao: Optional[str] = None,
+    apos: Optional[CursorKey] = None,
+    limite: Optional[int] = None
+) -> List[ViticulturaResponse]:
+    """
+    Versão mais recente de cada seção armazenada (ver get_latest_sections), via cache de consultas.
+    Com `limite`, retorna limite + 1 itens (ver split_page).
+    """
+    chave = ("secoes_mais_recentes", ano_min, ano_max, opcao.strip().lower() if opcao else None, apos, limite)
+    return get_query_cache().get_or_load(chave, lambda: [
+        _resposta_armazenada(item)
+        for item in get_latest_sections(db, ano_min=ano_min, ano_max=ano_max, opcao=opcao, after=apos, limit=limite)
+    ])
+
+def _ultima_raspagem(db: Session, apos: Optional[CursorKey] = None, limite: Optional[int] = None) -> List[ViticulturaResponse]:
+    """Seções da raspagem mais recente (ver get_latest_scrape_group), via cache de consultas"""
+    paginado = apos is not None or limite is not None
+    return get_query_cache().get_or_load(("ultima_raspagem", apos, limite), lambda: [
+        _resposta_armazenada(item)
+        for item in (get_latest_scrape_group(db, after=apos, limit=limite) if paginado else get_latest_scrape_group(db))
+    ])
+
+def _ultima_data_raspagem(db: Session) -> Optional[datetime]:
+    return get_query_cache().get_or_load(("ultima_data_raspagem",), lambda: get_latest_scrape_timestamp(db))
+
+def _dados_especificos_do_banco(
+    db: Session,
+    ano_min: int,
+    ano_max: int,
+    opcao: str,
+    apos: Optional[CursorKey] = None,
+    limite: Optional[int] = None
+) -> List[ViticulturaResponse]:
+    """Registros do intervalo para a opção (ver get_specific_data_from_db), via cache de consultas"""
+    paginado = apos is not None or limite is not None
+    chave = ("dados_especificos", ano_min, ano_max, opcao.strip().lower(), apos, limite)
+    return get_query_cache().get_or_load(chave, lambda: [
+        _resposta_armazenada(item)
+        for item in (
+            get_specific_data_from_db(db, ano_min, ano_max, opcao, after=apos, limit=limite) if paginado
+            else get_specific_data_from_db(db, ano_min, ano_max, opcao)
+        )
+    ])
+
+def _criar_viticultura(item_dict: Dict[str, Any], data_raspagem: datetime) -> Optional[ViticulturaCreate]:
+    """Converte uma seção raspada em ViticulturaCreate; seções inválidas são registradas e ignoradas"""
+    try:
+        return ViticulturaCreate(
+            ano=item_dict['ano'],
+            aba=item_dict['aba'],
+            subopcao=item_dict.get('subopcao'),
+            dados=item_dict['dados'],
+            data_raspagem=data_raspagem
+        )
+    except Exception as e:
+        logger.error(f"Alerta: Item raspado ignorado devido a erro de validação/criação: {e}. Item: {item_dict.get('aba')}/{item_dict.get('subopcao')}/{item_dict.get('ano')}")
+        return None
+
+async def _chaves_salvas_ou_vazio(db: Session) -> Set[Tuple[str, Optional[str], int]]:
+    """Seções já salvas; em caso de erro, nenhuma (as inalteradas são salvas de novo)"""
+    try:
+        return await asyncio.to_thread(get_stored_section_keys, db)
+    except Exception as e:
+        logger.warning(f"Não foi possível verificar seções já salvas, salvando todas: {e}")
+        return set()
+
+async def salvar_raspagem_em_streaming(
+    modo: str = MODO_COMPLETO,
+    tamanho_lote: int = TAMANHO_LOTE_SALVAMENTO,
+    progresso: Optional[Callable[..., None]] = None,
+    journal: Optional[ScrapeJournal] = None,
+    ao_raspar: Optional[Callable[[ViticulturaCreate], None]] = None,
+    db: Optional[Session] = None
+) -> int:
+    """
+    Raspa todas as opções e grava no banco à medida que as seções são extraídas.
+
+    Nenhuma lista com o conjunto completo é montada: cada seção é convertida
+    em ViticulturaCreate e gravada em lotes de `tamanho_lote`, então o pico de
+    memória não depende do número de anos e opções raspados. Seções
+    inalteradas (cache de páginas) que já estão no banco não são regravadas.
+
+    Args:
+        modo: MODO_COMPLETO ou MODO_DELTA
+        tamanho_lote: Seções por commit
+        progresso: Chamado com contadores (paginas_total, secoes_processadas,
+            secoes_salvas) após o planejamento e a cada seção processada
+        journal: Diário de checkpoint da execução, para retomada após interrupção
+        ao_raspar: Chamado com cada seção válida raspada, gravada ou não
+            (a raspagem ao vivo monta a resposta por aqui)
+        db: Sessão para ler as seções já salvas (padrão: sessão própria)
+
+    Returns:
+        Total de seções salvas
+    """
+    def reportar(**contadores: int) -> None:
+        if progresso:
+            progresso(**contadores)
+
+    sessao = db or SessionLocal()
     try:
-        logger.info(f"Background task: Iniciando salvamento de {len(data_to_save)} registros.")
-        save_bulk(db_bg, data_to_save) 
-        logger.info("Background task: Dados salvos com sucesso no banco de dados.")
-    except Exception as e_save_bg:
-        logger.error(f"Background task: Erro ao salvar dados no banco de dados: {e_save_bg}")
+        # Modo completo: as seções salvas só importam para pular as inalteradas (lidas na primeira)
+        salvas = await asyncio.to_thread(get_stored_section_keys, sessao) if modo == MODO_DELTA else None
+        data_raspagem = datetime.now(timezone.utc)
+        lote: List[ViticulturaCreate] = []
+        total = 0
+        processadas = 0
+
+        async for item_dict in iter_full_scrape_async(
+            stored_sections=salvas if modo == MODO_DELTA else None,
+            journal=journal,
+            on_plan=lambda paginas: reportar(paginas_total=paginas)
+        ):
+            processadas += 1
+            vc = _criar_viticultura(item_dict, data_raspagem)
+            if vc is not None and ao_raspar:
+                ao_raspar(vc)
+            if vc is not None and item_dict.get('inalterado'):
+                if salvas is None:
+                    salvas = await _chaves_salvas_ou_vazio(sessao)
+                if (vc.aba, vc.subopcao, vc.ano) in salvas:
+                    vc = None  # Já está no banco: não é regravada
+            if vc is not None:
+                lote.append(vc)
+            if len(lote) >= tamanho_lote:
+                await _gravar_e_aguardar(lote)
+                total += len(lote)
+                lote = []
+            # Toda seção conta como progresso, inclusive as inalteradas que não são gravadas
+            reportar(secoes_processadas=processadas, secoes_salvas=total)
+
+        if lote:
+            await _gravar_e_aguardar(lote)
+            total += len(lote)
+        reportar(secoes_processadas=processadas, secoes_salvas=total)
+
+        logger.info(f"Raspagem em streaming concluída: {total} seções salvas (modo {modo}).")
+        return total
     finally:
-        db_bg.close()
-        logger.info("Background task: Sessão do banco de dados fechada.")
+        if db is None:
+            sessao.close()
+
+def _completar_com_secoes_salvas(db: Session, data_for_response: List[ViticulturaResponse]) -> List[ViticulturaResponse]:
+    """
+    No modo delta, completa a resposta com a versão mais recente das seções
+    armazenadas que não foram raspadas nesta atualização.
+    """
+    raspadas = {(item.aba, item.subopcao, item.ano) for item in data_for_response}
+    try:
+        salvas = obter_secoes_mais_recentes(db)
+    except Exception as e:
+        logger.warning(f"Não foi possível completar a resposta com as seções salvas: {e}")
+        return data_for_response
+
+    complemento = [item for item in salvas if (item.aba, item.subopcao, item.ano) not in raspadas]
+    return data_for_response + complemento
+
+def _como_utc(momento: datetime) -> datetime:
+    # SQLite devolve datetimes sem fuso; os timestamps são gravados em UTC
+    return momento if momento.tzinfo else momento.replace(tzinfo=timezone.utc)
+
+def _formatar_idade(segundos: float) -> str:
+    minutos = int(segundos // 60)
+    horas, minutos = divmod(minutos, 60)
+    return f"{horas}h{minutos:02d}min" if horas else f"{minutos}min"
+
+def _servir_stale_while_revalidate(
+    db: Session,
+    modo: str,
+    apos: Optional[CursorKey] = None,
+    limite: Optional[int] = None
+) -> Optional[ViticulturaListResponse]:
+    """
+    Responde com a versão mais recente de cada seção armazenada e, quando os
+    dados passaram do TTL, enfileira a atualização como job de raspagem (ver
+    scrape_job_service: um job ativo idêntico é reaproveitado e o limite de
+    workers vale para ela). Com `apos`/`limite`, lê do banco só a página pedida.
+
+    Returns:
+        ViticulturaListResponse, ou None se o banco estiver vazio (cai no modo ao vivo)
+    """
+    # Import local: scrape_job_service importa este módulo
+    from src.app.service.scrape_job_service import scrape_job_service, ScrapeJobQueueFullError
+
+    paginado = apos is not None or limite is not None
+    try:
+        if paginado:
+            db_items, proximo_cursor = split_page(obter_secoes_mais_recentes(db, apos=apos, limite=limite), limite)
+            ultima_raspagem = _ultima_data_raspagem(db)
+        else:
+            db_items, proximo_cursor = obter_secoes_mais_recentes(db), None
+            ultima_raspagem = max((item.data_raspagem for item in db_items), default=None, key=_como_utc)
+    except Exception as e:
+        logger.error(f"Stale-while-revalidate: erro ao ler o banco, usando raspagem ao vivo: {e}")
+        return None
+    if ultima_raspagem is None:
+        return None
+
+    referencia = _como_utc(ultima_raspagem)
+    try:
+        # Um job sem seções alteradas não grava nada, mas renova a validade dos dados
+        concluida_em = scrape_job_service.last_success_time(modo)
+        if concluida_em and _como_utc(concluida_em) > referencia:
+            referencia = _como_utc(concluida_em)
+        idade = (datetime.now(timezone.utc) - referencia).total_seconds()
+
+        if idade > settings.VITICULTURA_MAX_AGE_SECONDS:
+            job, criado = scrape_job_service.submit(modo)
+            if criado:
+                logger.info(f"Stale-while-revalidate: atualização enfileirada como job {job.id} (modo {modo}).")
+            atualizando = True
+        else:
+            atualizando = scrape_job_service.get_active(modo) is not None
+    except ScrapeJobQueueFullError as e:
+        logger.warning(f"Stale-while-revalidate: atualização não enfileirada: {e}")
+        atualizando = False
+    except Exception as e:
+        logger.error(f"Stale-while-revalidate: erro ao consultar os jobs de raspagem: {e}")
+        idade = (datetime.now(timezone.utc) - referencia).total_seconds()
+        atualizando = False
+
+    situacao = "atualização em andamento" if atualizando else "dentro da validade"
+    return ViticulturaListResponse(
+        fonte=f"Cache (Banco de Dados - Stale-While-Revalidate, dados de {referencia.isoformat()})",
+        dados=db_items,
+        message=(
+            f"Dados com {_formatar_idade(idade)} de idade ({situacao}). "
+            f"Atualização em background: {'sim' if atualizando else 'não'}."
+        ),
+        next_cursor=proximo_cursor
+    )
+
+def _servir_pagina_do_banco(
+    db: Session,
+    modo: str,
+    apos: Optional[CursorKey],
+    limite: Optional[int]
+) -> Optional[ViticulturaListResponse]:
+    """
+    Modo ao vivo com paginação: a página pedida é lida do banco por keyset, sem
+    raspar a Embrapa na requisição. Só a primeira página (sem `apos`) enfileira
+    a raspagem como job; as páginas seguintes percorrem os dados já gravados.
+
+    Returns:
+        ViticulturaListResponse, ou None se o banco estiver vazio (cai na raspagem ao vivo)
+    """
+    # Import local: scrape_job_service importa este módulo
+    from src.app.service.scrape_job_service import scrape_job_service, ScrapeJobQueueFullError
+
+    try:
+        db_items, proximo_cursor = split_page(obter_secoes_mais_recentes(db, apos=apos, limite=limite), limite)
+    except Exception as e:
+        logger.error(f"Paginação ao vivo: erro ao ler o banco, usando raspagem ao vivo: {e}")
+        return None
+    if not db_items and apos is None:
+        return None
+
+    situacao = "página seguinte, sem nova raspagem"
+    if apos is None:
+        try:
+            job, criado = scrape_job_service.submit(modo)
+            if criado:
+                logger.info(f"Paginação ao vivo: raspagem enfileirada como job {job.id} (modo {modo}).")
+            situacao = f"raspagem em background no job {job.id} ({job.status})"
+        except ScrapeJobQueueFullError as e:
+            logger.warning(f"Paginação ao vivo: raspagem não enfileirada: {e}")
+            situacao = f"raspagem não enfileirada: {e}"
+
+    return ViticulturaListResponse(
+        fonte="Cache (Banco de Dados - Página por Cursor)",
+        dados=db_items,
+        message=f"Página lida do banco de dados ({situacao}).",
+        next_cursor=proximo_cursor
+    )
+
+async def obter_dados_viticultura_e_salvar(
+    db: Session,
+    background_tasks: BackgroundTasks,
+    modo: str = MODO_COMPLETO,
+    apos: Optional[CursorKey] = None,
+    limite: Optional[int] = None
+):
+    """
+    Raspa e retorna os dados de viticultura (ou os serve do banco, ver VITICULTURA_SERVE_MODE).
+
+    As consultas ao banco (síncronas) rodam em thread, fora do event loop.
+
+    Args:
+        apos, limite: Paginação por cursor na ordem (ano, aba, subopcao_key, id). Páginas
+            são sempre lidas do banco (_paginar_keyset): com dados armazenados, a
+            primeira página enfileira a raspagem como job em vez de raspar na
+            requisição; com o banco vazio, a raspagem grava sem montar as respostas
+            e a página é lida do banco em seguida.
+    """
+    # Import local: scrape_job_service importa este módulo
+    from src.app.service.scrape_job_service import scrape_job_service, ScrapeJobQueueFullError
+
+    paginado = apos is not None or limite is not None
+    if settings.VITICULTURA_SERVE_MODE == "swr":
+        resposta = await asyncio.to_thread(_servir_stale_while_revalidate, db, modo, apos, limite)
+        if resposta is not None:
+            return resposta
+        logger.info("Stale-while-revalidate: banco vazio, raspando ao vivo.")
+    elif paginado:
+        resposta = await asyncio.to_thread(_servir_pagina_do_banco, db, modo, apos, limite)
+        if resposta is not None:
+            return resposta
+        logger.info("Paginação ao vivo: banco vazio, raspando antes de ler a página.")
 
-def obter_dados_viticultura_e_salvar(db: Session, background_tasks: BackgroundTasks):
     fonte_mensagem = "Falha ao obter dados"
     data_for_response: List[ViticulturaResponse] = []
     mensagem_adicional = None
-    current_timestamp = datetime.now(timezone.utc)  # Corrigido: usar timezone.utc em vez de datetime.timezone.utc
+    pagina_ao_vivo = False
 
     try:
-        logger.info("Tentando raspar dados ao vivo da Embrapa...")
-        scraped_data_list = run_full_scrape(output_filepath=None)
+        logger.info(f"Tentando raspar dados ao vivo da Embrapa (modo {modo})...")
+        # Só a resposta é acumulada: as seções vão para o gravador em lotes durante a raspagem.
+        # A raspagem roda como job (deduplicação e limite de workers compartilhados com POST /jobs)
+        # Paginado, a página sai do banco depois da gravação: nenhuma resposta é montada durante a raspagem
+        raspadas: List[ViticulturaResponse] = []
+        job, salvas = await scrape_job_service.executar(
+            modo, db=db, ao_raspar=None if paginado else (lambda vc: raspadas.append(_resposta_ao_vivo(vc)))
+        )
 
-        if scraped_data_list and any(item.get('dados') for item in scraped_data_list):
-            logger.info(f"Raspagem ao vivo bem-sucedida. {len(scraped_data_list)} seções de dados obtidas.")
-            
-            viticultura_create_list: List[ViticulturaCreate] = []
-            for item_dict in scraped_data_list:
-                try:
-                    vc = ViticulturaCreate(
-                        ano=item_dict['ano'],
-                        aba=item_dict['aba'],
-                        subopcao=item_dict.get('subopcao'),
-                        dados=item_dict['dados'],
-                        data_raspagem=current_timestamp # Adicionar timestamp
-                    )
-                    viticultura_create_list.append(vc)
-                except KeyError as ke:
-                    logger.error(f"Alerta: Item raspado ignorado devido à chave ausente: {ke}. Item: {item_dict}")
-                    continue
-                except Exception as p_exc: 
-                    logger.error(f"Alerta: Item raspado ignorado devido a erro de validação/criação: {p_exc}. Item: {item_dict}")
-                    continue
+        if salvas is None:
+            logger.info(f"Raspagem idêntica em andamento (job {job.id}). Tentando cache do BD.")
+            mensagem_adicional = f"Raspagem idêntica em andamento (job {job.id}, {job.status}). Usando cache do BD se disponível."
+        elif paginado:
+            logger.info(f"Raspagem ao vivo concluída (job {job.id}): {salvas} seções salvas. Lendo a página do banco.")
+            fonte_mensagem = "Embrapa (Raspagem Ao Vivo - Página Lida do Banco de Dados)"
+            pagina_ao_vivo = True
+            mensagem_adicional = f"Raspagem ao vivo concluída: {salvas} seções novas ou alteradas salvas no banco de dados."
+        elif raspadas:
+            logger.info(f"Raspagem ao vivo bem-sucedida. {len(raspadas)} seções de dados obtidas, {salvas} salvas.")
+            data_for_response = raspadas
+            fonte_mensagem = "Embrapa (Raspagem Ao Vivo - Dados Salvos)"
 
-            if not viticultura_create_list:
-                logger.info("Nenhum dado válido para salvar após a transformação da raspagem.")
-                mensagem_adicional = "Raspagem ao vivo não produziu dados válidos para o banco de dados."
-            else:
-                logger.info(f"Transformação concluída. {len(viticultura_create_list)} entradas prontas para retornar e salvar.")
-                
-                for vc_item in viticultura_create_list:
-                    data_for_response.append(ViticulturaResponse(
-                        id=None, # id será None pois ainda não foi salvo
-                        ano=vc_item.ano,
-                        aba=vc_item.aba,
-                        subopcao=vc_item.subopcao,
-                        dados=vc_item.dados,
-                        data_raspagem=vc_item.data_raspagem
-                    ))
-
-                fonte_mensagem = "Embrapa (Raspagem Ao Vivo - Salvamento em Andamento)"
-                background_tasks.add_task(_save_data_in_background, viticultura_create_list)
-                
-                return ViticulturaListResponse(
-                    fonte=fonte_mensagem, 
-                    dados=data_for_response, 
-                    message=f"Dados de raspagem ao vivo ({current_timestamp.isoformat()}) retornados. Salvamento no banco de dados iniciado em background."
+            if modo == MODO_DELTA:
+                data_for_response = await asyncio.to_thread(_completar_com_secoes_salvas, db, data_for_response)
+
+            return ViticulturaListResponse(
+                fonte=fonte_mensagem,
+                dados=data_for_response,
+                message=(
+                    f"Dados de raspagem ao vivo ({raspadas[0].data_raspagem.isoformat()}) retornados. "
+                    f"{salvas} seções novas ou alteradas salvas no banco de dados."
                 )
+            )
         else: 
             logger.info("Raspagem ao vivo não retornou dados ou os dados estavam vazios. Tentando cache do BD.")
             mensagem_adicional = "Raspagem ao vivo não retornou dados. Usando cache do BD se disponível."
 
+    except ScrapeJobQueueFullError as e_fila:
+        logger.warning(f"Raspagem ao vivo não admitida: {e_fila}. Tentando cache do BD.")
+        mensagem_adicional = f"Raspagem ao vivo não admitida: {e_fila}. Usando cache do BD se disponível."
+
     except Exception as e_scrape: 
         logger.error(f"Falha crítica na raspagem ao vivo: {e_scrape}. Tentando cache do BD.")
         mensagem_adicional = f"Falha na raspagem ao vivo: {e_scrape}. Usando cache do BD se disponível."
 
     logger.info("Tentando carregar dados do cache do banco de dados (raspagem mais recente)...")
+    proximo_cursor = None
     try:
-        db_data_models = get_latest_scrape_group(db) # Alterado aqui
+        # No modo delta a raspagem mais recente cobre só parte das seções; a página ao vivo
+        # segue a mesma ordem das páginas seguintes (_servir_pagina_do_banco)
+        if modo == MODO_DELTA or pagina_ao_vivo:
+            db_data_models = await asyncio.to_thread(obter_secoes_mais_recentes, db, apos=apos, limite=limite)
+        else:
+            db_data_models = await asyncio.to_thread(_ultima_raspagem, db, apos=apos, limite=limite)
+        db_data_models, proximo_cursor = split_page(db_data_models, limite)
         if db_data_models:
-            # O Pydantic model ViticulturaResponse espera 'dados', mas o DB model tem 'dados_list_json'
-            # e também precisamos do 'data_raspagem' do modelo do banco.
-            for db_item in db_data_models:
-                data_for_response.append(ViticulturaResponse(
-                    id=db_item.id,
-                    ano=db_item.ano,
-                    aba=db_item.aba,
-                    subopcao=db_item.subopcao,
-                    dados=db_item.dados_list_json, # Mapear do nome da coluna do DB
-                    data_raspagem=db_item.data_raspagem
-                ))
+            # Respostas já convertidas (e compartilhadas pelo cache de consultas)
+            data_for_response.extend(db_data_models)
             
             latest_db_timestamp_str = data_for_response[0].data_raspagem.isoformat() if data_for_response else "N/A"
             logger.info(f"Dados carregados com sucesso do cache do banco de dados (raspagem de {latest_db_timestamp_str}): {len(data_for_response)} entradas.")
-            fonte_mensagem = f"Cache (Banco de Dados - Raspagem de {latest_db_timestamp_str})"
-            if mensagem_adicional: 
-                fonte_mensagem = f"{fonte_mensagem} (após: {mensagem_adicional.split('.')[0]})"
-            else: 
-                 mensagem_adicional = f"Raspagem ao vivo não produziu dados válidos, servindo do cache do BD (raspagem de {latest_db_timestamp_str})."
+            # Página da raspagem ao vivo recém-gravada: fonte e mensagem já definidas
+            if not pagina_ao_vivo:
+                fonte_mensagem = f"Cache (Banco de Dados - Raspagem de {latest_db_timestamp_str})"
+                if mensagem_adicional: 
+                    fonte_mensagem = f"{fonte_mensagem} (após: {mensagem_adicional.split('.')[0]})"
+                else: 
+                     mensagem_adicional = f"Raspagem ao vivo não produziu dados válidos, servindo do cache do BD (raspagem de {latest_db_timestamp_str})."
         else: 
             logger.warning("Nenhum dado encontrado no cache do banco de dados.")
             fonte_mensagem = "Falha - Cache do BD Vazio"
@@ -133,18 +501,146 @@ def obter_dados_viticultura_e_salvar(db: Session, background_tasks: BackgroundTa
     return ViticulturaListResponse(
         fonte=fonte_mensagem, 
         dados=data_for_response, 
-        message=mensagem_adicional
+        message=mensagem_adicional,
+        next_cursor=proximo_cursor
     )
 
 
-def buscar_dados_especificos(db: Session, background_tasks: BackgroundTasks, ano_min: int, ano_max: int, opcao: str):
+# Raspagens específicas em andamento, por (opcao, ano)
+_raspagens_especificas = AsyncSingleFlight()
+
+def _intervalos_contiguos(anos: List[int]) -> List[Tuple[int, int]]:
+    """Agrupa anos ordenados em intervalos contíguos: [2001, 2002, 2005] -> [(2001, 2002), (2005, 2005)]"""
+    intervalos: List[Tuple[int, int]] = []
+    for ano in anos:
+        if intervalos and ano == intervalos[-1][1] + 1:
+            intervalos[-1] = (intervalos[-1][0], ano)
+        else:
+            intervalos.append((ano, ano))
+    return intervalos
+
+def _formatar_anos(anos: List[int]) -> str:
+    """[2019, 2020, 2021, 2023] -> '2019-2021, 2023'"""
+    return ", ".join(str(inicio) if inicio == fim else f"{inicio}-{fim}" for inicio, fim in _intervalos_contiguos(sorted(anos)))
+
+async def _raspar_anos_coalescidos(
+    ano_min: int,
+    ano_max: int,
+    opcao: str,
+    secoes_frescas: Optional[Set[Tuple[str, Optional[str], int]]] = None
+) -> Tuple[List[Dict[str, Any]], Set[int], Set[int]]:
+    """
+    Raspa o intervalo de anos compartilhando a coleta com requisições concorrentes.
+
+    Cada (opcao, ano) é uma unidade: anos já em raspagem por outra requisição
+    são aguardados, e os demais são raspados por esta em intervalos contíguos.
+    Intervalos sobrepostos (ex.: 2010-2015 e 2013-2020) dividem as unidades
+    em comum. Páginas de `secoes_frescas` (já atualizadas no banco) não são
+    buscadas.
+
+    Returns:
+        (seções raspadas do intervalo, anos raspados por esta requisição, anos
+        com páginas planejadas) - só os anos próprios devem ser salvos, para não
+        duplicar registros; um ano planejado sem seções raspadas não pôde ser raspado
+    """
+    chaves = [(opcao, ano) for ano in range(ano_min, ano_max + 1)]
+    futuros, proprias = _raspagens_especificas.claim(chaves)
+    anos_proprios = sorted(ano for _, ano in proprias)
+    if len(anos_proprios) < len(chaves):
+        logger.info(f"Coalescendo raspagem de {opcao}: {len(chaves) - len(anos_proprios)} anos já em andamento em outra requisição")
+
+    try:
+        for inicio, fim in _intervalos_contiguos(anos_proprios):
+            planejadas: List[Tuple[str, Optional[str], int]] = []
+            itens = await run_scrape_by_params_async(inicio, fim, opcao, skip_sections=secoes_frescas, on_plan=planejadas.extend)
+            anos_planejados = {ano for _, _, ano in planejadas}
+            for ano in range(inicio, fim + 1):
+                _raspagens_especificas.resolve(
+                    (opcao, ano), ([item for item in itens or [] if item.get('ano') == ano], ano in anos_planejados)
+                )
+    except BaseException as e:
+        # Falha ou cancelamento: libera as unidades restantes para quem as aguarda
+        for chave in proprias:
+            _raspagens_especificas.reject(chave, e if isinstance(e, Exception) else RuntimeError("Raspagem cancelada"))
+        raise
+
+    resultados = await asyncio.gather(*(futuros[chave] for chave in chaves))
+    itens = [item for itens_ano, _ in resultados for item in itens_ano]
+    planejados = {ano for (_, ano), (_, planejado) in zip(chaves, resultados) if planejado}
+    return itens, set(anos_proprios), planejados
+
+def _secoes_frescas_no_banco(db: Session, ano_min: int, ano_max: int, opcao: str) -> List[ViticulturaResponse]:
+    """
+    Seções do intervalo já armazenadas que não precisam ser raspadas de novo.
+
+    Anos fechados - anteriores à janela de revisão da Embrapa, a mesma da coleta
+    incremental (DELTA_REVISION_YEARS) - não mudam mais: uma vez armazenados,
+    estão atualizados. Os anos dentro da janela valem por DADOS_ESPECIFICOS_MAX_AGE_SECONDS.
+
+    Returns:
+        Registros mais recentes de cada seção dentro da validade; vazio se a
+        reutilização estiver desativada ou o banco não puder ser lido
+    """
+    if settings.DADOS_ESPECIFICOS_MAX_AGE_SECONDS <= 0:
+        return []
+    try:
+        armazenadas = obter_secoes_mais_recentes(db, ano_min=ano_min, ano_max=ano_max, opcao=opcao)
+    except Exception as e:
+        logger.warning(f"Não foi possível ler as seções armazenadas, raspando todas: {e}")
+        return []
+
+    agora = datetime.now(timezone.utc)
+    # Último ano publicado é o anterior ao corrente; a janela cobre os DELTA_REVISION_YEARS últimos publicados
+    inicio_revisao = agora.year - SCRAPING_CONFIG.DELTA_REVISION_YEARS
+    return [
+        item for item in armazenadas
+        if item.ano < inicio_revisao
+        or (agora - _como_utc(item.data_raspagem)).total_seconds() <= settings.DADOS_ESPECIFICOS_MAX_AGE_SECONDS
+    ]
+
+async def buscar_dados_especificos(
+    db: Session,
+    background_tasks: BackgroundTasks,
+    ano_min: int,
+    ano_max: int,
+    opcao: str,
+    apos: Optional[CursorKey] = None,
+    limite: Optional[int] = None
+):
+    """
+    Raspa (ou serve do banco) os dados da opção no intervalo de anos.
+
+    Args:
+        apos, limite: Paginação por cursor na ordem (ano, aba, subopcao, id). Anos
+            anteriores ao cursor não são raspados; a leitura de fallback do banco
+            busca só a página.
+    """
+    paginado = apos is not None or limite is not None
     fonte_mensagem = "Falha ao obter dados"
     data_for_response: List[ViticulturaResponse] = []
     mensagem_adicional = None
     current_timestamp = datetime.now(timezone.utc)  # Corrigido: usar datetime.now(timezone.utc) em vez de datetime.utcnow()
+    # A ordem das páginas começa pelo ano: os anos antes do cursor já foram entregues
+    ano_inicial = max(ano_min, apos[0]) if apos is not None else ano_min
          
+    # Plano híbrido: seções atualizadas vêm do banco, só as ausentes ou vencidas são raspadas
+    frescas = await asyncio.to_thread(_secoes_frescas_no_banco, db, ano_inicial, ano_max, opcao)
+    chaves_frescas = {(item.aba, item.subopcao, item.ano) for item in frescas}
+
     try:
-        scraped_data_list = run_scrape_by_params(ano_min, ano_max, opcao)
+        scraped_data_list, anos_proprios, anos_planejados = await _raspar_anos_coalescidos(ano_inicial, ano_max, opcao, chaves_frescas)
+        anos_raspados = {item['ano'] for item in scraped_data_list or [] if item.get('dados')}
+        # Anos com páginas ausentes ou vencidas que a raspagem não trouxe (falha ou página vazia)
+        anos_sem_raspagem = sorted(anos_planejados - anos_raspados)
+        # Atalho só quando o plano não tinha nenhuma página a buscar
+        if frescas and not anos_planejados and not anos_raspados:
+            dados, proximo_cursor = paginate_items(frescas, apos, limite) if paginado else (frescas, None)
+            return ViticulturaListResponse(
+                fonte=f"Cache (Banco de Dados - {opcao}, {ano_min}-{ano_max})",
+                dados=dados,
+                message="Todas as seções solicitadas estão atualizadas no banco de dados; nenhuma página foi raspada.",
+                next_cursor=proximo_cursor
+            )
         if scraped_data_list and any(item.get('dados') for item in scraped_data_list):
             viticultura_create_list: List[ViticulturaCreate] = []
             for item_dict in scraped_data_list:
@@ -160,21 +656,34 @@ def buscar_dados_especificos(db: Session, background_tasks: BackgroundTasks, ano
                 except Exception as e:
                     logger.error(f"Erro ao processar item raspado: {e}")
                     continue
-            for vc_item in viticultura_create_list:
-                data_for_response.append(ViticulturaResponse(
-                    id=None,
-                    ano=vc_item.ano,
-                    aba=vc_item.aba,
-                    subopcao=vc_item.subopcao,
-                    dados=vc_item.dados,
-                    data_raspagem=vc_item.data_raspagem
-                ))
+            data_for_response.extend(_resposta_ao_vivo(vc_item) for vc_item in viticultura_create_list)
             fonte_mensagem = "Embrapa (Raspagem Específica - Salvamento em Andamento)"
-            background_tasks.add_task(_save_data_in_background, viticultura_create_list)
+            # Anos raspados por requisições concorrentes são salvos por elas
+            proprias = [vc for vc in viticultura_create_list if vc.ano in anos_proprios]
+            para_salvar = await asyncio.to_thread(_secoes_para_salvar, db, scraped_data_list, proprias)
+            if para_salvar:
+                await _agendar_salvamento(para_salvar)
+
+            raspadas = {(vc.aba, vc.subopcao, vc.ano) for vc in viticultura_create_list}
+            reaproveitadas = [item for item in frescas if (item.aba, item.subopcao, item.ano) not in raspadas]
+            data_for_response.extend(reaproveitadas)
+            data_for_response.sort(key=lambda item: item.ano)
+            mensagem_banco = f" {len(reaproveitadas)} seções atualizadas servidas do banco." if reaproveitadas else ""
+            if anos_sem_raspagem:
+                mensagem_banco += f" Não foi possível raspar os anos {_formatar_anos(anos_sem_raspagem)}."
+            proximo_cursor = None
+            if paginado:
+                data_for_response, proximo_cursor = paginate_items(data_for_response, apos, limite)
             return ViticulturaListResponse(
                 fonte=fonte_mensagem,
                 dados=data_for_response,
-                message=f"Dados de raspagem ({ano_min}-{ano_max}, {opcao}) retornados. Salvamento no banco de dados iniciado em background."
+                message=f"Dados de raspagem ({ano_min}-{ano_max}, {opcao}) retornados. Salvamento no banco de dados iniciado em background.{mensagem_banco}",
+                next_cursor=proximo_cursor
+            )
+        elif anos_sem_raspagem:
+            mensagem_adicional = (
+                f"Não foi possível raspar os anos {_formatar_anos(anos_sem_raspagem)} (falha ou página sem dados). "
+                "Usando cache do BD se disponível."
             )
         else:
             mensagem_adicional = "Raspagem ao vivo não retornou dados. Usando cache do BD se disponível."
@@ -182,22 +691,17 @@ def buscar_dados_especificos(db: Session, background_tasks: BackgroundTasks, ano
         logger.error(f"Erro na raspagem ao vivo: {e}. Tentando cache do BD.")
         mensagem_adicional = "Erro na raspagem ao vivo. Usando cache do BD se disponível."
 
-    db_data = get_specific_data_from_db(db, ano_min, ano_max, opcao)
+    db_data, proximo_cursor = split_page(
+        await asyncio.to_thread(_dados_especificos_do_banco, db, ano_min, ano_max, opcao, apos=apos, limite=limite), limite
+    )
     if db_data:
-        for db_item in db_data:
-            data_for_response.append(ViticulturaResponse(
-                id=db_item.id,
-                ano=db_item.ano,
-                aba=db_item.aba,
-                subopcao=db_item.subopcao,
-                dados=db_item.dados_list_json,
-                data_raspagem=db_item.data_raspagem
-            ))
+        data_for_response.extend(db_data)
         fonte_mensagem = f"Cache (Banco de Dados - {opcao}, {ano_min}-{ano_max})"
         return ViticulturaListResponse(
             fonte=fonte_mensagem,
             dados=data_for_response,
-            message=mensagem_adicional or "Dados servidos do cache do banco de dados."
+            message=mensagem_adicional or "Dados servidos do cache do banco de dados.",
+            next_cursor=proximo_cursor
         )
     else:
         fonte_mensagem = "Falha - Cache do BD Vazio"
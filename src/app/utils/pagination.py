@@ -0,0 +1,61 @@
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+from src.app.scraper.utils import normalize_suboption_key
+
+# Chave de ordenação estável das seções: (ano, aba, subopcao_key, id)
+CursorKey = Tuple[int, str, str, int]
+
+def cursor_key(item: Any) -> CursorKey:
+    """Chave de ordenação de uma seção (modelo do banco ou resposta); subopção normalizada como em subopcao_key, id ausente vira 0"""
+    return (item.ano, item.aba, normalize_suboption_key(item.subopcao), item.id or 0)
+
+def encode_cursor(item: Any) -> str:
+    """Cursor opaco que aponta para depois da seção informada"""
+    raw = json.dumps(list(cursor_key(item)), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> CursorKey:
+    """
+    Decodifica um cursor gerado por encode_cursor.
+
+    Raises:
+        ValueError: Se o cursor for inválido
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ano, aba, subopcao, item_id = json.loads(raw)
+        if not (isinstance(ano, int) and isinstance(aba, str) and isinstance(subopcao, str) and isinstance(item_id, int)):
+            raise ValueError
+        return ano, aba, subopcao, item_id
+    except (ValueError, TypeError):
+        raise ValueError("Cursor de paginação inválido")
+
+def paginate_items(items: Sequence[Any], after: Optional[CursorKey], limit: Optional[int]) -> Tuple[List[Any], Optional[str]]:
+    """
+    Pagina em memória, com a mesma ordem e os mesmos cursores das consultas
+    paginadas do repositório (usado para resultados de raspagem ao vivo).
+
+    Returns:
+        (página, próximo cursor) - próximo cursor é None na última página
+    """
+    ordered = sorted(items, key=cursor_key)
+    if after is not None:
+        ordered = [item for item in ordered if cursor_key(item) > after]
+    if limit is None or len(ordered) <= limit:
+        return ordered, None
+    page = ordered[:limit]
+    return page, encode_cursor(page[-1])
+
+def split_page(rows: List[Any], limit: Optional[int]) -> Tuple[List[Any], Optional[str]]:
+    """
+    Separa a página das linhas lidas com limit + 1 (a linha extra indica que há próxima página).
+
+    Returns:
+        (página, próximo cursor)
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1])
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from src.app.config.settings import settings
+
+# Versão dos dados de viticultura: incrementada a cada gravação (save_bulk)
+_data_version = 0
+_data_version_lock = threading.Lock()
+
+def get_data_version() -> int:
+    return _data_version
+
+def bump_data_version() -> int:
+    """Invalida todos os resultados em cache; chamado após cada gravação confirmada"""
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+        return _data_version
+
+class QueryCache:
+    """
+    Cache LRU com TTL de resultados de consultas, já convertidos para o formato
+    de resposta.
+
+    Cada entrada guarda a versão dos dados em que foi carregada; uma gravação
+    (bump_data_version) invalida todas de uma vez. O TTL limita a defasagem
+    quando a gravação acontece em outro processo (outro worker do gunicorn).
+    Os valores são compartilhados entre requisições e não devem ser alterados.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Retorna o resultado em cache da chave, ou executa `loader` e o armazena.
+
+        Args:
+            key: Nome da consulta e parâmetros normalizados
+            loader: Executa a consulta (fora do lock)
+
+        Returns:
+            Resultado da consulta
+        """
+        if self.max_entries <= 0:
+            return loader()
+
+        version = get_data_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        value = loader()
+
+        with self._lock:
+            # Versão capturada antes da consulta: uma gravação concorrente invalida este resultado
+            self._entries[key] = (version, time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+_query_cache: Optional[QueryCache] = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache() -> QueryCache:
+    """Retorna o cache de consultas do processo"""
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryCache(settings.QUERY_CACHE_MAX_ENTRIES, settings.QUERY_CACHE_TTL_SECONDS)
+        return _query_cache
@@ -0,0 +1,55 @@
+import asyncio
+from typing import Any, Dict, Hashable, Iterable, List, Tuple
+
+
+class AsyncSingleFlight:
+    """
+    Coalescência de trabalhos idênticos em andamento (padrão "singleflight").
+
+    O primeiro chamador que reivindica uma chave fica responsável por
+    executá-la e publicar o resultado; chamadores concorrentes com a mesma
+    chave recebem o mesmo future e aguardam esse resultado em vez de repetir
+    o trabalho. A chave é liberada assim que o resultado é publicado.
+
+    Deve ser usado dentro de um único event loop (um por worker do gunicorn).
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+
+    def claim(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, asyncio.Future], List[Hashable]]:
+        """
+        Reivindica as chaves informadas.
+
+        Returns:
+            (futures, próprias) - future de cada chave e a lista das chaves que
+            o chamador deve executar (as demais já estão em andamento)
+        """
+        loop = asyncio.get_running_loop()
+        futures: Dict[Hashable, asyncio.Future] = {}
+        owned: List[Hashable] = []
+        for key in keys:
+            future = self._flights.get(key)
+            if future is None:
+                future = loop.create_future()
+                # Evita o aviso "exception was never retrieved" quando ninguém mais aguarda
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._flights[key] = future
+                owned.append(key)
+            futures[key] = future
+        return futures, owned
+
+    def resolve(self, key: Hashable, value: Any) -> None:
+        """Publica o resultado de uma chave própria e a libera"""
+        future = self._flights.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def reject(self, key: Hashable, error: BaseException) -> None:
+        """Publica a falha de uma chave própria e a libera"""
+        future = self._flights.pop(key, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    def in_flight(self) -> int:
+        return len(self._flights)
@@ -1,9 +1,16 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from src.app.web.routes import router as main_router
 from src.app.web.routes_auth import router as auth_router
 from src.app.config.database import Base, engine
 from src.app.models.user import User
-from src.app.models.viticulture import Viticultura
+from src.app.models.viticulture import Viticultura, ViticulturaAtual, ViticulturaConteudo, ViticulturaFato
+from src.app.models.schema_migracao import SchemaMigracao
+from src.app.models.scrape_job import ScrapeJob
+from src.app.service.persistence_writer import persistence_writer
+from src.app.service.retention_service import executar_retencao_periodicamente
+from src.app.config.settings import settings
 import logging
 
 logging.basicConfig(
@@ -11,9 +18,22 @@ logging.basicConfig(
     format="%(asctime)s %(levelname)s %(name)s %(message)s"
 )
 
+# Só cria as tabelas ausentes; colunas novas, backfills e reconstruções ficam na etapa
+# de migração, executada uma vez antes dos workers (python -m src.app.service.migration_service)
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Vitivinicultura API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    retencao = None
+    if settings.RETENTION_INTERVAL_SECONDS > 0:
+        retencao = asyncio.create_task(executar_retencao_periodicamente(settings.RETENTION_INTERVAL_SECONDS))
+    yield
+    if retencao is not None:
+        retencao.cancel()
+    # Grava os salvamentos ainda na fila antes de encerrar o processo
+    await asyncio.to_thread(persistence_writer.shutdown)
+
+app = FastAPI(title="Vitivinicultura API", lifespan=lifespan)
 
 app.include_router(main_router, prefix="/api")
 app.include_router(auth_router, prefix="/auth")
\ No newline at end of file
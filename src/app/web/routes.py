@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException, status, Depends, BackgroundTasks
+import asyncio
+from fastapi import APIRouter, HTTPException, status, Depends, BackgroundTasks, Request, Response
 from sqlalchemy.orm import Session 
-from typing import List, Dict # <--- Adicionar Dict
-from src.app.service.viticulture_service import obter_dados_viticultura_e_salvar
+from typing import List, Dict, Optional # <--- Adicionar Dict
+from src.app.service.viticulture_service import obter_dados_viticultura_e_salvar, MODO_COMPLETO, MODO_DELTA
 from src.app.domain.viticulture import ViticulturaListResponse 
 from src.app.config.database import get_db 
 from src.app.auth.dependencies import get_current_user 
@@ -9,6 +10,11 @@ from src.app.domain.viticulture import DadosEspecificosRequest
 from src.app.service.viticulture_service import buscar_dados_especificos
 from src.app.domain.prediction import PredictionRequest, PredictionResponse
 from src.app.service.prediction_service import prediction_service
+from src.app.service.scrape_job_service import scrape_job_service, ScrapeJobQueueFullError
+from src.app.service.snapshot_service import obter_snapshot
+from src.app.domain.scrape_job import ScrapeJobResponse, JOB_STATUS_ATIVOS
+from src.app.config.settings import settings
+from src.app.utils.pagination import CursorKey, decode_cursor
 
 
 # from src.app.domain.user import User # <--- REMOVER OU COMENTAR ESTA LINHA
@@ -17,6 +23,17 @@ from fastapi import Query
 logger = logging.getLogger(__name__)
 
 
+def _resolver_paginacao(cursor: Optional[str], offset: int) -> Optional[CursorKey]:
+    """Decodifica o cursor de paginação; cursor e offset não podem ser combinados"""
+    if cursor is None:
+        return None
+    if offset:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use cursor ou offset, não ambos.")
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 router = APIRouter(
     prefix="/viticultura",
     tags=["Viticultura"],
@@ -35,8 +52,12 @@ router = APIRouter(
                 "imediatamente e inicia o salvamento no banco de dados em background. \n"
                 "Se a raspagem ao vivo falhar, serve os últimos dados do cache do banco de dados. \n"
                 "Se ambos falharem, retorna um erro. Requer token JWT válido.\n"
-                "Parâmetros de paginação: offset (número de registros a pular) e limit (número máximo de registros a retornar).\n"
-                "O parâmetro offset deve ser >= 0 e limit deve ser >= 1. "
+                "Paginação: limit (tamanho da página) e cursor (valor de next_cursor da página anterior), "
+                "na ordem (ano, aba, subopcao, id); leituras do banco buscam só a página pedida. "
+                "offset (número de registros a pular) continua aceito, mas pagina a resposta completa.\n"
+                "O parâmetro offset deve ser >= 0 e limit deve ser >= 1. \n"
+                "Parâmetro modo: 'full' (padrão) raspa tudo; 'delta' raspa apenas o que falta no banco "
+                "e os anos recentes, completando a resposta com as seções já armazenadas."
             )
            )
 async def get_viticulture_data_and_save(
@@ -44,13 +65,22 @@ async def get_viticulture_data_and_save(
     background_tasks: BackgroundTasks = BackgroundTasks(),
     current_user: Dict = Depends(get_current_user),
     offset: int = Query(default=0, ge=0, description="Número de registros a pular para paginação"),
-    limit: int = Query(default=None, ge=1, description="Número máximo de registros a retornar")
+    limit: int = Query(default=None, ge=1, description="Número máximo de registros a retornar"),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (next_cursor da resposta anterior)"),
+    modo: str = Query(
+        default=MODO_COMPLETO, pattern=f"^({MODO_COMPLETO}|{MODO_DELTA})$",
+        description="'full' raspa todas as páginas; 'delta' raspa apenas anos/subopções novos e anos recentes"
+    )
 ):
     username = current_user.get("sub", "Usuário Desconhecido")
-    logger.info(f">>>> ROTA /viticultura/dados CHAMADA pelo usuário: {username} <<<<")
+    logger.info(f">>>> ROTA /viticultura/dados CHAMADA pelo usuário: {username} (modo={modo}) <<<<")
+    apos = _resolver_paginacao(cursor, offset)
+    # offset > 0: paginação legada, sobre a resposta completa
+    por_cursor = not offset
     try:
-        resultado: ViticulturaListResponse = obter_dados_viticultura_e_salvar(
-            db=db, background_tasks=background_tasks 
+        resultado: ViticulturaListResponse = await obter_dados_viticultura_e_salvar(
+            db=db, background_tasks=background_tasks, modo=modo,
+            apos=apos, limite=limit if por_cursor else None
         ) 
         
         if not resultado.dados and "Falha" in resultado.fonte:
@@ -63,8 +93,8 @@ async def get_viticulture_data_and_save(
                 detail=resultado.message or "Não foi possível obter os dados da Embrapa nem do cache do banco de dados."
             )
         
-        # Paginação dos dados
-        if resultado.dados is not None and (offset >= 0 or limit is not None):
+        # Paginação legada por offset
+        if resultado.dados is not None and not por_cursor:
             dados_paginados = resultado.dados[offset: offset + limit if limit is not None else None]
             resultado.dados = dados_paginados
 
@@ -79,6 +109,52 @@ async def get_viticulture_data_and_save(
             detail=f"Erro interno do servidor ao processar a solicitação. Detalhe: {str(e)}"
         )
     
+@router.get(
+    "/dados/snapshot",
+    response_model=ViticulturaListResponse,
+    summary="Baixa a versão mais recente de todas as seções armazenadas (Requer Autenticação)",
+    description=(
+        "Retorna o conjunto de dados mais recente do banco (sem raspagem), já serializado e "
+        "comprimido uma vez por versão dos dados. Respeita Accept-Encoding (br, gzip) e "
+        "If-None-Match: se a ETag não mudou, responde 304 sem corpo. \n"
+        "Retorna 503 se o banco estiver vazio."
+    )
+)
+async def baixar_snapshot(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    username = current_user.get("sub", "Usuário Desconhecido")
+    logger.info(f">>>> ROTA /viticultura/dados/snapshot CHAMADA pelo usuário: {username} <<<<")
+    try:
+        snapshot = await asyncio.to_thread(obter_snapshot, db)
+    except Exception as e:
+        logger.error(f"Erro ao montar snapshot dos dados: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro interno do servidor ao processar a solicitação. Detalhe: {str(e)}"
+        )
+    if snapshot is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Nenhum dado armazenado no banco de dados. Enfileire uma raspagem em /viticultura/jobs."
+        )
+
+    headers = {
+        "ETag": snapshot.etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "private, no-cache"
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if snapshot.etag in {tag.strip() for tag in if_none_match.split(",")} or if_none_match.strip() == "*":
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    corpo, encoding = snapshot.encode_for(request.headers.get("accept-encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=corpo, media_type="application/json", headers=headers)
+
 @router.post(
     "/dados-especificos",
     response_model=ViticulturaListResponse,
@@ -88,7 +164,9 @@ async def get_viticulture_data_and_save(
         "Tenta raspagem ao vivo da Embrapa; se falhar, retorna dados do cache do banco de dados. \n"
         "O salvamento dos dados raspados ocorre em background. Requer token JWT válido.\n"
         "Opções disponíveis: 'producao', 'processamento', 'comercializacao', 'importacao', 'exportacao'\n"
-        "Parâmetros de paginação: offset (número de registros a pular) e limit (número máximo de registros a retornar).\n"
+        "Paginação: limit (tamanho da página) e cursor (valor de next_cursor da página anterior), "
+        "na ordem (ano, aba, subopcao, id); anos anteriores ao cursor não são raspados de novo. "
+        "offset (número de registros a pular) continua aceito, mas pagina a resposta completa.\n"
         "O parâmetro offset deve ser >= 0 e limit deve ser >= 1. "
     )
 )
@@ -98,20 +176,26 @@ async def obter_dados_especificos(
     background_tasks: BackgroundTasks = BackgroundTasks(),
     current_user: Dict = Depends(get_current_user),
     offset: int = Query(default=0, ge=0, description="Número de registros a pular para paginação"),
-    limit: int = Query(default=None, ge=1, description="Número máximo de registros a retornar")
+    limit: int = Query(default=None, ge=1, description="Número máximo de registros a retornar"),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (next_cursor da resposta anterior)")
 ):
     username = current_user.get("sub", "Usuário Desconhecido")
     logger.info(
         f">>>> ROTA /viticultura/dados-especificos CHAMADA pelo usuário: {username} "
         f"com parâmetros: ano_min={request.ano_min}, ano_max={request.ano_max}, opcao={request.opcao}, offset={offset}, limit={limit} <<<<"
     )
+    apos = _resolver_paginacao(cursor, offset)
+    # offset > 0: paginação legada, sobre a resposta completa
+    por_cursor = not offset
     try:
-        resultado: ViticulturaListResponse = buscar_dados_especificos(
+        resultado: ViticulturaListResponse = await buscar_dados_especificos(
             db=db,
             background_tasks=background_tasks,
             ano_min=request.ano_min,
             ano_max=request.ano_max,
-            opcao=request.opcao
+            opcao=request.opcao,
+            apos=apos,
+            limite=limit if por_cursor else None
         )
 
         if not resultado.dados and "Falha" in resultado.fonte:
@@ -130,8 +214,8 @@ async def obter_dados_especificos(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Nenhum dado encontrado para os parâmetros fornecidos."
             )
-        # Paginação dos dados
-        if resultado.dados is not None and (offset >= 0 or limit is not None):
+        # Paginação legada por offset
+        if resultado.dados is not None and not por_cursor:
             resultado.dados = resultado.dados[offset: offset + limit if limit is not None else None]
 
         return resultado
@@ -146,6 +230,57 @@ async def obter_dados_especificos(
         )
         
 
+@router.post(
+    "/jobs",
+    response_model=ScrapeJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Enfileira uma atualização dos dados da Embrapa (Requer Autenticação)",
+    description=(
+        "Cria um job de raspagem em background e retorna 202 Accepted com o id do job, "
+        "a ser consultado em GET /viticultura/jobs/{id}. Se já houver um job ativo para o mesmo modo, "
+        "ele é reaproveitado. \n"
+        "Parâmetro aguardar: segundos para esperar a conclusão antes de responder (200 se concluir). \n"
+        "Retorna 429 se a fila de jobs estiver cheia."
+    )
+)
+async def criar_job_raspagem(
+    response: Response,
+    current_user: Dict = Depends(get_current_user),
+    modo: str = Query(
+        default=MODO_COMPLETO, pattern=f"^({MODO_COMPLETO}|{MODO_DELTA})$",
+        description="'full' raspa todas as páginas; 'delta' raspa apenas anos/subopções novos e anos recentes"
+    ),
+    aguardar: float = Query(
+        default=0, ge=0, le=settings.SCRAPE_JOB_MAX_WAIT_SECONDS,
+        description="Segundos para aguardar a conclusão do job"
+    )
+):
+    username = current_user.get("sub", "Usuário Desconhecido")
+    logger.info(f">>>> ROTA /viticultura/jobs CHAMADA pelo usuário: {username} (modo={modo}, aguardar={aguardar}) <<<<")
+    try:
+        job, _ = await asyncio.to_thread(scrape_job_service.submit, modo)
+    except ScrapeJobQueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+    if aguardar:
+        job = await scrape_job_service.wait(job.id, aguardar) or job
+
+    response.headers["Location"] = f"/api/viticultura/jobs/{job.id}"
+    if job.status not in JOB_STATUS_ATIVOS:
+        response.status_code = status.HTTP_200_OK
+    return job
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=ScrapeJobResponse,
+    summary="Consulta o estado e o progresso de um job de raspagem (Requer Autenticação)"
+)
+async def obter_job_raspagem(job_id: int, current_user: Dict = Depends(get_current_user)):
+    job = await asyncio.to_thread(scrape_job_service.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} não encontrado")
+    return job
+
 @router.post("/predict", 
              response_model=PredictionResponse,
              summary="Realiza previsão de quantidade total para o ano seguinte, conforme a opção escolhida"
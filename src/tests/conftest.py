@@ -2,8 +2,44 @@ from fastapi.testclient import TestClient
 from src.app.web.main import app # Changed from 'your_application'
 
 import pytest
+from unittest.mock import patch
 
 @pytest.fixture
 def client():
     with TestClient(app) as c:
-        yield c
\ No newline at end of file
+        yield c
+
+@pytest.fixture(autouse=True)
+def clear_query_cache():
+    # Os testes trocam o retorno do repositório via mock; resultados em cache não podem vazar entre eles
+    from src.app.utils.query_cache import get_query_cache
+    get_query_cache().clear()
+    yield
+    get_query_cache().clear()
+
+@pytest.fixture(autouse=True)
+def isolated_metadata_cache():
+    # Seções vazias registradas por um teste não podem mudar o plano delta de outro (nem ir para .cache/)
+    from src.app.scraper import metadata_cache
+    with patch.object(metadata_cache, "_metadata_cache", metadata_cache.MetadataCache(None, 60)):
+        yield
+
+@pytest.fixture
+def isolated_scrape_jobs(tmp_path):
+    # Raspagens ao vivo rodam como job: banco de jobs próprio, em memória, e diários em diretório temporário
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from src.app.config.database import Base
+    from src.app.models.scrape_job import ScrapeJob
+    from src.app.scraper.config import SCRAPING_CONFIG
+    from src.app.service import scrape_job_service
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[ScrapeJob.__table__])
+    service = scrape_job_service.ScrapeJobService(session_factory=sessionmaker(bind=engine, autocommit=False, autoflush=False))
+    with patch.object(scrape_job_service, "scrape_job_service", service), \
+         patch.object(SCRAPING_CONFIG, "CHECKPOINT_DIR", str(tmp_path / "checkpoints")):
+        yield service
+    service.shutdown(wait=True)
+    engine.dispose()
@@ -1,19 +1,20 @@
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
-from datetime import datetime
+from concurrent.futures import Future
+from datetime import datetime, timezone
 from src.app.web.main import app
 from src.app.auth.dependencies import get_current_user
-from src.app.models.viticulture import Viticultura as ViticulturaModel
+from src.app.models.viticulture import Viticultura as ViticulturaModel, ViticulturaAtual
 from src.app.config.database import SessionLocal, Base, engine
-from src.app.service.viticulture_service import _save_data_in_background
+from src.app.service.persistence_writer import persistence_writer
 from src.app.domain.viticulture import ViticulturaCreate
 
 # Paths to the functions that will be mocked
-PATH_RUN_FULL_SCRAPE = "src.app.service.viticulture_service.run_full_scrape"
+PATH_ITER_FULL_SCRAPE = "src.app.service.viticulture_service.iter_full_scrape_async"
 PATH_GET_LATEST_SCRAPE_GROUP = "src.app.service.viticulture_service.get_latest_scrape_group"
-PATH_BACKGROUND_TASKS_ADD_TASK = "fastapi.BackgroundTasks.add_task"
-PATH_RUN_SCRAPE_BY_PARAMS = "src.app.service.viticulture_service.run_scrape_by_params"
+PATH_PERSISTENCE_WRITER = "src.app.service.viticulture_service.persistence_writer"
+PATH_RUN_SCRAPE_BY_PARAMS = "src.app.service.viticulture_service.run_scrape_by_params_async"
 PATH_GET_SPECIFIC_DATA_FROM_DB = "src.app.service.viticulture_service.get_specific_data_from_db"
 
 MOCK_USER_PAYLOAD = {"sub": "testuser", "username": "testuser"}
@@ -42,33 +43,51 @@ MOCK_CACHE_DATA_FROM_DB = [
 def setup_test_database_for_data_api():
     Base.metadata.create_all(bind=engine)
     yield
+    persistence_writer.flush(timeout=5)  # Salvamentos enfileirados pelo teste terminam antes de apagar as tabelas
     Base.metadata.drop_all(bind=engine)
 
+def _gravar_secoes(secoes):
+    """Grava pelo gravador do processo e aguarda a confirmação"""
+    persistence_writer.submit(secoes).result(timeout=5)
+
+def _stream(secoes):
+    """Substituto de iter_full_scrape_async que entrega as seções informadas"""
+    async def fake(stored_sections=None, journal=None, on_plan=None):
+        for secao in secoes:
+            yield secao
+    return fake
+
+def _gravado(lote):
+    future = Future()
+    future.set_result(len(lote))
+    return future
+
 def mock_get_current_user_override():
     return MOCK_USER_PAYLOAD
 
 def test_get_data_live_scrape_success_triggers_background_save(client: TestClient):
     app.dependency_overrides[get_current_user] = mock_get_current_user_override
     
-    current_time_scrape = datetime.utcnow()
+    current_time_scrape = datetime.now(timezone.utc)
     mock_live_scraped_data = [
         {"ano": 2024, "aba": "Produção Ao Vivo", "subopcao": "Vinhos Especiais", "dados": [{"produto": "Espumante", "quantidade": 500}]},
         {"ano": 2024, "aba": "Exportação Ao Vivo", "subopcao": None, "dados": [{"pais": "EUA", "valor": 10000}]}
     ]
 
     with patch("src.app.service.viticulture_service.datetime") as mock_datetime_service, \
-         patch(PATH_RUN_FULL_SCRAPE) as mock_run_scrape, \
-         patch(PATH_BACKGROUND_TASKS_ADD_TASK) as mock_add_task:
+         patch(PATH_ITER_FULL_SCRAPE) as mock_run_scrape, \
+         patch(PATH_PERSISTENCE_WRITER) as mock_writer:
 
-        mock_datetime_service.utcnow.return_value = current_time_scrape
-        mock_run_scrape.return_value = mock_live_scraped_data
+        mock_datetime_service.now.return_value = current_time_scrape  # O serviço usa datetime.now(timezone.utc)
+        mock_run_scrape.side_effect = _stream(mock_live_scraped_data)
+        mock_writer.submit.side_effect = _gravado
 
         response = client.get("/api/viticultura/dados")
 
         assert response.status_code == 200
         response_data = response.json()
 
-        assert "Embrapa (Raspagem Ao Vivo - Salvamento em Andamento)" in response_data["fonte"]
+        assert "Embrapa (Raspagem Ao Vivo - Dados Salvos)" in response_data["fonte"]
         assert f"Dados de raspagem ao vivo ({current_time_scrape.isoformat()}) retornados." in response_data["message"]
         assert len(response_data["dados"]) == len(mock_live_scraped_data)
         
@@ -77,15 +96,13 @@ def test_get_data_live_scrape_success_triggers_background_save(client: TestClien
             assert item_resp["aba"] == mock_live_scraped_data[i]["aba"]
             assert item_resp["subopcao"] == mock_live_scraped_data[i].get("subopcao")
             assert item_resp["dados"] == mock_live_scraped_data[i]["dados"]
-            assert item_resp["data_raspagem"] == current_time_scrape.isoformat()
+            assert datetime.fromisoformat(item_resp["data_raspagem"]) == current_time_scrape
             assert item_resp["id"] is None
 
-        mock_add_task.assert_called_once()
-        args_call_add_task, _ = mock_add_task.call_args
+        mock_writer.submit.assert_called_once()
+        args_call_submit, _ = mock_writer.submit.call_args
         
-        assert args_call_add_task[0] == _save_data_in_background
-        
-        data_passed_to_bg = args_call_add_task[1]
+        data_passed_to_bg = args_call_submit[0]
         assert len(data_passed_to_bg) == len(mock_live_scraped_data)
         for i, vc_item in enumerate(data_passed_to_bg):
             assert isinstance(vc_item, ViticulturaCreate)
@@ -100,10 +117,10 @@ def test_get_data_live_scrape_success_triggers_background_save(client: TestClien
 def test_get_data_from_cache_when_scrape_fails(client: TestClient):
     app.dependency_overrides[get_current_user] = mock_get_current_user_override
 
-    with patch(PATH_RUN_FULL_SCRAPE) as mock_scrape, \
+    with patch(PATH_ITER_FULL_SCRAPE) as mock_scrape, \
          patch(PATH_GET_LATEST_SCRAPE_GROUP) as mock_get_cache:
 
-        mock_scrape.return_value = [] 
+        mock_scrape.side_effect = _stream([]) 
         mock_get_cache.return_value = MOCK_CACHE_DATA_FROM_DB
 
         response = client.get("/api/viticultura/dados")
@@ -135,10 +152,10 @@ def test_get_data_from_cache_when_scrape_fails(client: TestClient):
 def test_get_data_fails_when_scrape_and_cache_fail(client: TestClient):
     app.dependency_overrides[get_current_user] = mock_get_current_user_override
 
-    with patch(PATH_RUN_FULL_SCRAPE) as mock_scrape, \
+    with patch(PATH_ITER_FULL_SCRAPE) as mock_scrape, \
          patch(PATH_GET_LATEST_SCRAPE_GROUP) as mock_get_cache:
 
-        mock_scrape.return_value = []
+        mock_scrape.side_effect = _stream([])
         mock_get_cache.return_value = []
 
         response = client.get("/api/viticultura/dados")
@@ -178,8 +195,8 @@ def test_get_data_from_real_db_when_scrape_fails(client: TestClient):
         db_session_for_setup.commit()
         inserted_ids = [item.id for item in real_db_data_to_insert]
 
-        with patch(PATH_RUN_FULL_SCRAPE) as mock_scrape:
-            mock_scrape.return_value = []
+        with patch(PATH_ITER_FULL_SCRAPE) as mock_scrape:
+            mock_scrape.side_effect = _stream([])
 
             response = client.get("/api/viticultura/dados")
 
@@ -207,6 +224,10 @@ def test_get_data_from_real_db_when_scrape_fails(client: TestClient):
 
     finally:
         if inserted_ids:
+            # Ponteiros de seção atual primeiro: com foreign_keys=ON a versão apontada não pode ser removida
+            db_session_for_setup.query(ViticulturaAtual).filter(
+                ViticulturaAtual.viticultura_id.in_(inserted_ids)
+            ).delete(synchronize_session=False)
             for item_id in inserted_ids:
                 item_to_delete = db_session_for_setup.get(ViticulturaModel, item_id)
                 if item_to_delete:
@@ -231,7 +252,7 @@ def test_post_dados_especificos_success(client: TestClient):
     ]
 
     with patch(PATH_RUN_SCRAPE_BY_PARAMS) as mock_scrape_by_params, \
-         patch(PATH_BACKGROUND_TASKS_ADD_TASK) as mock_add_task:
+         patch(PATH_PERSISTENCE_WRITER) as mock_writer:
         mock_scrape_by_params.return_value = mock_scraped_data
 
         request_payload = {
@@ -316,4 +337,127 @@ def test_post_dados_especificos_fail(client: TestClient):
         data = response.json()
         assert "detail" in data
 
-    del app.dependency_overrides[get_current_user]
\ No newline at end of file
+    del app.dependency_overrides[get_current_user]
+def test_post_jobs_returns_202_and_status_can_be_polled(client: TestClient):
+    """
+    Testa o endpoint /api/viticultura/jobs: o job é enfileirado (202 + Location)
+    e o progresso pode ser consultado em /api/viticultura/jobs/{id}.
+    """
+    app.dependency_overrides[get_current_user] = mock_get_current_user_override
+
+    async def fake_scrape(modo, progresso=None, **kwargs):
+        progresso(paginas_total=3)
+        progresso(secoes_processadas=3, secoes_salvas=2)
+        return 2
+
+    with patch("src.app.service.scrape_job_service.salvar_raspagem_em_streaming", side_effect=fake_scrape):
+        response = client.post("/api/viticultura/jobs?modo=delta", headers={"Authorization": "Bearer fake_token"})
+        assert response.status_code == 202
+        job = response.json()
+        assert job["tipo"] == "delta"
+        assert response.headers["Location"] == f"/api/viticultura/jobs/{job['id']}"
+
+        waited = client.post("/api/viticultura/jobs?modo=delta&aguardar=5", headers={"Authorization": "Bearer fake_token"})
+        status_response = client.get(f"/api/viticultura/jobs/{job['id']}", headers={"Authorization": "Bearer fake_token"})
+
+    assert status_response.status_code == 200
+    assert status_response.json()["status"] == "succeeded"
+    assert status_response.json()["secoes_salvas"] == 2
+    assert waited.status_code in (200, 202)
+
+    missing = client.get("/api/viticultura/jobs/999999", headers={"Authorization": "Bearer fake_token"})
+    assert missing.status_code == 404
+
+    del app.dependency_overrides[get_current_user]
+
+def test_get_snapshot_serves_compressed_bytes_with_etag(client: TestClient):
+    """
+    Testa o endpoint /api/viticultura/dados/snapshot: corpo gzip pré-comprimido,
+    ETag estável e 304 quando o cliente já tem a versão atual.
+    """
+    app.dependency_overrides[get_current_user] = mock_get_current_user_override
+
+    vazio = client.get("/api/viticultura/dados/snapshot")
+    assert vazio.status_code == 503
+
+    _gravar_secoes([
+        ViticulturaCreate(ano=2022, aba="producao", subopcao=None, dados=[{"produto": "Tinto", "quantidade": 10}], data_raspagem=datetime(2024, 1, 1)),
+        ViticulturaCreate(ano=2023, aba="producao", subopcao=None, dados=[{"produto": "Tinto", "quantidade": 12}], data_raspagem=datetime(2024, 1, 1)),
+    ])
+
+    response = client.get("/api/viticultura/dados/snapshot", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert [item["ano"] for item in response.json()["dados"]] == [2022, 2023]
+
+    etag = response.headers["etag"]
+    not_modified = client.get("/api/viticultura/dados/snapshot", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    _gravar_secoes([
+        ViticulturaCreate(ano=2023, aba="producao", subopcao=None, dados=[{"produto": "Tinto", "quantidade": 13}], data_raspagem=datetime(2024, 2, 1)),
+    ])
+    updated = client.get("/api/viticultura/dados/snapshot", headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert updated.status_code == 200
+    assert "content-encoding" not in updated.headers
+    assert updated.headers["etag"] != etag
+    assert updated.json()["dados"][1]["dados"][0]["quantidade"] == 13
+
+    del app.dependency_overrides[get_current_user]
+
+def test_get_dados_keyset_pagination_reads_one_page_from_database(client: TestClient):
+    """
+    Testa a paginação por cursor de /api/viticultura/dados no modo stale-while-revalidate:
+    cada página vem de uma consulta limitada e next_cursor percorre todas as seções.
+    """
+    from src.app.service import viticulture_service
+    app.dependency_overrides[get_current_user] = mock_get_current_user_override
+
+    _gravar_secoes([
+        ViticulturaCreate(ano=ano, aba="producao", subopcao=subopcao, dados=[{"produto": "Tinto"}], data_raspagem=datetime.utcnow())
+        for ano in (2021, 2022) for subopcao in (None, "vinho")
+    ])
+
+    with patch.object(viticulture_service.settings, "VITICULTURA_SERVE_MODE", "swr"), \
+         patch(PATH_ITER_FULL_SCRAPE) as mock_run_scrape:
+        paginas, cursor = [], None
+        while True:
+            url = "/api/viticultura/dados?limit=3" + (f"&cursor={cursor}" if cursor else "")
+            response = client.get(url)
+            assert response.status_code == 200
+            body = response.json()
+            paginas.append([(item["ano"], item["subopcao"]) for item in body["dados"]])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+
+        invalid = client.get("/api/viticultura/dados?limit=3&cursor=nao-e-um-cursor")
+
+    mock_run_scrape.assert_not_called()
+    assert paginas == [[(2021, None), (2021, "vinho"), (2022, None)], [(2022, "vinho")]]
+    assert invalid.status_code == 400
+
+    del app.dependency_overrides[get_current_user]
+
+def test_post_dados_especificos_cursor_pagination_on_database_fallback(client: TestClient):
+    app.dependency_overrides[get_current_user] = mock_get_current_user_override
+
+    _gravar_secoes([
+        ViticulturaCreate(ano=ano, aba="producao", subopcao=None, dados=[{"produto": "Tinto"}], data_raspagem=datetime(2020, 1, 1))
+        for ano in (2020, 2021, 2022)
+    ])
+    payload = {"ano_min": 2020, "ano_max": 2022, "opcao": "producao"}
+
+    with patch(PATH_RUN_SCRAPE_BY_PARAMS, return_value=[]) as mock_scrape:
+        first = client.post("/api/viticultura/dados-especificos?limit=2", json=payload).json()
+        second = client.post(f"/api/viticultura/dados-especificos?limit=2&cursor={first['next_cursor']}", json=payload).json()
+
+    assert [item["ano"] for item in first["dados"]] == [2020, 2021]
+    assert [item["ano"] for item in second["dados"]] == [2022]
+    assert second["next_cursor"] is None
+    # A segunda página não raspa de novo os anos já entregues
+    assert mock_scrape.call_args_list[-1].args[:2] == (2021, 2022)
+
+    del app.dependency_overrides[get_current_user]
@@ -0,0 +1,166 @@
+import httpx
+import pytest
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
+from src.app.scraper.async_scraper import AsyncFullScraper, AsyncPartialScraper
+from src.app.scraper.metadata_cache import MetadataCache
+from src.app.scraper.page_cache import PageCache
+from src.app.scraper.rate_limiter import TokenBucketRateLimiter
+
+PAGE_TEMPLATE = """
+<html><body>
+<button name="opcao" value="opt_02">Produção</button>
+<p class="text_center">Produção de vinhos, sucos e derivados [{ano}]</p>
+<label class="lbl_pesq">Ano: [2020-2022]</label>
+<table class="tb_base tb_dados">
+  <thead><tr><th>Produto</th><th>Quantidade (L.)</th></tr></thead>
+  <tbody>
+    <tr><td class="tb_item">VINHO DE MESA</td><td class="tb_item">1.000</td></tr>
+    <tr><td class="tb_subitem">Tinto</td><td class="tb_subitem">{ano}</td></tr>
+  </tbody>
+  <tfoot><tr><td>Total</td><td>1.000</td></tr></tfoot>
+</table>
+</body></html>
+"""
+
+def _make_client(requested_urls):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested_urls.append(str(request.url))
+        ano = parse_qs(urlsplit(str(request.url)).query)["ano"][0]
+        return httpx.Response(200, content=PAGE_TEMPLATE.format(ano=ano).encode("utf-8"))
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+@pytest.mark.asyncio
+async def test_async_partial_scraper_scrapes_requested_years(tmp_path):
+    requested_urls = []
+    async with _make_client(requested_urls) as client:
+        scraper = AsyncPartialScraper(client=client)
+        scraper.page_cache = PageCache(str(tmp_path / "pages"))
+        scraper.metadata_cache = MetadataCache(str(tmp_path / "metadata"), ttl_seconds=60)
+        scraper.rate_limiter = TokenBucketRateLimiter(rate=1000, burst=10)
+        result = await scraper.scrape_by_params(2021, 2022, "producao")
+
+    assert [item["ano"] for item in result] == [2021, 2022]
+    assert result[0]["aba"] == "producao"
+    assert result[0]["subopcao"] is None
+    assert result[1]["dados"][1]["produto"] == "Tinto"
+    assert result[1]["dados"][1]["quantidade"] == 2022.0
+    # A página de metadados (ano_max) é reaproveitada como página de dados de 2022
+    assert len(requested_urls) == 2
+
+@pytest.mark.asyncio
+async def test_async_partial_scraper_reuses_cached_metadata(tmp_path):
+    requested_urls = []
+    metadata_dir = str(tmp_path / "metadata")
+    async with _make_client(requested_urls) as client:
+        first = AsyncPartialScraper(client=client)
+        first.page_cache = None
+        first.rate_limiter = None
+        first.metadata_cache = MetadataCache(metadata_dir, ttl_seconds=60)
+        await first.scrape_by_params(2021, 2022, "producao")
+
+        # Outro processo/worker: lê os metadados do disco, sem buscar a página de metadados
+        second = AsyncPartialScraper(client=client)
+        second.page_cache = None
+        second.rate_limiter = None
+        second.metadata_cache = MetadataCache(metadata_dir, ttl_seconds=60)
+        requested_urls.clear()
+        result = await second.scrape_by_params(2020, 2020, "producao")
+
+    assert [item["ano"] for item in result] == [2020]
+    assert len(requested_urls) == 1
+
+@pytest.mark.asyncio
+async def test_async_partial_scraper_skips_sections_available_in_database(tmp_path):
+    requested_urls = []
+    metadata_dir = str(tmp_path / "metadata")
+    async with _make_client(requested_urls) as client:
+        warmup = AsyncPartialScraper(client=client)
+        warmup.page_cache = None
+        warmup.rate_limiter = None
+        warmup.metadata_cache = MetadataCache(metadata_dir, ttl_seconds=60)
+        await warmup.scrape_by_params(2022, 2022, "producao")
+
+        scraper = AsyncPartialScraper(client=client)
+        scraper.page_cache = None
+        scraper.rate_limiter = None
+        scraper.metadata_cache = MetadataCache(metadata_dir, ttl_seconds=60)
+        requested_urls.clear()
+        planejadas = []
+        result = await scraper.scrape_by_params(
+            2020, 2022, "producao",
+            skip_sections={("producao", None, 2020), ("producao", None, 2021)},
+            on_plan=planejadas.extend
+        )
+
+    assert [item["ano"] for item in result] == [2022]
+    assert len(requested_urls) == 1
+    assert planejadas == [("producao", None, 2022)]
+
+@pytest.mark.asyncio
+async def test_async_full_scraper_requires_client():
+    scraper = AsyncFullScraper()
+    with pytest.raises(Exception):
+        await scraper.fetch_page("http://example.invalid/")
+
+@pytest.mark.asyncio
+async def test_async_scraper_retries_then_fails(monkeypatch):
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        return httpx.Response(503)
+
+    async def no_sleep(_):
+        return None
+
+    monkeypatch.setattr("src.app.scraper.async_scraper.asyncio.sleep", no_sleep)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        scraper = AsyncPartialScraper(client=client)
+        scraper.rate_limiter = None
+        scraper.page_cache = None
+        with pytest.raises(Exception, match="Não foi possível carregar"):
+            await scraper.fetch_page("http://vitibrasil.test/index.php?ano=2020", "teste")
+
+    assert len(attempts) == scraper.config.MAX_RETRIES
+
+@pytest.mark.asyncio
+async def test_async_scraper_conditional_cache_skips_parsing(tmp_path):
+    etag = '"v1"'
+    conditional_requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("If-None-Match") == etag:
+            conditional_requests.append(str(request.url))
+            return httpx.Response(304)
+        return httpx.Response(200, content=PAGE_TEMPLATE.format(ano=2021).encode("utf-8"), headers={"ETag": etag})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        scraper = AsyncPartialScraper(client=client)
+        scraper.rate_limiter = None
+        scraper.page_cache = PageCache(str(tmp_path))
+
+        first = await scraper.scrape_data_from_page(2021, "opt_02", None, "producao", None)
+        with patch.object(scraper, "_parse_and_cache_page") as mock_parse:
+            second = await scraper.scrape_data_from_page(2021, "opt_02", None, "producao", None)
+
+    assert not first.unchanged
+    assert second.unchanged
+    assert second.data == first.data
+    mock_parse.assert_not_called()
+    assert len(conditional_requests) == 1
+
+@pytest.mark.asyncio
+async def test_async_full_scraper_iter_scrape_streams_sections(tmp_path):
+    requested_urls = []
+    async with _make_client(requested_urls) as client:
+        scraper = AsyncFullScraper(client=client, max_workers=2)
+        scraper.page_cache = None
+        scraper.rate_limiter = None
+        scraper.metadata_cache = MetadataCache(str(tmp_path), ttl_seconds=60)
+        with patch("src.app.scraper.async_scraper.MAIN_OPTIONS_TO_SCRAPE", ["opt_02"]):
+            sections = [section async for section in scraper.iter_scrape()]
+
+    assert [section["ano"] for section in sections] == [2020, 2021, 2022]
+    assert sections[2]["dados"][1]["quantidade"] == 2022.0
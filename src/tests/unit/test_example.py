@@ -4,7 +4,7 @@ from src.app.web.main import app
 from src.app.auth.dependencies import get_current_user
 
 # Paths to the functions that will be mocked
-PATH_RUN_FULL_SCRAPE = "src.app.service.viticulture_service.run_full_scrape"
+PATH_ITER_FULL_SCRAPE = "src.app.service.viticulture_service.iter_full_scrape_async"
 PATH_GET_LATEST_SCRAPE_GROUP = "src.app.service.viticulture_service.get_latest_scrape_group"
 
 MOCK_USER_PAYLOAD = {"sub": "testexampleuser", "username": "testexampleuser"}
@@ -12,13 +12,16 @@ MOCK_USER_PAYLOAD = {"sub": "testexampleuser", "username": "testexampleuser"}
 def mock_get_current_user_override():
     return MOCK_USER_PAYLOAD
 
-def test_get_data_fails_when_scrape_and_cache_fail(client: TestClient): # Added TestClient type hint
+def test_get_data_fails_when_scrape_and_cache_fail(client: TestClient, isolated_scrape_jobs): # Added TestClient type hint
     app.dependency_overrides[get_current_user] = mock_get_current_user_override
 
-    with patch(PATH_RUN_FULL_SCRAPE) as mock_scrape, \
+    with patch(PATH_ITER_FULL_SCRAPE) as mock_scrape, \
          patch(PATH_GET_LATEST_SCRAPE_GROUP) as mock_get_cache:
 
-        mock_scrape.return_value = []
+        async def sem_secoes(**kwargs):
+            return
+            yield
+        mock_scrape.side_effect = sem_secoes
         mock_get_cache.return_value = []
 
         response = client.get("/api/viticultura/dados")
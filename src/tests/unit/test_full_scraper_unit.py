@@ -0,0 +1,243 @@
+import os
+import time
+import pytest
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from src.app.scraper.base_scraper import PageMetadata, SubOption, ScrapedData
+from src.app.scraper.full_scraper import FullScraper
+from src.app.scraper.delta_planner import DeltaPlanner
+from src.app.scraper.checkpoint import ScrapeJournal, get_scrape_journal
+from src.app.scraper.config import SCRAPING_CONFIG
+from src.app.scraper.metadata_cache import MetadataCache
+from src.app.scraper.rate_limiter import TokenBucketRateLimiter, HostConcurrencyLimiter
+
+def _fake_scrape(year, option_code, suboption_code=None, option_name=None, suboption_name=None):
+    # Subopção "vazia" não retorna linhas e deve ser descartada
+    rows = [] if suboption_code == "subopt_vazia" else [{"produto": "x", "quantidade": float(year)}]
+    return ScrapedData(year, option_name, suboption_name, rows)
+
+def test_token_bucket_limits_rate():
+    limiter = TokenBucketRateLimiter(rate=50, burst=1)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    elapsed = time.monotonic() - start
+    # 1 token inicial + 5 tokens a 50/s => ~0.1s
+    assert elapsed >= 0.08
+
+def test_token_bucket_try_acquire():
+    limiter = TokenBucketRateLimiter(rate=0.001, burst=2)
+    assert limiter.try_acquire()
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+def test_token_bucket_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucketRateLimiter(rate=0)
+
+def test_request_slot_takes_token_only_after_host_slot():
+    scraper = FullScraper(max_workers=1)
+    scraper.host_limiter = HostConcurrencyLimiter(1)
+    scraper.rate_limiter = TokenBucketRateLimiter(rate=1000, burst=1)
+    eventos = []
+
+    @contextmanager
+    def slot(url):
+        eventos.append("vaga")
+        yield
+
+    # Quem espera vaga de conexão ainda não consumiu token
+    with patch.object(scraper.host_limiter, "slot", side_effect=slot), \
+         patch.object(scraper.rate_limiter, "acquire", side_effect=lambda: eventos.append("token")):
+        with scraper._request_slot("http://vitibrasil.cnpuv.embrapa.br/index.php"):
+            eventos.append("envio")
+
+    assert eventos == ["vaga", "token", "envio"]
+
+def test_full_scraper_worker_pool_preserves_order_and_skips_empty():
+    metadata = PageMetadata(
+        2020, 2022,
+        [SubOption("subopt_01", "vinhos_de_mesa"), SubOption("subopt_vazia", "vazia")],
+        "producao"
+    )
+    scraper = FullScraper(max_workers=4)
+    scraper.rate_limiter = TokenBucketRateLimiter(rate=1000, burst=10)
+
+    with patch.object(scraper, "get_page_metadata", return_value=metadata), \
+         patch.object(scraper, "scrape_data_from_page", side_effect=_fake_scrape) as mock_scrape:
+        result = scraper._scrape_option_data("opt_02")
+
+    assert mock_scrape.call_count == 6
+    assert [item.year for item in result] == [2020, 2021, 2022]
+    assert all(item.sub_option_name == "vinhos_de_mesa" for item in result)
+
+def test_full_scraper_page_error_does_not_abort_run():
+    metadata = PageMetadata(2020, 2021, [], "producao")
+    scraper = FullScraper(max_workers=2)
+    scraper.rate_limiter = None
+
+    def scrape_or_fail(year, *args, **kwargs):
+        if year == 2020:
+            raise RuntimeError("timeout")
+        return _fake_scrape(year, *args, **kwargs)
+
+    with patch.object(scraper, "get_page_metadata", return_value=metadata), \
+         patch.object(scraper, "scrape_data_from_page", side_effect=scrape_or_fail):
+        result = scraper._scrape_option_data("opt_02")
+
+    assert [item.year for item in result] == [2021]
+
+def test_scrapers_share_pooled_http_adapter():
+    from src.app.scraper.http_session import get_http_adapter
+
+    first, second = FullScraper(), FullScraper()
+    adapter = get_http_adapter()
+
+    assert first.session.get_adapter("http://vitibrasil.cnpuv.embrapa.br/") is adapter
+    assert second.session.get_adapter("http://vitibrasil.cnpuv.embrapa.br/") is adapter
+    assert "gzip" in first.session.headers["Accept-Encoding"]
+
+def test_metadata_cache_expires_after_ttl(tmp_path):
+    cache = MetadataCache(str(tmp_path), ttl_seconds=60)
+    metadata = PageMetadata(1970, 2023, [SubOption("subopt_01", "vinhos_de_mesa")], "producao")
+    cache.store("opt_02", metadata)
+
+    assert cache.get("opt_02") == metadata
+    assert cache.get("opt_02") is not cache.get("opt_02")
+    assert cache.get("opt_03") is None
+
+    with patch("src.app.scraper.metadata_cache.time.time", return_value=time.time() + 61):
+        assert cache.get("opt_02") is None
+
+    cache.invalidate("opt_02")
+    assert MetadataCache(str(tmp_path), ttl_seconds=60).get("opt_02") is None
+
+def test_delta_planner_fetches_new_and_recent_sections_only():
+    metadata = PageMetadata(1970, 2023, [SubOption("subopt_01", "tintas"), SubOption("subopt_02", "nova")], "processamento")
+    scraper = FullScraper(max_workers=1)
+    units = scraper.build_units("opt_03", metadata, range(1970, 2024))
+    stored = {("processamento", "tintas", year) for year in range(1970, 2023)}
+
+    plan = DeltaPlanner(stored, revision_years=2).plan(units, metadata)
+
+    planned = {(unit.suboption_name, unit.year) for unit in plan.units}
+    # Subopção nova: todos os anos; subopção conhecida: ano ausente (2023) e janela de revisão (2022)
+    assert planned == {("nova", year) for year in range(1970, 2024)} | {("tintas", 2022), ("tintas", 2023)}
+    assert (plan.missing, plan.revision) == (55, 1)
+
+def test_full_scraper_delta_mode_plans_only_missing_units():
+    metadata = PageMetadata(2020, 2023, [], "producao")
+    stored = {("producao", None, year) for year in range(2020, 2024)}
+    scraper = FullScraper(max_workers=1, stored_sections=stored)
+
+    with patch.object(scraper, "get_page_metadata", return_value=metadata):
+        units = scraper._plan_option_units("opt_02")
+
+    assert [unit.year for unit in units] == [2022, 2023]
+
+def test_full_scraper_delta_mode_skips_recently_empty_sections(tmp_path):
+    metadata = PageMetadata(2018, 2023, [SubOption("subopt_01", "a"), SubOption("subopt_vazia", "b")], "producao")
+    stored = {("producao", "a", year) for year in range(2018, 2024)}
+    cache = MetadataCache(str(tmp_path), ttl_seconds=60)
+
+    def plan():
+        scraper = FullScraper(max_workers=1, stored_sections=stored)
+        scraper.metadata_cache = cache
+        with patch.object(scraper, "get_page_metadata", return_value=metadata), \
+             patch.object(scraper, "scrape_data_from_page", side_effect=_fake_scrape):
+            units = scraper._plan_option_units("opt_02")
+            scraper._scrape_units(units)
+        return {(unit.suboption_code, unit.year) for unit in units}
+
+    # Primeira coleta: a subopção vazia nunca foi armazenada e é buscada inteira
+    assert {year for sub, year in plan() if sub == "subopt_vazia"} == set(range(2018, 2024))
+    # Segunda: só a janela de revisão; o registro sobrevive em disco para outros workers
+    assert {year for sub, year in plan() if sub == "subopt_vazia"} == {2022, 2023}
+    assert MetadataCache(str(tmp_path), ttl_seconds=60).empty_sections("opt_02") == {
+        ("subopt_vazia", year) for year in range(2018, 2024)
+    }
+
+    with patch("src.app.scraper.metadata_cache.time.time", return_value=time.time() + 61):
+        assert cache.empty_sections("opt_02") == set()
+
+def test_full_scraper_resumes_from_checkpoint(tmp_path):
+    metadata = PageMetadata(2020, 2023, [], "producao")
+    journal_path = str(tmp_path / "checkpoint.jsonl")
+    calls = []
+
+    def scrape(year, *args, **kwargs):
+        calls.append(year)
+        if year == 2022 and len(calls) == 3:
+            raise KeyboardInterrupt  # Processo morto no meio da primeira coleta
+        return _fake_scrape(year, *args, **kwargs)
+
+    def run():
+        scraper = FullScraper(max_workers=1, journal=ScrapeJournal(journal_path))
+        with patch("src.app.scraper.full_scraper.MAIN_OPTIONS_TO_SCRAPE", ["opt_02"]), \
+             patch.object(scraper, "get_page_metadata", return_value=metadata), \
+             patch.object(scraper, "scrape_data_from_page", side_effect=scrape):
+            return scraper.scrape_all_data()
+
+    with pytest.raises(KeyboardInterrupt):
+        run()
+    assert calls == [2020, 2021, 2022]
+
+    calls.clear()
+    result = run()
+
+    # 2020 e 2021 vêm do checkpoint; só 2022 e 2023 são buscados
+    assert calls == [2022, 2023]
+    assert [item["ano"] for item in result] == [2020, 2021, 2022, 2023]
+    assert not os.path.exists(journal_path)
+
+def test_iter_scrape_streams_restored_sections_from_journal(tmp_path):
+    from src.app.scraper.base_scraper import ScrapeUnit
+
+    metadata = PageMetadata(2020, 2023, [], "producao")
+    journal = ScrapeJournal(str(tmp_path / "checkpoint.jsonl"))
+    for year in (2020, 2021):
+        journal.record(ScrapeUnit(year, "opt_02", None, "producao", None), _fake_scrape(year, "opt_02", None, "producao"))
+
+    scraper = FullScraper(max_workers=2, journal=journal)
+    with patch("src.app.scraper.full_scraper.MAIN_OPTIONS_TO_SCRAPE", ["opt_02"]), \
+         patch.object(scraper, "get_page_metadata", return_value=metadata), \
+         patch.object(scraper, "scrape_data_from_page", side_effect=_fake_scrape) as mock_scrape, \
+         patch.object(journal, "load", side_effect=AssertionError("diário carregado inteiro")):
+        result = list(scraper.iter_scrape())
+
+    # Restauradas saem primeiro, lidas do diário em streaming; só as demais são buscadas
+    assert [item["ano"] for item in result] == [2020, 2021, 2022, 2023]
+    assert sorted(call.args[0] for call in mock_scrape.call_args_list) == [2022, 2023]
+
+def test_concurrent_runs_use_separate_journals(tmp_path):
+    from src.app.scraper.base_scraper import ScrapeUnit
+
+    with patch.object(SCRAPING_CONFIG, "CHECKPOINT_DIR", str(tmp_path)):
+        full, delta = get_scrape_journal("full", 1), get_scrape_journal("delta", 2)
+        for journal, year in ((full, 2020), (delta, 2021)):
+            journal.record(ScrapeUnit(year, "opt_02", None, "producao", None), ScrapedData(year, "producao", None, [{"x": 1}]))
+
+        delta.clear()
+        assert list(full.load()) == [("opt_02", None, 2020)]
+
+        # Execução seguinte do mesmo modo retoma o diário; a anterior perde o arquivo
+        resumed = get_scrape_journal("full", 3, resume_from=1)
+        assert list(resumed.load()) == [("opt_02", None, 2020)]
+        assert full.load() == {}
+
+def test_iter_scrape_streams_sections_in_plan_order():
+    metadata = PageMetadata(2020, 2029, [SubOption("subopt_01", "a"), SubOption("subopt_vazia", "b")], "producao")
+    scraper = FullScraper(max_workers=3)
+
+    with patch("src.app.scraper.full_scraper.MAIN_OPTIONS_TO_SCRAPE", ["opt_02"]), \
+         patch.object(scraper, "get_page_metadata", return_value=metadata), \
+         patch.object(scraper, "scrape_data_from_page", side_effect=_fake_scrape) as mock_scrape:
+        stream = scraper.iter_scrape()
+        first = next(stream)
+        # Só a janela do pipeline (2 × workers) foi iniciada antes do primeiro consumo
+        assert mock_scrape.call_count <= 6
+        rest = list(stream)
+
+    assert first["ano"] == 2020 and first["subopcao"] == "a"
+    assert [item["ano"] for item in rest] == list(range(2021, 2030))
@@ -0,0 +1,70 @@
+import threading
+from unittest.mock import patch
+from sqlalchemy import inspect, text
+
+from src.app.config.database import build_engine
+from src.app.service.migration_service import executar_migracoes, versao_aplicada, VERSAO_SCHEMA
+
+def _banco_legado(caminho):
+    """Banco de uma versão anterior: sem option_code/subopcao_key/conteúdos e com os fatos por seção"""
+    engine = build_engine(f"sqlite:///{caminho}", profile="auto")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE viticultura_data (id INTEGER PRIMARY KEY, ano INTEGER NOT NULL, aba VARCHAR NOT NULL, "
+            "subopcao VARCHAR, dados_list_json JSON NOT NULL, data_raspagem DATETIME NOT NULL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO viticultura_data (ano, aba, subopcao, dados_list_json, data_raspagem) VALUES "
+            "(2021, 'producao', NULL, '[{\"produto\": \"Tinto\", \"quantidade\": 1.0}]', '2024-01-01 00:00:00'), "
+            "(2021, 'producao', NULL, '[{\"produto\": \"Tinto\", \"quantidade\": 2.0}]', '2024-02-01 00:00:00'), "
+            "(2022, 'producao', NULL, '[{\"produto\": \"Tinto\", \"quantidade\": 3.0}]', '2024-01-01 00:00:00')"
+        ))
+        conn.execute(text("CREATE TABLE viticultura_fatos (id INTEGER PRIMARY KEY, secao_id INTEGER, quantidade FLOAT)"))
+    return engine
+
+def test_migrations_upgrade_legacy_database_once(tmp_path):
+    engine = _banco_legado(tmp_path / "legado.db")
+    try:
+        assert executar_migracoes(bind=engine) is True
+        assert versao_aplicada(engine) == VERSAO_SCHEMA
+
+        colunas = {coluna["name"] for coluna in inspect(engine).get_columns("viticultura_data")}
+        assert {"option_code", "subopcao_key", "conteudo_id"} <= colunas
+        assert "conteudo_id" in {coluna["name"] for coluna in inspect(engine).get_columns("viticultura_fatos")}
+        with engine.connect() as conn:
+            atuais = conn.execute(text("SELECT ano, viticultura_id FROM viticultura_atual ORDER BY ano")).all()
+            assert [tuple(linha) for linha in atuais] == [(2021, 2), (2022, 3)]
+            assert conn.execute(text("SELECT count(*) FROM viticultura_fatos")).scalar() == 3
+
+        # Versão registrada: a próxima execução não refaz nada
+        with patch("src.app.service.migration_service.backfill_option_codes") as backfill:
+            assert executar_migracoes(bind=engine) is False
+        backfill.assert_not_called()
+    finally:
+        engine.dispose()
+
+def test_concurrent_migrations_are_serialized(tmp_path):
+    caminho = tmp_path / "concorrente.db"
+    _banco_legado(caminho).dispose()
+    engines = [build_engine(f"sqlite:///{caminho}", profile="auto") for _ in range(4)]
+    resultados, erros = [], []
+
+    def migrar(engine):
+        try:
+            resultados.append(executar_migracoes(bind=engine))
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=migrar, args=(engine,)) for engine in engines]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    try:
+        # Um processo aplica as migrações; os demais esperam a trava e encontram a versão registrada
+        assert erros == []
+        assert sorted(resultados) == [False, False, False, True]
+    finally:
+        for engine in engines:
+            engine.dispose()
@@ -0,0 +1,158 @@
+import threading
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.app.config.database import Base
+from src.app.domain.viticulture import ViticulturaCreate
+from src.app.models.viticulture import Viticultura, ViticulturaAtual, ViticulturaConteudo, ViticulturaFato
+from src.app.repository.viticulture_repo import save_bulk
+from src.app.service.persistence_writer import PersistenceWriter, PersistenceQueueFullError
+
+PATH_SAVE_BULK_WRITER = "src.app.service.persistence_writer.save_bulk"
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[ViticulturaConteudo.__table__, Viticultura.__table__, ViticulturaAtual.__table__, ViticulturaFato.__table__])
+    yield sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    engine.dispose()
+
+def _secao(ano, data_raspagem=datetime(2024, 1, 1), quantidade=1.0):
+    return ViticulturaCreate(ano=ano, aba="producao", subopcao=None, dados=[{"produto": "Tinto", "quantidade": quantidade}], data_raspagem=data_raspagem)
+
+def test_pending_saves_are_merged_into_one_transaction(session_factory):
+    writer = PersistenceWriter(max_queue=8, put_timeout=1, session_factory=session_factory)
+    liberar = threading.Event()
+    gravando = threading.Event()
+    lotes = []
+
+    def save_bulk_lento(db, lote):
+        gravando.set()
+        liberar.wait(5)
+        lotes.append([(vc.ano, vc.data_raspagem) for vc in lote])
+
+    with patch(PATH_SAVE_BULK_WRITER, side_effect=save_bulk_lento):
+        primeiro = writer.submit([_secao(2020)])
+        assert gravando.wait(5)
+        # Enquanto o primeiro lote grava, os seguintes ficam na fila e são juntados
+        segundo = writer.submit([_secao(2021), _secao(2022)])
+        terceiro = writer.submit([_secao(2022, data_raspagem=datetime(2024, 2, 1))])
+        liberar.set()
+        assert writer.flush(timeout=5)
+
+    writer.shutdown()
+    assert lotes == [
+        [(2020, datetime(2024, 1, 1))],
+        [(2021, datetime(2024, 1, 1)), (2022, datetime(2024, 2, 1))],  # Mantém a raspagem mais recente da seção
+    ]
+    assert (primeiro.result(), segundo.result(), terceiro.result()) == (1, 2, 2)
+
+def test_merge_keeps_every_version_with_different_content(session_factory):
+    writer = PersistenceWriter(max_queue=8, put_timeout=1, session_factory=session_factory)
+    liberar = threading.Event()
+    gravando = threading.Event()
+    original_save = save_bulk
+
+    def save_bulk_lento(db, lote):
+        gravando.set()
+        liberar.wait(5)
+        return original_save(db, lote)
+
+    with patch(PATH_SAVE_BULK_WRITER, side_effect=save_bulk_lento):
+        writer.submit([_secao(2019)])
+        assert gravando.wait(5)
+        writer.submit([_secao(2020, datetime(2024, 1, 1), quantidade=1.0)])
+        writer.submit([_secao(2020, datetime(2024, 2, 1), quantidade=2.0)])
+        liberar.set()
+        assert writer.flush(timeout=5)
+    writer.shutdown()
+
+    db = session_factory()
+    try:
+        versoes = db.query(Viticultura).filter(Viticultura.ano == 2020).order_by(Viticultura.data_raspagem).all()
+        assert [vc.dados_list_json[0]["quantidade"] for vc in versoes] == [1.0, 2.0]
+        atual = db.query(ViticulturaAtual).filter(ViticulturaAtual.ano == 2020).one()
+        assert atual.viticultura_id == versoes[-1].id
+    finally:
+        db.close()
+
+def test_shutdown_with_full_queue_does_not_block_and_drains(session_factory):
+    writer = PersistenceWriter(max_queue=1, put_timeout=0.05, session_factory=session_factory)
+    liberar = threading.Event()
+    gravando = threading.Event()
+    gravados = []
+
+    def save_bulk_bloqueado(db, lote):
+        gravando.set()
+        liberar.wait(5)
+        gravados.extend(vc.ano for vc in lote)
+
+    with patch(PATH_SAVE_BULK_WRITER, side_effect=save_bulk_bloqueado):
+        writer.submit([_secao(2020)])
+        assert gravando.wait(5)
+        writer.submit([_secao(2021)])  # Fila cheia: o sinal de parada não cabe
+        thread = writer._thread
+        writer.shutdown(wait=False)
+        liberar.set()
+        assert writer.flush(timeout=5)
+        thread.join(timeout=5)
+
+    # A thread grava o que estava pendente e encerra ao esvaziar a fila
+    assert gravados == [2020, 2021]
+    assert not thread.is_alive()
+
+def test_writer_persists_sections(session_factory):
+    writer = PersistenceWriter(max_queue=8, put_timeout=1, session_factory=session_factory)
+
+    assert writer.submit([_secao(2020), _secao(2021, quantidade=2.0)]).result(timeout=5) == 2
+    writer.shutdown()
+
+    db = session_factory()
+    try:
+        assert [item.ano for item in db.query(Viticultura).order_by(Viticultura.ano)] == [2020, 2021]
+    finally:
+        db.close()
+
+def test_full_queue_applies_backpressure_then_rejects(session_factory):
+    writer = PersistenceWriter(max_queue=1, put_timeout=0.05, session_factory=session_factory)
+    liberar = threading.Event()
+    gravando = threading.Event()
+
+    def save_bulk_bloqueado(db, lote):
+        gravando.set()
+        liberar.wait(5)
+
+    with patch(PATH_SAVE_BULK_WRITER, side_effect=save_bulk_bloqueado):
+        writer.submit([_secao(2020)])
+        assert gravando.wait(5)
+        writer.submit([_secao(2021)])  # Ocupa a única vaga da fila
+        with pytest.raises(PersistenceQueueFullError):
+            writer.submit([_secao(2022)])
+        liberar.set()
+        assert writer.flush(timeout=5)
+    writer.shutdown()
+
+def test_locked_database_is_retried_and_failures_reach_the_caller(session_factory):
+    writer = PersistenceWriter(max_queue=8, put_timeout=1, retries=2, session_factory=session_factory)
+    bloqueado = OperationalError("INSERT", {}, Exception("database is locked"))
+
+    with patch(PATH_SAVE_BULK_WRITER, side_effect=[bloqueado, None]) as mock_save, \
+         patch("src.app.service.persistence_writer.time.sleep"):
+        assert writer.submit([_secao(2020)]).result(timeout=5) == 1
+    assert mock_save.call_count == 2
+
+    with patch(PATH_SAVE_BULK_WRITER, side_effect=ValueError("dados inválidos")):
+        falha = writer.submit([_secao(2021)])
+        with pytest.raises(ValueError):
+            falha.result(timeout=5)
+
+    # O gravador continua ativo depois de uma falha
+    with patch(PATH_SAVE_BULK_WRITER) as mock_save:
+        writer.submit([_secao(2022)]).result(timeout=5)
+    mock_save.assert_called_once()
+    writer.shutdown()
@@ -0,0 +1,59 @@
+from unittest.mock import MagicMock, patch
+
+from src.app.utils.query_cache import QueryCache, bump_data_version
+from src.app.repository.viticulture_repo import save_bulk
+
+
+def test_query_cache_reuses_result_until_data_version_changes():
+    cache = QueryCache(max_entries=8, ttl_seconds=60)
+    loader = MagicMock(side_effect=[["v1"], ["v2"]])
+
+    assert cache.get_or_load(("consulta", 1), loader) == ["v1"]
+    assert cache.get_or_load(("consulta", 1), loader) == ["v1"]
+    assert loader.call_count == 1
+
+    bump_data_version()
+    assert cache.get_or_load(("consulta", 1), loader) == ["v2"]
+    assert loader.call_count == 2
+
+
+def test_query_cache_expires_entries_after_ttl():
+    cache = QueryCache(max_entries=8, ttl_seconds=10)
+    loader = MagicMock(side_effect=["antigo", "novo"])
+
+    with patch("src.app.utils.query_cache.time.monotonic", return_value=100.0):
+        cache.get_or_load("chave", loader)
+    with patch("src.app.utils.query_cache.time.monotonic", return_value=111.0):
+        assert cache.get_or_load("chave", loader) == "novo"
+
+
+def test_query_cache_evicts_least_recently_used():
+    cache = QueryCache(max_entries=2, ttl_seconds=60)
+    cache.get_or_load("a", lambda: 1)
+    cache.get_or_load("b", lambda: 2)
+    cache.get_or_load("a", lambda: 0)  # "a" passa a ser a mais recente
+    cache.get_or_load("c", lambda: 3)
+
+    assert len(cache) == 2
+    assert cache.get_or_load("a", lambda: "recarregado") == 1
+    assert cache.get_or_load("b", lambda: "recarregado") == "recarregado"
+
+
+def test_query_cache_discards_result_loaded_during_a_write():
+    cache = QueryCache(max_entries=8, ttl_seconds=60)
+
+    def loader_with_concurrent_write():
+        bump_data_version()
+        return "lido antes da gravação"
+
+    cache.get_or_load("chave", loader_with_concurrent_write)
+    assert cache.get_or_load("chave", lambda: "atual") == "atual"
+
+
+def test_save_bulk_invalidates_cached_results():
+    cache = QueryCache(max_entries=8, ttl_seconds=60)
+    cache.get_or_load("chave", lambda: "antes")
+
+    save_bulk(MagicMock(), [])
+
+    assert cache.get_or_load("chave", lambda: "depois") == "depois"
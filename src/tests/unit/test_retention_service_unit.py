@@ -0,0 +1,128 @@
+import pytest
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.app.config.database import Base
+from src.app.domain.viticulture import ViticulturaCreate
+from src.app.models.viticulture import Viticultura, ViticulturaAtual, ViticulturaConteudo, ViticulturaFato
+from src.app.repository.viticulture_repo import save_bulk, get_latest_sections
+from src.app.service.retention_service import executar_retencao, main
+
+AGORA = datetime(2024, 6, 30)  # Com 30 dias de retenção, o corte é 31/05/2024
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[ViticulturaConteudo.__table__, Viticultura.__table__, ViticulturaAtual.__table__, ViticulturaFato.__table__])
+    factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    db = factory()
+    versoes = [
+        (2020, datetime(2024, 1, 5), 1.0),
+        (2020, datetime(2024, 1, 20), 2.0),   # Checkpoint de janeiro
+        (2020, datetime(2024, 2, 10), 1.0),   # Checkpoint de fevereiro, mesmo conteúdo da primeira
+        (2020, datetime(2024, 6, 10), 3.0),   # Dentro do período mantido (versão atual)
+        (2021, datetime(2024, 3, 1), 4.0),
+        (2021, datetime(2024, 3, 15), 5.0),   # Versão atual, anterior ao corte
+    ]
+    for ano, data_raspagem, quantidade in versoes:
+        save_bulk(db, [ViticulturaCreate(ano=ano, aba="producao", dados=[{"produto": "Tinto", "quantidade": quantidade}], data_raspagem=data_raspagem)])
+    db.close()
+
+    yield factory
+    engine.dispose()
+
+def _versoes(factory):
+    db = factory()
+    try:
+        return [(item.ano, item.data_raspagem) for item in db.query(Viticultura).order_by(Viticultura.ano, Viticultura.data_raspagem)]
+    finally:
+        db.close()
+
+def _quantidades_armazenadas(factory):
+    db = factory()
+    try:
+        conteudos = sorted(item.dados_list_json[0]["quantidade"] for item in db.query(ViticulturaConteudo))
+        fatos = sorted(item.quantidade for item in db.query(ViticulturaFato))
+        return conteudos, fatos
+    finally:
+        db.close()
+
+def test_monthly_checkpoints_keep_last_version_of_each_month(session_factory):
+    resultado = executar_retencao(dias=30, checkpoints_mensais=True, batch_size=2, session_factory=session_factory, agora=AGORA)
+
+    assert (resultado.versoes_removidas, resultado.conteudos_removidos) == (2, 1)
+    assert _versoes(session_factory) == [
+        (2020, datetime(2024, 1, 20)), (2020, datetime(2024, 2, 10)), (2020, datetime(2024, 6, 10)),
+        (2021, datetime(2024, 3, 15)),
+    ]
+    # O conteúdo 1.0 continua referenciado pelo checkpoint de fevereiro; o 4.0 sai com seus fatos
+    assert _quantidades_armazenadas(session_factory) == ([1.0, 2.0, 3.0, 5.0], [1.0, 2.0, 3.0, 5.0])
+
+def test_without_checkpoints_only_current_versions_survive_before_cutoff(session_factory):
+    resultado = executar_retencao(dias=30, checkpoints_mensais=False, session_factory=session_factory, agora=AGORA)
+
+    assert (resultado.versoes_removidas, resultado.conteudos_removidos) == (4, 3)
+    assert _versoes(session_factory) == [(2020, datetime(2024, 6, 10)), (2021, datetime(2024, 3, 15))]
+    assert _quantidades_armazenadas(session_factory) == ([3.0, 5.0], [3.0, 5.0])
+
+    db = session_factory()
+    try:
+        assert sorted(item.dados_list_json[0]["quantidade"] for item in get_latest_sections(db)) == [3.0, 5.0]
+    finally:
+        db.close()
+
+def test_vacuum_runs_only_above_threshold_or_when_forced(session_factory):
+    with patch("src.app.service.retention_service.optimize_database") as mock_optimize, \
+         patch("src.app.service.retention_service.settings.RETENTION_VACUUM_MIN_DELETED", 3):
+        assert executar_retencao(dias=30, checkpoints_mensais=True, session_factory=session_factory, agora=AGORA).vacuum is False
+        mock_optimize.assert_called_once()
+        assert mock_optimize.call_args.kwargs["vacuum"] is False
+
+        # Nada a remover: sem ANALYZE nem VACUUM
+        mock_optimize.reset_mock()
+        executar_retencao(dias=30, checkpoints_mensais=True, session_factory=session_factory, agora=AGORA)
+        mock_optimize.assert_not_called()
+
+        assert executar_retencao(dias=30, vacuum=True, session_factory=session_factory, agora=AGORA).vacuum is True
+        assert mock_optimize.call_args.kwargs["vacuum"] is True
+
+def test_cutoff_without_agora_uses_utc_like_stored_scrape_dates(session_factory, monkeypatch):
+    # Fuso local UTC-3: com datetime.now() local o corte ficaria 3h atrasado
+    monkeypatch.setenv("TZ", "BRT+3")
+    time.tzset()
+    try:
+        agora_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = session_factory()
+        save_bulk(db, [ViticulturaCreate(ano=2030, aba="producao", dados=[{"produto": "Tinto", "quantidade": 10.0}], data_raspagem=agora_utc - timedelta(days=30, hours=2))])
+        save_bulk(db, [ViticulturaCreate(ano=2030, aba="producao", dados=[{"produto": "Tinto", "quantidade": 11.0}], data_raspagem=agora_utc)])
+        db.close()
+
+        resultado = executar_retencao(dias=30, checkpoints_mensais=False, session_factory=session_factory)
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()
+
+    assert resultado.corte.tzinfo is None
+    assert abs(resultado.corte - (agora_utc - timedelta(days=30))) < timedelta(minutes=1)
+    assert [versao for versao in _versoes(session_factory) if versao[0] == 2030] == [(2030, agora_utc)]
+
+def test_aware_agora_is_converted_to_utc(session_factory):
+    agora = datetime(2024, 6, 30, 3, 0, tzinfo=timezone(timedelta(hours=3)))
+
+    resultado = executar_retencao(dias=30, session_factory=session_factory, agora=agora)
+
+    assert resultado.corte == datetime(2024, 5, 31, 0, 0)
+
+def test_cli_passes_options_to_retention(capsys):
+    with patch("src.app.service.retention_service.executar_retencao") as mock_executar:
+        mock_executar.return_value.corte = AGORA
+        mock_executar.return_value.vacuum = False
+        assert main(["--dias", "7", "--no-checkpoints-mensais", "--lote", "50"]) == 0
+
+    mock_executar.assert_called_once_with(dias=7, checkpoints_mensais=False, batch_size=50, vacuum=None)
+    assert "versões removidas" in capsys.readouterr().out
@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.app.config.database import Base
+from src.app.models.scrape_job import ScrapeJob
+from src.app.scraper.base_scraper import ScrapedData, ScrapeUnit
+from src.app.scraper.config import SCRAPING_CONFIG
+from src.app.service.scrape_job_service import ScrapeJobService, ScrapeJobQueueFullError
+
+PATH_SALVAR_STREAMING = "src.app.service.scrape_job_service.salvar_raspagem_em_streaming"
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[ScrapeJob.__table__])
+    yield sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    engine.dispose()
+
+def _blocking_scrape(release: threading.Event):
+    async def fake(modo, progresso=None, **kwargs):
+        progresso(paginas_total=10)
+        await asyncio.to_thread(release.wait, 5)
+        progresso(secoes_processadas=10, secoes_salvas=7)
+        return 7
+    return fake
+
+@pytest.mark.asyncio
+async def test_identical_jobs_are_deduplicated_and_report_progress(session_factory):
+    release = threading.Event()
+    service = ScrapeJobService(max_workers=1, max_pending=4, session_factory=session_factory)
+
+    with patch(PATH_SALVAR_STREAMING, side_effect=_blocking_scrape(release)):
+        job, created = service.submit("full")
+        same_job, created_again = service.submit("full")
+        other_job, _ = service.submit("delta")
+
+        assert created and not created_again
+        assert same_job.id == job.id
+        assert other_job.id != job.id
+
+        pending = await service.wait(job.id, timeout=0.05)
+        assert pending.status in ("pending", "running")
+
+        release.set()
+        done = await service.wait(job.id, timeout=5)
+        await service.wait(other_job.id, timeout=5)
+
+    service.shutdown(wait=True)
+    assert done.status == "succeeded"
+    assert (done.paginas_total, done.secoes_processadas, done.secoes_salvas) == (10, 10, 7)
+
+    # Job concluído libera a chave: um novo pedido cria outro job
+    with patch(PATH_SALVAR_STREAMING, side_effect=_blocking_scrape(release)):
+        new_job, created = service.submit("full")
+        await service.wait(new_job.id, timeout=5)
+    service.shutdown(wait=True)
+    assert created and new_job.id != job.id
+
+@pytest.mark.asyncio
+async def test_failed_job_records_error(session_factory):
+    async def failing(modo, progresso=None, **kwargs):
+        raise RuntimeError("Embrapa fora do ar")
+
+    service = ScrapeJobService(max_workers=1, max_pending=4, session_factory=session_factory)
+    with patch(PATH_SALVAR_STREAMING, side_effect=failing):
+        job, _ = service.submit("full")
+        done = await service.wait(job.id, timeout=5)
+    service.shutdown(wait=True)
+
+    assert done.status == "failed"
+    assert "Embrapa fora do ar" in done.erro
+
+def test_submit_rejects_jobs_when_queue_is_full(session_factory):
+    release = threading.Event()
+    service = ScrapeJobService(max_workers=1, max_pending=1, session_factory=session_factory)
+    with patch(PATH_SALVAR_STREAMING, side_effect=_blocking_scrape(release)):
+        service.submit("full")
+        with pytest.raises(ScrapeJobQueueFullError):
+            service.submit("delta")
+        release.set()
+        service.shutdown(wait=True)
+
+@pytest.mark.asyncio
+async def test_job_resumes_journal_of_previous_failed_job(session_factory, tmp_path):
+    journals = []
+    unit = ScrapeUnit(2020, "opt_02", None, "producao", None)
+
+    async def scrape(modo, progresso=None, journal=None):
+        journals.append(journal)
+        if len(journals) == 1:
+            journal.record(unit, ScrapedData(2020, "producao", None, [{"produto": "x"}]))
+            raise RuntimeError("worker morto")
+        return 0
+
+    service = ScrapeJobService(max_workers=1, max_pending=4, session_factory=session_factory)
+    with patch.object(SCRAPING_CONFIG, "CHECKPOINT_DIR", str(tmp_path)), \
+         patch(PATH_SALVAR_STREAMING, side_effect=scrape):
+        failed, _ = service.submit("full")
+        await service.wait(failed.id, timeout=5)
+        other_mode, _ = service.submit("delta")
+        await service.wait(other_mode.id, timeout=5)
+        resumed, _ = service.submit("full")
+        await service.wait(resumed.id, timeout=5)
+    service.shutdown(wait=True)
+
+    first, delta, second = journals
+    assert first.path != second.path and delta.path != second.path
+    # Só o job seguinte do mesmo modo assume o diário do job que falhou
+    assert delta.load() == {}
+    assert list(second.load()) == [("opt_02", None, 2020)]
+    assert not (tmp_path / f"full-{failed.id}.jsonl").exists()
+
+@pytest.mark.asyncio
+async def test_heartbeat_keeps_local_jobs_alive_and_records_progress(session_factory):
+    release = threading.Event()
+    service = ScrapeJobService(max_workers=1, max_pending=4, session_factory=session_factory, heartbeat_seconds=0.05)
+
+    with patch(PATH_SALVAR_STREAMING, side_effect=_blocking_scrape(release)), \
+         patch("src.app.service.scrape_job_service.settings.SCRAPE_JOB_STALE_SECONDS", 0):
+        running, _ = service.submit("full")
+        queued, _ = service.submit("delta")  # Aguarda o único worker
+        await asyncio.sleep(0.2)
+
+        # Sem progresso gravado por lote, o heartbeat mantém os dois jobs vivos (mesmo com limite 0s)
+        assert [(job.id, created) for job, created in (service.submit("full"), service.submit("delta"))] == [
+            (running.id, False), (queued.id, False)
+        ]
+        assert service.get(running.id).paginas_total == 10
+        assert service.get(queued.id).status == "pending"
+
+        release.set()
+        await service.wait(running.id, timeout=5)
+        await service.wait(queued.id, timeout=5)
+    service.shutdown(wait=True)
+    assert service.get(queued.id).status == "succeeded"
+
+@pytest.mark.asyncio
+async def test_job_no_longer_pending_is_not_scraped(session_factory):
+    from src.app.repository.scrape_job_repo import finish_job
+    release, queued_ids, scraped = threading.Event(), [], []
+
+    async def scrape(modo, progresso=None, **kwargs):
+        scraped.append(modo)
+        await asyncio.to_thread(release.wait, 5)
+        if modo == "full":
+            # Outro worker marca o job ainda na fila como falho (ex.: julgou-o abandonado)
+            db = session_factory()
+            finish_job(db, queued_ids[0], "failed", "Marcado como falho por outro worker")
+            db.close()
+        return 0
+
+    service = ScrapeJobService(max_workers=1, max_pending=4, session_factory=session_factory)
+    with patch(PATH_SALVAR_STREAMING, side_effect=scrape):
+        running, _ = service.submit("full")
+        queued, _ = service.submit("delta")
+        queued_ids.append(queued.id)
+        release.set()
+        await service.wait(running.id, timeout=5)
+        await service.wait(queued.id, timeout=5)
+    service.shutdown(wait=True)
+
+    assert scraped == ["full"]
+    assert service.get(queued.id).status == "failed"
+
+@pytest.mark.asyncio
+async def test_inline_run_shares_deduplication_with_queued_jobs(session_factory):
+    release = threading.Event()
+    service = ScrapeJobService(max_workers=1, max_pending=4, session_factory=session_factory)
+
+    with patch(PATH_SALVAR_STREAMING, side_effect=_blocking_scrape(release)) as mock_scrape:
+        queued, _ = service.submit("full")
+        threading.Timer(0.1, release.set).start()
+        # Pedido ao vivo idêntico aguarda o job enfileirado em vez de raspar de novo
+        job, total = await service.executar("full", ao_raspar=lambda vc: None)
+        assert (job.id, job.status, total) == (queued.id, "succeeded", None)
+
+        job, total = await service.executar("full", ao_raspar=lambda vc: None)
+    service.shutdown(wait=True)
+
+    assert (job.status, total) == ("succeeded", 7)
+    assert job.id != queued.id
+    assert mock_scrape.call_count == 2
+    assert "ao_raspar" in mock_scrape.call_args.kwargs
@@ -1,17 +1,22 @@
+import asyncio
 import pytest
-from unittest.mock import patch, MagicMock
-from datetime import datetime
+from unittest.mock import patch, MagicMock, ANY
+from concurrent.futures import Future
+from datetime import datetime, timezone
 from fastapi import BackgroundTasks
 from sqlalchemy.orm import Session
 
-from src.app.service.viticulture_service import obter_dados_viticultura_e_salvar, _save_data_in_background
+from src.app.service.viticulture_service import obter_dados_viticultura_e_salvar, salvar_raspagem_em_streaming, MODO_DELTA
 from src.app.domain.viticulture import ViticulturaCreate, ViticulturaListResponse
 
 # Caminhos para mock
-PATH_RUN_FULL_SCRAPE_SERVICE = "src.app.service.viticulture_service.run_full_scrape"
-PATH_SAVE_BULK_SERVICE = "src.app.service.viticulture_service.save_bulk"
+PATH_ITER_FULL_SCRAPE_SERVICE = "src.app.service.viticulture_service.iter_full_scrape_async"
 PATH_GET_LATEST_SCRAPE_GROUP_SERVICE = "src.app.service.viticulture_service.get_latest_scrape_group"
 PATH_SESSION_LOCAL_SERVICE = "src.app.service.viticulture_service.SessionLocal"
+PATH_GET_STORED_SECTION_KEYS_SERVICE = "src.app.service.viticulture_service.get_stored_section_keys"
+PATH_GET_LATEST_SECTIONS_SERVICE = "src.app.service.viticulture_service.get_latest_sections"
+PATH_GET_SPECIFIC_DATA_SERVICE = "src.app.service.viticulture_service.get_specific_data_from_db"
+PATH_PERSISTENCE_WRITER_SERVICE = "src.app.service.viticulture_service.persistence_writer"
 
 
 @pytest.fixture
@@ -22,12 +27,36 @@ def mock_db_session():
 def mock_background_tasks():
     return MagicMock(spec=BackgroundTasks)
 
-def test_obter_dados_viticultura_successful_scrape(mock_db_session, mock_background_tasks):
+def _gravado(lote):
+    future = Future()
+    future.set_result(len(lote))
+    return future
+
+def _stream(secoes):
+    """Substituto de iter_full_scrape_async que entrega as seções informadas"""
+    async def fake(stored_sections=None, journal=None, on_plan=None):
+        for secao in secoes:
+            yield secao
+    return fake
+
+@pytest.fixture(autouse=True)
+def scrape_jobs(isolated_scrape_jobs):
+    return isolated_scrape_jobs
+
+@pytest.fixture(autouse=True)
+def mock_writer():
+    # Salvamentos vão para o gravador do processo; nos testes unitários nada é gravado
+    with patch(PATH_PERSISTENCE_WRITER_SERVICE) as writer:
+        writer.submit.side_effect = _gravado
+        yield writer
+
+@pytest.mark.asyncio
+async def test_obter_dados_viticultura_successful_scrape(mock_db_session, mock_background_tasks, mock_writer):
     """
     Testa o serviço quando a raspagem ao vivo é bem-sucedida.
-    Verifica se os dados são transformados corretamente e se a tarefa de background é adicionada.
+    Verifica se os dados são transformados corretamente e se o salvamento é enfileirado no gravador.
     """
-    current_time = datetime.utcnow()
+    current_time = datetime.now(timezone.utc)
     mock_scraped_data = [
         {"ano": 2023, "aba": "Produção", "subopcao": "Vinhos de Mesa", "dados": [{"produto": "Tinto", "quantidade": 100}]},
         {"ano": 2023, "aba": "Comercialização", "subopcao": None, "dados": [{"produto": "Suco", "valor": 500}]}
@@ -38,23 +67,21 @@ def test_obter_dados_viticultura_successful_scrape(mock_db_session, mock_backgro
         ViticulturaCreate(ano=2023, aba="Comercialização", subopcao=None, dados=[{"produto": "Suco", "valor": 500}], data_raspagem=current_time)
     ]
 
-    with patch(PATH_RUN_FULL_SCRAPE_SERVICE, return_value=mock_scraped_data) as mock_scrape, \
+    with patch(PATH_ITER_FULL_SCRAPE_SERVICE, side_effect=_stream(mock_scraped_data)) as mock_scrape, \
          patch("src.app.service.viticulture_service.datetime") as mock_datetime:
         
-        mock_datetime.utcnow.return_value = current_time
+        # O serviço marca a raspagem com datetime.now(timezone.utc)
+        mock_datetime.now.return_value = current_time
 
-        resultado = obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks)
+        resultado = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks)
 
-        mock_scrape.assert_called_once_with(output_filepath=None)
-        mock_background_tasks.add_task.assert_called_once()
-        
-        # Verifica o primeiro argumento da chamada a add_task (_save_data_in_background)
-        # e o segundo argumento (a lista de dados que deve ser igual a expected_viticultura_create_list)
-        args, _ = mock_background_tasks.add_task.call_args
-        assert args[0] == _save_data_in_background
+        mock_scrape.assert_called_once_with(stored_sections=None, journal=ANY, on_plan=ANY)
+        mock_writer.submit.assert_called_once()
+        mock_background_tasks.add_task.assert_not_called()
         
-        # Compara os objetos ViticulturaCreate
-        passed_data_to_bg_task = args[1]
+        # Compara os objetos ViticulturaCreate enfileirados (devem ser iguais a expected_viticultura_create_list)
+        args, _ = mock_writer.submit.call_args
+        passed_data_to_bg_task = args[0]
         assert len(passed_data_to_bg_task) == len(expected_viticultura_create_list)
         for i, item in enumerate(passed_data_to_bg_task):
             assert item.ano == expected_viticultura_create_list[i].ano
@@ -65,7 +92,7 @@ def test_obter_dados_viticultura_successful_scrape(mock_db_session, mock_backgro
 
 
         assert isinstance(resultado, ViticulturaListResponse)
-        assert "Embrapa (Raspagem Ao Vivo - Salvamento em Andamento)" in resultado.fonte
+        assert "Embrapa (Raspagem Ao Vivo - Dados Salvos)" in resultado.fonte
         assert len(resultado.dados) == len(mock_scraped_data)
         assert resultado.dados[0].ano == mock_scraped_data[0]["ano"]
         assert resultado.dados[0].aba == mock_scraped_data[0]["aba"]
@@ -73,7 +100,8 @@ def test_obter_dados_viticultura_successful_scrape(mock_db_session, mock_backgro
         assert resultado.dados[0].data_raspagem == current_time
         assert resultado.message is not None and current_time.isoformat() in resultado.message
 
-def test_obter_dados_viticultura_scrape_fails_uses_cache(mock_db_session, mock_background_tasks):
+@pytest.mark.asyncio
+async def test_obter_dados_viticultura_scrape_fails_uses_cache(mock_db_session, mock_background_tasks, mock_writer):
     """
     Testa o serviço quando a raspagem falha e os dados são carregados do cache (mockado).
     """
@@ -82,14 +110,15 @@ def test_obter_dados_viticultura_scrape_fails_uses_cache(mock_db_session, mock_b
         MagicMock(id=1, ano=2022, aba="Cache Produção", subopcao="Cache Vinhos", dados_list_json=[{"p": "Cache Tinto", "q": 200}], data_raspagem=current_time_cache)
     ]
 
-    with patch(PATH_RUN_FULL_SCRAPE_SERVICE, return_value=[]) as mock_scrape, \
+    with patch(PATH_ITER_FULL_SCRAPE_SERVICE, side_effect=_stream([])) as mock_scrape, \
          patch(PATH_GET_LATEST_SCRAPE_GROUP_SERVICE, return_value=mock_cache_db_data) as mock_get_cache:
 
-        resultado = obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks)
+        resultado = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks)
 
-        mock_scrape.assert_called_once_with(output_filepath=None)
+        mock_scrape.assert_called_once_with(stored_sections=None, journal=ANY, on_plan=ANY)
         mock_get_cache.assert_called_once_with(mock_db_session)
         mock_background_tasks.add_task.assert_not_called() # Não deve salvar em background se usou cache
+        mock_writer.submit.assert_not_called()
 
         assert isinstance(resultado, ViticulturaListResponse)
         assert f"Cache (Banco de Dados - Raspagem de {current_time_cache.isoformat()})" in resultado.fonte
@@ -100,16 +129,17 @@ def test_obter_dados_viticultura_scrape_fails_uses_cache(mock_db_session, mock_b
         assert resultado.dados[0].dados == mock_cache_db_data[0].dados_list_json
         assert resultado.dados[0].data_raspagem == current_time_cache
 
-def test_obter_dados_viticultura_scrape_and_cache_fail(mock_db_session, mock_background_tasks):
+@pytest.mark.asyncio
+async def test_obter_dados_viticultura_scrape_and_cache_fail(mock_db_session, mock_background_tasks):
     """
     Testa o serviço quando tanto a raspagem quanto o cache falham.
     """
-    with patch(PATH_RUN_FULL_SCRAPE_SERVICE, return_value=[]) as mock_scrape, \
+    with patch(PATH_ITER_FULL_SCRAPE_SERVICE, side_effect=_stream([])) as mock_scrape, \
          patch(PATH_GET_LATEST_SCRAPE_GROUP_SERVICE, return_value=[]) as mock_get_cache:
 
-        resultado = obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks)
+        resultado = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks)
 
-        mock_scrape.assert_called_once_with(output_filepath=None)
+        mock_scrape.assert_called_once_with(stored_sections=None, journal=ANY, on_plan=ANY)
         mock_get_cache.assert_called_once_with(mock_db_session)
         
         assert isinstance(resultado, ViticulturaListResponse)
@@ -117,43 +147,338 @@ def test_obter_dados_viticultura_scrape_and_cache_fail(mock_db_session, mock_bac
         assert "Raspagem ao vivo não retornou dados. Usando cache do BD se disponível. Cache do BD também está vazio." in resultado.message
         assert len(resultado.dados) == 0
 
-def test_save_data_in_background_success():
+@pytest.mark.asyncio
+async def test_agendar_salvamento_enqueues_on_writer(mock_writer):
     """
-    Testa a função _save_data_in_background em caso de sucesso.
+    Testa _agendar_salvamento: as seções vão para o gravador do processo.
     """
+    from src.app.service.viticulture_service import _agendar_salvamento
     mock_data_to_save = [
         ViticulturaCreate(ano=2023, aba="Teste BG", subopcao=None, dados=[{"d":1}], data_raspagem=datetime.utcnow())
     ]
-    mock_db_instance = MagicMock(spec=Session)
 
-    with patch(PATH_SESSION_LOCAL_SERVICE) as mock_session_local, \
-         patch(PATH_SAVE_BULK_SERVICE) as mock_save_bulk_repo:
-        
-        mock_session_local.return_value = mock_db_instance
-        
-        _save_data_in_background(mock_data_to_save)
+    await _agendar_salvamento(mock_data_to_save)
 
-        mock_session_local.assert_called_once()
-        mock_save_bulk_repo.assert_called_once_with(mock_db_instance, mock_data_to_save)
-        mock_db_instance.close.assert_called_once()
+    mock_writer.submit.assert_called_once_with(mock_data_to_save)
 
-def test_save_data_in_background_exception():
+@pytest.mark.asyncio
+async def test_agendar_salvamento_queue_full_is_logged_not_raised(mock_writer):
     """
-    Testa a função _save_data_in_background quando save_bulk lança uma exceção.
+    Testa _agendar_salvamento quando a fila do gravador continua cheia (contrapressão esgotada).
     """
-    mock_data_to_save = [
+    from src.app.service.persistence_writer import PersistenceQueueFullError
+    from src.app.service.viticulture_service import _agendar_salvamento
+    mock_writer.submit.side_effect = PersistenceQueueFullError("cheia")
+
+    # Não esperamos que uma exceção seja levantada para fora da função, ela deve ser capturada
+    await _agendar_salvamento([
         ViticulturaCreate(ano=2023, aba="Teste BG Exc", subopcao=None, dados=[{"d":1}], data_raspagem=datetime.utcnow())
+    ])
+
+    mock_writer.submit.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_obter_dados_viticultura_delta_mode_merges_stored_sections(mock_db_session, mock_background_tasks, mock_writer):
+    """
+    No modo delta, o scraper recebe as seções já armazenadas e a resposta é
+    completada com as seções que não foram raspadas novamente.
+    """
+    stored_keys = {("Produção", None, 2021), ("Produção", None, 2022)}
+    scraped = [{"ano": 2022, "aba": "Produção", "subopcao": None, "dados": [{"produto": "Tinto", "quantidade": 2}]}]
+    stored_2021 = MagicMock(id=1, ano=2021, aba="Produção", subopcao=None,
+                            dados_list_json=[{"produto": "Tinto", "quantidade": 1}], data_raspagem=datetime(2024, 1, 1))
+    stored_2022 = MagicMock(id=2, ano=2022, aba="Produção", subopcao=None,
+                            dados_list_json=[{"produto": "Tinto", "quantidade": 0}], data_raspagem=datetime(2024, 1, 1))
+
+    with patch(PATH_GET_STORED_SECTION_KEYS_SERVICE, return_value=stored_keys), \
+         patch(PATH_GET_LATEST_SECTIONS_SERVICE, return_value=[stored_2021, stored_2022]), \
+         patch(PATH_ITER_FULL_SCRAPE_SERVICE, side_effect=_stream(scraped)) as mock_scrape:
+        resultado = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks, modo=MODO_DELTA)
+
+    mock_scrape.assert_called_once_with(stored_sections=stored_keys, journal=ANY, on_plan=ANY)
+    assert [(item.ano, item.id) for item in resultado.dados] == [(2022, None), (2021, 1)]
+    assert resultado.dados[0].dados == [{"produto": "Tinto", "quantidade": 2}]
+    mock_writer.submit.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_salvar_raspagem_em_streaming_saves_in_chunks(mock_writer):
+    """A gravação em streaming salva lotes de tamanho fixo pelo gravador e pula seções inalteradas já salvas."""
+    async def fake_stream(stored_sections=None, on_plan=None, **kwargs):
+        for ano in range(2000, 2005):
+            yield {"ano": ano, "aba": "Produção", "subopcao": None, "dados": [{"produto": "Tinto"}], "inalterado": ano == 2000}
+
+    mock_session = MagicMock()
+    with patch(PATH_SESSION_LOCAL_SERVICE, return_value=mock_session), \
+         patch(PATH_GET_STORED_SECTION_KEYS_SERVICE, return_value={("Produção", None, 2000)}), \
+         patch("src.app.service.viticulture_service.iter_full_scrape_async", side_effect=fake_stream):
+        total = await salvar_raspagem_em_streaming(tamanho_lote=3)
+
+    assert total == 4
+    assert [[vc.ano for vc in call.args[0]] for call in mock_writer.submit.call_args_list] == [[2001, 2002, 2003], [2004]]
+    mock_session.close.assert_called_once()
+
+@pytest.fixture
+def swr_mode():
+    from src.app.service import viticulture_service
+    with patch.object(viticulture_service.settings, "VITICULTURA_SERVE_MODE", "swr"), \
+         patch.object(viticulture_service.settings, "VITICULTURA_MAX_AGE_SECONDS", 3600):
+        yield
+
+def _stored_section(data_raspagem):
+    return MagicMock(id=7, ano=2022, aba="Produção", subopcao=None,
+                     dados_list_json=[{"produto": "Tinto"}], data_raspagem=data_raspagem)
+
+@pytest.mark.asyncio
+async def test_swr_serves_stale_data_and_schedules_a_single_refresh(swr_mode, mock_db_session, scrape_jobs):
+    import threading
+    from datetime import timedelta
+    stale = datetime.utcnow() - timedelta(hours=5)
+    liberar, chamadas = threading.Event(), []
+
+    async def atualizacao(modo, **kwargs):
+        chamadas.append(modo)
+        await asyncio.to_thread(liberar.wait, 5)
+        return 0
+
+    with patch(PATH_GET_LATEST_SECTIONS_SERVICE, return_value=[_stored_section(stale)]), \
+         patch("src.app.service.scrape_job_service.salvar_raspagem_em_streaming", side_effect=atualizacao), \
+         patch(PATH_ITER_FULL_SCRAPE_SERVICE) as mock_scrape:
+        first = await obter_dados_viticultura_e_salvar(mock_db_session, MagicMock(spec=BackgroundTasks))
+        second = await obter_dados_viticultura_e_salvar(mock_db_session, MagicMock(spec=BackgroundTasks))
+        job = scrape_jobs.get_active("full")
+        liberar.set()
+        await scrape_jobs.wait(job.id, timeout=5)
+        # Atualização sem seções novas renova a validade dos dados
+        third = await obter_dados_viticultura_e_salvar(mock_db_session, MagicMock(spec=BackgroundTasks))
+
+    mock_scrape.assert_not_called()
+    assert chamadas == ["full"]
+    assert [item.id for item in first.dados] == [7]
+    assert "Stale-While-Revalidate" in first.fonte
+    assert "5h00min" in first.message and "em background: sim" in second.message
+    assert "dentro da validade" in third.message
+
+@pytest.mark.asyncio
+async def test_swr_fresh_data_does_not_refresh(swr_mode, mock_db_session, mock_background_tasks, scrape_jobs):
+    with patch(PATH_GET_LATEST_SECTIONS_SERVICE, return_value=[_stored_section(datetime.utcnow())]):
+        resultado = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks)
+
+    assert scrape_jobs.get_active("full") is None
+    assert "dentro da validade" in resultado.message
+
+@pytest.mark.asyncio
+async def test_swr_with_empty_database_scrapes_live(swr_mode, mock_db_session, mock_background_tasks):
+    scraped = [{"ano": 2023, "aba": "Produção", "subopcao": None, "dados": [{"produto": "Tinto"}]}]
+    with patch(PATH_GET_LATEST_SECTIONS_SERVICE, return_value=[]), \
+         patch(PATH_ITER_FULL_SCRAPE_SERVICE, side_effect=_stream(scraped)) as mock_scrape:
+        resultado = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks)
+
+    mock_scrape.assert_called_once_with(stored_sections=None, journal=ANY, on_plan=ANY)
+    assert resultado.fonte.startswith("Embrapa")
+
+@pytest.mark.asyncio
+async def test_live_pagination_serves_page_from_database_and_scrapes_in_background(mock_db_session, mock_background_tasks, scrape_jobs):
+    """No modo ao vivo, uma página é lida do banco por keyset; só a primeira enfileira a raspagem como job."""
+    liberar = asyncio.Event()
+
+    async def atualizacao(modo, **kwargs):
+        await liberar.wait()
+        return 0
+
+    secoes = [_stored_section(datetime.utcnow()), _stored_section(datetime.utcnow())]
+    with patch(PATH_GET_LATEST_SECTIONS_SERVICE, return_value=secoes) as mock_latest, \
+         patch("src.app.service.scrape_job_service.salvar_raspagem_em_streaming", side_effect=atualizacao), \
+         patch(PATH_ITER_FULL_SCRAPE_SERVICE) as mock_scrape, \
+         patch.object(scrape_jobs, "submit", wraps=scrape_jobs.submit) as mock_submit:
+        primeira = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks, limite=1)
+        job = scrape_jobs.get_active("full")
+        seguinte = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks, apos=(2022, "Produção", "", 7), limite=1)
+        liberar.set()
+        await scrape_jobs.wait(job.id, timeout=5)
+
+    mock_scrape.assert_not_called()
+    assert mock_latest.call_args.kwargs["limit"] == 1
+    assert len(primeira.dados) == 1 and primeira.next_cursor is not None
+    assert f"job {job.id}" in primeira.message
+    mock_submit.assert_called_once_with("full")
+    assert "sem nova raspagem" in seguinte.message
+
+@pytest.mark.asyncio
+async def test_live_pagination_with_empty_database_scrapes_without_building_responses(mock_db_session, mock_background_tasks):
+    """Com o banco vazio, a raspagem grava sem montar as respostas, e a página é lida do banco em seguida."""
+    from src.app.service import viticulture_service
+
+    from src.app.utils.query_cache import bump_data_version
+
+    async def gravar(modo, **kwargs):
+        bump_data_version()  # Como save_bulk após cada gravação confirmada
+        return 1
+
+    gravado = [_stored_section(datetime.utcnow())]
+    leituras = iter([[], gravado])
+    with patch(PATH_GET_LATEST_SECTIONS_SERVICE, side_effect=lambda *a, **k: next(leituras)), \
+         patch("src.app.service.scrape_job_service.salvar_raspagem_em_streaming", side_effect=gravar) as mock_salvar, \
+         patch.object(viticulture_service, "_resposta_ao_vivo") as mock_resposta:
+        resultado = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks, limite=10)
+
+    assert mock_salvar.call_args.kwargs["ao_raspar"] is None
+    mock_resposta.assert_not_called()
+    assert resultado.fonte == "Embrapa (Raspagem Ao Vivo - Página Lida do Banco de Dados)"
+    assert [item.id for item in resultado.dados] == [7]
+    assert resultado.next_cursor is None
+
+@pytest.mark.asyncio
+async def test_buscar_dados_especificos_coalesces_concurrent_overlapping_requests(mock_db_session, mock_writer):
+    """Requisições concorrentes com anos sobrepostos compartilham a raspagem e o salvamento de cada ano."""
+    import asyncio
+    from src.app.service.viticulture_service import buscar_dados_especificos
+
+    chamadas = []
+    liberar = asyncio.Event()
+
+    async def fake_scrape(ano_min, ano_max, opcao, skip_sections=None, on_plan=None):
+        chamadas.append((ano_min, ano_max))
+        await liberar.wait()
+        return [{"ano": ano, "aba": "Produção", "subopcao": None, "dados": [{"produto": "Tinto"}]}
+                for ano in range(ano_min, ano_max + 1)]
+
+    tasks_a, tasks_b = MagicMock(spec=BackgroundTasks), MagicMock(spec=BackgroundTasks)
+    with patch("src.app.service.viticulture_service.run_scrape_by_params_async", side_effect=fake_scrape):
+        async def aguardar_chamadas(n):
+            # A leitura do banco roda em thread antes da raspagem: espera cada requisição começar a raspar
+            while len(chamadas) < n:
+                await asyncio.sleep(0.01)
+
+        primeira = asyncio.create_task(buscar_dados_especificos(mock_db_session, tasks_a, 2010, 2013, "producao"))
+        await asyncio.wait_for(aguardar_chamadas(1), 5)
+        segunda = asyncio.create_task(buscar_dados_especificos(mock_db_session, tasks_b, 2012, 2015, "producao"))
+        await asyncio.wait_for(aguardar_chamadas(2), 5)
+        liberar.set()
+        resultado_a, resultado_b = await asyncio.gather(primeira, segunda)
+
+    assert chamadas == [(2010, 2013), (2014, 2015)]
+    assert [item.ano for item in resultado_a.dados] == [2010, 2011, 2012, 2013]
+    assert [item.ano for item in resultado_b.dados] == [2012, 2013, 2014, 2015]
+    assert sorted([vc.ano for vc in call.args[0]] for call in mock_writer.submit.call_args_list) == [[2010, 2011, 2012, 2013], [2014, 2015]]
+
+@pytest.mark.asyncio
+async def test_buscar_dados_especificos_releases_keys_after_failure(mock_db_session, mock_background_tasks):
+    """Uma raspagem que falha libera as chaves, e a próxima requisição raspa de novo."""
+    from src.app.service import viticulture_service
+
+    with patch("src.app.service.viticulture_service.run_scrape_by_params_async", side_effect=RuntimeError("timeout")), \
+         patch(PATH_GET_SPECIFIC_DATA_SERVICE, return_value=[]):
+        resultado = await viticulture_service.buscar_dados_especificos(mock_db_session, mock_background_tasks, 2010, 2011, "producao")
+
+    assert resultado.fonte == "Falha - Cache do BD Vazio"
+    assert viticulture_service._raspagens_especificas.in_flight() == 0
+
+@pytest.mark.asyncio
+async def test_buscar_dados_especificos_scrapes_only_missing_or_stale_sections(mock_db_session, mock_background_tasks, mock_writer):
+    """Seções atualizadas no banco são reaproveitadas; só as ausentes ou vencidas são raspadas."""
+    from datetime import timedelta
+    from src.app.service.viticulture_service import buscar_dados_especificos
+
+    # Anos dentro da janela de revisão, onde vale DADOS_ESPECIFICOS_MAX_AGE_SECONDS
+    ano = datetime.utcnow().year
+    recente = datetime.utcnow() - timedelta(minutes=5)
+    vencida = datetime.utcnow() - timedelta(days=30)
+    armazenadas = [
+        MagicMock(id=1, ano=ano - 2, aba="producao", subopcao=None, dados_list_json=[{"produto": "Tinto"}], data_raspagem=recente),
+        MagicMock(id=2, ano=ano - 1, aba="producao", subopcao=None, dados_list_json=[{"produto": "Tinto"}], data_raspagem=vencida),
+    ]
+    scraped = [
+        {"ano": ano - 1, "aba": "producao", "subopcao": None, "dados": [{"produto": "Branco"}]},
+        {"ano": ano, "aba": "producao", "subopcao": None, "dados": [{"produto": "Rosé"}]},
     ]
-    mock_db_instance = MagicMock(spec=Session)
 
-    with patch(PATH_SESSION_LOCAL_SERVICE) as mock_session_local, \
-         patch(PATH_SAVE_BULK_SERVICE, side_effect=Exception("DB Error")) as mock_save_bulk_repo:
-        
-        mock_session_local.return_value = mock_db_instance
-        
-        # Não esperamos que uma exceção seja levantada para fora da função, ela deve ser capturada
-        _save_data_in_background(mock_data_to_save)
+    with patch(PATH_GET_LATEST_SECTIONS_SERVICE, return_value=armazenadas) as mock_latest, \
+         patch("src.app.service.viticulture_service.run_scrape_by_params_async", return_value=scraped) as mock_scrape:
+        resultado = await buscar_dados_especificos(mock_db_session, mock_background_tasks, ano - 2, ano, "producao")
+
+    mock_latest.assert_called_once_with(mock_db_session, ano_min=ano - 2, ano_max=ano, opcao="producao", after=None, limit=None)
+    mock_scrape.assert_awaited_once_with(ano - 2, ano, "producao", skip_sections={("producao", None, ano - 2)}, on_plan=ANY)
+    assert [(item.ano, item.id) for item in resultado.dados] == [(ano - 2, 1), (ano - 1, None), (ano, None)]
+    assert "1 seções atualizadas servidas do banco" in resultado.message
+    assert [vc.ano for vc in mock_writer.submit.call_args.args[0]] == [ano - 1, ano]
+
+@pytest.mark.asyncio
+async def test_buscar_dados_especificos_closed_years_stay_fresh_once_stored(mock_db_session, mock_background_tasks, mock_writer):
+    """Anos fechados (fora da janela de revisão) armazenados não vencem: só o ano ausente é raspado."""
+    from datetime import timedelta
+    from src.app.service.viticulture_service import buscar_dados_especificos
+
+    antiga = datetime.utcnow() - timedelta(days=400)
+    armazenadas = [
+        MagicMock(id=ano, ano=ano, aba="producao", subopcao=None, dados_list_json=[{"produto": "Tinto"}], data_raspagem=antiga)
+        for ano in range(1990, 2023)
+    ]
+
+    async def fake_scrape(ano_min, ano_max, opcao, skip_sections=None, on_plan=None):
+        planejadas = [("producao", None, ano) for ano in range(ano_min, ano_max + 1) if ("producao", None, ano) not in skip_sections]
+        on_plan(planejadas)
+        return [{"ano": ano, "aba": "producao", "subopcao": None, "dados": [{"produto": "Tinto"}]} for _, _, ano in planejadas]
+
+    with patch(PATH_GET_LATEST_SECTIONS_SERVICE, return_value=armazenadas), \
+         patch("src.app.service.viticulture_service.run_scrape_by_params_async", side_effect=fake_scrape):
+        resultado = await buscar_dados_especificos(mock_db_session, mock_background_tasks, 1990, 2023, "producao")
+
+    assert [vc.ano for vc in mock_writer.submit.call_args.args[0]] == [2023]
+    assert len(resultado.dados) == 34 and "33 seções atualizadas servidas do banco" in resultado.message
+
+@pytest.mark.asyncio
+async def test_buscar_dados_especificos_planned_years_without_data_fall_back_to_database(mock_db_session, mock_background_tasks, mock_writer):
+    """Anos planejados que a raspagem não trouxe não são tratados como 'tudo atualizado'."""
+    from src.app.service.viticulture_service import buscar_dados_especificos
+
+    ano = datetime.utcnow().year
+    fresca = MagicMock(id=1, ano=ano - 1, aba="producao", subopcao=None, dados_list_json=[{"produto": "Tinto"}], data_raspagem=datetime.utcnow())
+    antiga = MagicMock(id=2, ano=ano, aba="producao", subopcao=None, dados_list_json=[{"produto": "Branco"}], data_raspagem=datetime(2020, 1, 1))
+
+    async def fake_scrape(ano_min, ano_max, opcao, skip_sections=None, on_plan=None):
+        on_plan([("producao", None, ano)])
+        return []
+
+    with patch(PATH_GET_LATEST_SECTIONS_SERVICE, return_value=[fresca]), \
+         patch(PATH_GET_SPECIFIC_DATA_SERVICE, return_value=[fresca, antiga]), \
+         patch("src.app.service.viticulture_service.run_scrape_by_params_async", side_effect=fake_scrape):
+        resultado = await buscar_dados_especificos(mock_db_session, mock_background_tasks, ano - 1, ano, "producao")
+
+    assert resultado.fonte.startswith("Cache")
+    assert [item.id for item in resultado.dados] == [1, 2]
+    assert f"Não foi possível raspar os anos {ano}" in resultado.message
+    assert "atualizadas no banco" not in resultado.message
+    mock_writer.submit.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_buscar_dados_especificos_all_sections_fresh_serves_database(mock_db_session, mock_background_tasks, mock_writer):
+    from src.app.service.viticulture_service import buscar_dados_especificos
+
+    armazenadas = [
+        MagicMock(id=ano, ano=ano, aba="producao", subopcao=None, dados_list_json=[{"produto": "Tinto"}], data_raspagem=datetime.utcnow())
+        for ano in (2020, 2021)
+    ]
+    with patch(PATH_GET_LATEST_SECTIONS_SERVICE, return_value=armazenadas), \
+         patch("src.app.service.viticulture_service.run_scrape_by_params_async", return_value=[]):
+        resultado = await buscar_dados_especificos(mock_db_session, mock_background_tasks, 2020, 2021, "producao")
+
+    assert resultado.fonte.startswith("Cache")
+    assert [item.id for item in resultado.dados] == [2020, 2021]
+    mock_writer.submit.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_repeated_database_fallback_reads_are_served_from_query_cache(mock_db_session, mock_background_tasks):
+    """Leituras repetidas do banco não consultam o repositório de novo até a próxima gravação."""
+    stored = MagicMock(id=1, ano=2022, aba="producao", subopcao=None,
+                       dados_list_json=[{"produto": "Tinto"}], data_raspagem=datetime.utcnow())
+
+    with patch(PATH_ITER_FULL_SCRAPE_SERVICE, side_effect=_stream([])), \
+         patch(PATH_GET_LATEST_SCRAPE_GROUP_SERVICE, return_value=[stored]) as mock_group:
+        primeira = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks)
+        segunda = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks)
+        from src.app.repository.viticulture_repo import save_bulk
+        save_bulk(MagicMock(), [])  # Gravação confirmada (feita pelo gravador) invalida o cache
+        terceira = await obter_dados_viticultura_e_salvar(mock_db_session, mock_background_tasks)
 
-        mock_session_local.assert_called_once()
-        mock_save_bulk_repo.assert_called_once_with(mock_db_instance, mock_data_to_save)
-        mock_db_instance.close.assert_called_once() # Garante que o close é chamado mesmo com erro
\ No newline at end of file
+    assert mock_group.call_count == 2
+    assert [item.id for item in primeira.dados] == [item.id for item in segunda.dados] == [item.id for item in terceira.dados] == [1]
@@ -0,0 +1,152 @@
+import random
+import pytest
+from bs4 import BeautifulSoup
+
+from src.app.scraper.base_scraper import BaseScraper
+
+PRODUCAO_HTML = """
+<html><head><meta charset="utf-8"></head><body>
+<p class="text_center">Produção de vinhos, sucos e derivados do Rio Grande do Sul [2022]</p>
+<table class="tb_base tb_dados">
+  <thead><tr><th>Produto</th><th>Quantidade (L.)</th></tr></thead>
+  <tbody>
+    <tr><td class="tb_item">VINHO DE MESA</td><td class="tb_item">169.762.429</td></tr>
+    <tr><td class="tb_subitem">Tinto</td><td class="tb_subitem">139.320.884</td></tr>
+    <tr><td class="tb_subitem">  Rosado <!-- obs --> </td><td class="tb_subitem">-</td></tr>
+    <tr><td class="tb_item">VINHO  FINO DE MESA (VINIFERA)</td><td class="tb_item">46.268.556</td></tr>
+    <tr><td class="tb_subitem">Branco <b>seco</b></td><td class="tb_subitem">1.234,5</td></tr>
+  </tbody>
+  <tfoot class="tb_total"><tr><td>Total</td><td>457.792.870</td></tr></tfoot>
+</table>
+</body></html>
+"""
+
+PROCESSAMENTO_HTML = """
+<html><body>
+<table class="tb_base tb_dados">
+  <thead><tr><th>Cultivar</th><th>Quantidade (Kg)</th></tr></thead>
+  <tbody>
+    <tr><td class="tb_item">TINTAS</td><td class="tb_item">35.881.118</td></tr>
+    <tr><td class="tb_subitem">Alicante Bouschet</td><td class="tb_subitem">4.108.858</td></tr>
+    <tr><td class="tb_subitem">Ancellota</td><td class="tb_subitem">nd</td></tr>
+    <tr><td colspan="2"><strong>BRANCAS E ROSADAS</strong></td></tr>
+    <tr><td class="tb_subitem">Chardonnay</td><td class="tb_subitem">1.000</td></tr>
+    <tr><td class="tb_subitem">Subtotal</td><td class="tb_subitem">1.000</td></tr>
+  </tbody>
+</table>
+</body></html>
+"""
+
+IMPORTACAO_HTML = """
+<html><body>
+<table class="tb_dados">
+  <tr><th>Países</th><th>Quantidade (Kg)</th><th>Valor (US$)</th></tr>
+  <tr><td>África do Sul</td><td>522.733</td><td>1.732.850</td></tr>
+  <tr><td>Alemanha</td><td>-</td><td>-</td></tr>
+  <tr><td>Argentina</td><td>36.581.423</td><td>107.136.177</td></tr>
+  <tr><td>Total</td><td>1</td><td>2</td></tr>
+</table>
+</body></html>
+"""
+
+LATIN1_HTML = """
+<html><head><meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1"></head><body>
+<table class='tb_dados'><thead><tr><td>Produto</td><td>Quantidade (L.)</td></tr></thead>
+<tbody><tr><td class="tb_item">Suco de uva concentrado</td><td class="tb_item">1.000</td></tr>
+<tr><td>Açúcar</td><td>2</td></tr></tbody></table>
+</body></html>
+""".encode("iso-8859-1")
+
+NO_HEADER_HTML = """
+<html><body><table class="x tb_dados"><tbody>
+<tr><td></td><td></td><td></td></tr>
+<tr><td>a</td><td>1</td><td>2</td></tr>
+</tbody></table></body></html>
+"""
+
+NO_TABLE_HTML = "<html><body><p>Sem dados</p></body></html>"
+
+def _extract_both(content, option_code):
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    scraper = BaseScraper(page_cache=None)
+    legacy = scraper._extract_table_data(BeautifulSoup(content, "lxml"), "http://teste", option_code)
+    fast = scraper._extract_table_data_lxml(content, "http://teste", option_code)
+    return legacy, fast
+
+@pytest.mark.parametrize("content,option_code", [
+    (PRODUCAO_HTML, "opt_02"),
+    (PRODUCAO_HTML, "opt_04"),
+    (PROCESSAMENTO_HTML, "opt_03"),
+    (IMPORTACAO_HTML, "opt_05"),
+    (IMPORTACAO_HTML, "opt_06"),
+    (LATIN1_HTML, "opt_02"),
+    (NO_HEADER_HTML, "opt_02"),
+    (NO_TABLE_HTML, "opt_02"),
+])
+def test_lxml_extraction_matches_beautifulsoup(content, option_code):
+    legacy, fast = _extract_both(content, option_code)
+    assert fast == legacy
+
+def test_lxml_extraction_keeps_categories_and_units():
+    _, fast = _extract_both(PRODUCAO_HTML, "opt_02")
+    assert fast[1] == {
+        "produto": "Tinto",
+        "quantidade": 139320884.0,
+        "unidade_quantidade": "l",
+        "categoria_tabela": "VINHO DE MESA",
+    }
+    assert fast[2]["produto"] == "Rosado"
+    assert fast[4]["produto"] == "Brancoseco"
+
+def _random_table(rng):
+    classes = ["tb_item", "tb_subitem", ""]
+    headers = rng.choice([
+        ["Produto", "Quantidade (L.)"],
+        ["Países", "Quantidade (Kg)", "Valor (US$)"],
+        ["Cultivar", "Quantidade (Kg)"],
+    ])
+    rows = []
+    for _ in range(rng.randint(0, 25)):
+        kind = rng.random()
+        if kind < 0.1:
+            rows.append(f'<tr><td colspan="{len(headers)}"><strong>CATEGORIA {rng.randint(1, 9)}</strong></td></tr>')
+        elif kind < 0.15:
+            rows.append("<tr><td>Total</td>" + "<td>1</td>" * (len(headers) - 1) + "</tr>")
+        elif kind < 0.2:
+            rows.append("<tr><th>só th</th></tr>")
+        else:
+            cls = rng.choice(classes)
+            cells = [f'<td class="{cls}">Item {rng.randint(1, 99)}</td>']
+            for _ in range(rng.randint(1, len(headers))):
+                value = rng.choice(["-", "", "1.234", "12,5", "nd", f"{rng.randint(0, 10**6):,}".replace(",", ".")])
+                cells.append(f'<td class="{cls}">{value}</td>')
+            rows.append("<tr>" + "".join(cells) + "</tr>")
+    thead = "<thead><tr>" + "".join(f"<th>{h}</th>" for h in headers) + "</tr></thead>"
+    return f'<html><body><table class="tb_base tb_dados">{thead}<tbody>{"".join(rows)}</tbody></table></body></html>'
+
+def test_lxml_extraction_matches_beautifulsoup_on_generated_tables():
+    rng = random.Random(1970)
+    for _ in range(200):
+        html = _random_table(rng)
+        option_code = rng.choice(["opt_02", "opt_03", "opt_04", "opt_05", "opt_06"])
+        legacy, fast = _extract_both(html, option_code)
+        assert fast == legacy, html
+
+def test_column_plan_is_compiled_once_per_header_set():
+    from src.app.scraper.column_plan import compile_column_plan
+
+    plan = compile_column_plan(["paises", "quantidade_kg", "valor_us"], "opt_05")
+    assert plan is compile_column_plan(["paises", "quantidade_kg", "valor_us"], "opt_05")
+    assert [(c.key, c.unit_key, c.unit, c.numeric) for c in plan.columns] == [
+        ("paises", None, None, False),
+        ("quantidade", "unidade_quantidade", "kg", True),
+        ("valor", "unidade_valor", "us", True),
+    ]
+    assert plan.build_row(["Chile", "1.000", "-", "extra"]) == {
+        "paises": "Chile",
+        "quantidade": 1000.0,
+        "unidade_quantidade": "kg",
+        "valor": None,
+        "unidade_valor": "us",
+    }
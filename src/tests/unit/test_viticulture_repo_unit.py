@@ -11,97 +11,340 @@ from datetime import datetime
 def mock_db_session():
     return MagicMock(spec=Session)
 
-def test_save_bulk_success(mock_db_session):
+def test_save_bulk_success(sqlite_session):
     current_time = datetime.utcnow()
     data_to_save = [
         ViticulturaCreate(ano=2023, aba="Aba1", subopcao="Sub1", dados=[{"d":1}], data_raspagem=current_time),
         ViticulturaCreate(ano=2024, aba="Aba2", subopcao=None, dados=[{"d":2}], data_raspagem=current_time)
     ]
 
-    viticulture_repo.save_bulk(mock_db_session, data_to_save)
-
-    assert mock_db_session.add_all.call_count == 1
-    
-    # Verificar os objetos passados para add_all
-    args_add_all, _ = mock_db_session.add_all.call_args
-    list_of_db_models = args_add_all[0]
-    assert len(list_of_db_models) == len(data_to_save)
-    for i, db_model in enumerate(list_of_db_models):
-        assert isinstance(db_model, ViticulturaModel)
-        assert db_model.ano == data_to_save[i].ano
-        assert db_model.aba == data_to_save[i].aba
-        assert db_model.subopcao == data_to_save[i].subopcao
-        assert db_model.dados_list_json == data_to_save[i].dados
-        assert db_model.data_raspagem == data_to_save[i].data_raspagem
-        
-    mock_db_session.commit.assert_called_once()
-    assert mock_db_session.refresh.call_count == len(data_to_save) # refresh é chamado para cada item
-
-def test_save_bulk_db_error(mock_db_session):
+    with patch.object(sqlite_session, "refresh") as refresh, patch.object(sqlite_session, "add_all") as add_all:
+        assert viticulture_repo.save_bulk(sqlite_session, data_to_save) is None
+
+    # Gravação em INSERTs de várias linhas, sem ORM nem refresh por linha
+    add_all.assert_not_called()
+    refresh.assert_not_called()
+    saved = sqlite_session.query(ViticulturaModel).order_by(ViticulturaModel.id).all()
+    assert len(saved) == len(data_to_save)
+    for db_model, data in zip(saved, data_to_save):
+        assert db_model.ano == data.ano
+        assert db_model.aba == data.aba
+        assert db_model.subopcao == data.subopcao
+        assert db_model.dados_list_json == data.dados
+        assert db_model.data_raspagem == data.data_raspagem
+
+def test_save_bulk_returns_ids_in_input_order_when_requested(sqlite_session):
+    current_time = datetime.utcnow()
+    data_to_save = [
+        ViticulturaCreate(ano=ano, aba="producao", subopcao=None, dados=[{"produto": "Tinto", "quantidade": float(ano)}], data_raspagem=current_time)
+        for ano in (2024, 2022, 2023)
+    ]
+
+    ids = viticulture_repo.save_bulk(sqlite_session, data_to_save, batch_size=2, return_ids=True)
+
+    assert [sqlite_session.get(ViticulturaModel, item_id).ano for item_id in ids] == [2024, 2022, 2023]
+    assert viticulture_repo.save_bulk(sqlite_session, [], return_ids=True) == []
+
+def test_save_bulk_db_error(sqlite_session):
     current_time = datetime.utcnow()
     data_to_save = [
         ViticulturaCreate(ano=2023, aba="AbaError", subopcao="SubErr", dados=[{"e":1}], data_raspagem=current_time)
     ]
-    mock_db_session.commit.side_effect = Exception("DB Commit Error")
 
-    with pytest.raises(Exception, match="DB Commit Error"):
-        viticulture_repo.save_bulk(mock_db_session, data_to_save)
+    with patch.object(sqlite_session, "commit", side_effect=Exception("DB Commit Error")) as commit, \
+            patch.object(sqlite_session, "rollback", wraps=sqlite_session.rollback) as rollback:
+        with pytest.raises(Exception, match="DB Commit Error"):
+            viticulture_repo.save_bulk(sqlite_session, data_to_save)
 
-    mock_db_session.add_all.assert_called_once()
-    mock_db_session.commit.assert_called_once()
-    mock_db_session.rollback.assert_called_once()
-    mock_db_session.refresh.assert_not_called() # Não deve chamar refresh se o commit falhou
+    commit.assert_called_once()
+    rollback.assert_called_once()
+    assert sqlite_session.query(ViticulturaModel).count() == 0
 
-def test_get_latest_scrape_group_data_exists(mock_db_session):
+def test_get_latest_scrape_group_data_exists(sqlite_session):
     timestamp1 = datetime(2023, 1, 1, 10, 0, 0)
     timestamp2 = datetime(2023, 1, 1, 12, 0, 0) # Mais recente
-    
-    mock_data_group1 = [ViticulturaModel(id=1, data_raspagem=timestamp1)]
-    mock_data_group2 = [
-        ViticulturaModel(id=2, data_raspagem=timestamp2, ano=2023, aba="Recente1", dados_list_json=[{}]),
-        ViticulturaModel(id=3, data_raspagem=timestamp2, ano=2023, aba="Recente2", dados_list_json=[{}])
-    ]
 
-    # Mock para func.max(ViticulturaModel.data_raspagem)
-    mock_query_max = MagicMock()
-    mock_db_session.query(func.max(ViticulturaModel.data_raspagem)).scalar.return_value = timestamp2
-    
-    # Mock para a query que busca os dados com o timestamp mais recente
-    mock_query_filter = MagicMock()
-    mock_db_session.query(ViticulturaModel).filter(ViticulturaModel.data_raspagem == timestamp2).all.return_value = mock_data_group2
+    viticulture_repo.save_bulk(sqlite_session, [
+        ViticulturaCreate(ano=2023, aba="Recente1", dados=[{"v": 1}], data_raspagem=timestamp1),
+        ViticulturaCreate(ano=2023, aba="Antiga", dados=[{"v": 1}], data_raspagem=timestamp1),
+    ])
+    # Gravação parcial mais recente: não esconde as seções que ela não regravou
+    viticulture_repo.save_bulk(sqlite_session, [
+        ViticulturaCreate(ano=2023, aba="Recente1", dados=[{"v": 2}], data_raspagem=timestamp2),
+        ViticulturaCreate(ano=2023, aba="Recente2", dados=[{"v": 2}], data_raspagem=timestamp2),
+    ])
 
-    result = viticulture_repo.get_latest_scrape_group(mock_db_session)
+    result = viticulture_repo.get_latest_scrape_group(sqlite_session)
 
-    mock_db_session.query(func.max(ViticulturaModel.data_raspagem)).scalar.assert_called_once()
-    mock_db_session.query(ViticulturaModel).filter(ViticulturaModel.data_raspagem == timestamp2).all.assert_called_once()
-    
-    assert len(result) == 2
-    assert result == mock_data_group2
+    assert sorted((item.aba, item.data_raspagem) for item in result) == [
+        ("Antiga", timestamp1), ("Recente1", timestamp2), ("Recente2", timestamp2)
+    ]
+    assert viticulture_repo.get_latest_scrape_timestamp(sqlite_session) == timestamp2
+
+def test_get_latest_scrape_group_ignores_older_version_saved_later(sqlite_session):
+    viticulture_repo.save_bulk(sqlite_session, [ViticulturaCreate(ano=2023, aba="producao", dados=[{"v": 2}], data_raspagem=datetime(2024, 2, 1))])
+    viticulture_repo.save_bulk(sqlite_session, [ViticulturaCreate(ano=2023, aba="producao", dados=[{"v": 1}], data_raspagem=datetime(2024, 1, 1))])
 
-def test_get_latest_scrape_group_no_data(mock_db_session):
-    mock_db_session.query(func.max(ViticulturaModel.data_raspagem)).scalar.return_value = None
+    assert [item.dados_list_json for item in viticulture_repo.get_latest_scrape_group(sqlite_session)] == [[{"v": 2}]]
 
-    result = viticulture_repo.get_latest_scrape_group(mock_db_session)
+def test_get_latest_scrape_group_no_data(sqlite_session):
+    result = viticulture_repo.get_latest_scrape_group(sqlite_session)
 
-    mock_db_session.query(func.max(ViticulturaModel.data_raspagem)).scalar.assert_called_once()
-    mock_db_session.query(ViticulturaModel).filter().all.assert_not_called() # Não deve tentar buscar se não há timestamp
     assert result == []
+    assert viticulture_repo.get_latest_scrape_timestamp(sqlite_session) is None
 
-def test_get_latest_scrape_group_db_error_on_max(mock_db_session):
-    mock_db_session.query(func.max(ViticulturaModel.data_raspagem)).scalar.side_effect = Exception("Error fetching max timestamp")
+def test_get_latest_scrape_group_db_error(mock_db_session):
+    mock_db_session.query.side_effect = Exception("Error fetching data")
 
-    with pytest.raises(Exception, match="Error fetching max timestamp"):
+    with pytest.raises(Exception, match="Error fetching data"):
         viticulture_repo.get_latest_scrape_group(mock_db_session)
-    
-    mock_db_session.query(func.max(ViticulturaModel.data_raspagem)).scalar.assert_called_once()
 
-def test_get_latest_scrape_group_db_error_on_filter(mock_db_session):
-    timestamp_latest = datetime(2023, 1, 1, 12, 0, 0)
-    mock_db_session.query(func.max(ViticulturaModel.data_raspagem)).scalar.return_value = timestamp_latest
-    mock_db_session.query(ViticulturaModel).filter(ViticulturaModel.data_raspagem == timestamp_latest).all.side_effect = Exception("Error fetching data")
+def test_orm_inserts_and_rebuild_maintain_current_sections(sqlite_session):
+    from src.app.models.viticulture import ViticulturaAtual
+    sqlite_session.add_all([
+        ViticulturaModel(ano=2022, aba="producao", subopcao="Tintos", dados_list_json=[], data_raspagem=datetime(2024, 1, 1)),
+        ViticulturaModel(ano=2022, aba="producao", subopcao="Tintos", dados_list_json=[{"v": 1}], data_raspagem=datetime(2024, 2, 1)),
+    ])
+    sqlite_session.commit()
 
-    with pytest.raises(Exception, match="Error fetching data"):
-        viticulture_repo.get_latest_scrape_group(mock_db_session)
+    atual = sqlite_session.query(ViticulturaAtual).one()
+    assert (atual.subopcao_key, atual.option_code, atual.data_raspagem) == ("tintos", "opt_02", datetime(2024, 2, 1))
+
+    sqlite_session.query(ViticulturaAtual).delete()
+    sqlite_session.commit()
+    assert viticulture_repo.rebuild_current_sections(sqlite_session) == 1
+    assert [item.dados_list_json for item in viticulture_repo.get_latest_sections(sqlite_session, opcao="producao")] == [[{"v": 1}]]
+
+def test_rebuild_current_sections_fixes_pointers_in_place(sqlite_session):
+    from sqlalchemy import event, text
+    from src.app.models.viticulture import ViticulturaAtual
+    viticulture_repo.save_bulk(sqlite_session, [
+        ViticulturaCreate(ano=2021, aba="producao", dados=[{"v": 1}], data_raspagem=datetime(2024, 1, 1)),
+        ViticulturaCreate(ano=2021, aba="producao", dados=[{"v": 2}], data_raspagem=datetime(2024, 2, 1)),
+        ViticulturaCreate(ano=2022, aba="producao", dados=[{"v": 3}], data_raspagem=datetime(2024, 1, 1)),
+    ])
+    antiga = sqlite_session.query(ViticulturaModel).filter_by(ano=2021).order_by(ViticulturaModel.data_raspagem).first()
+    # Ponteiro desatualizado (2021) e seção sem versões no histórico (2022)
+    sqlite_session.query(ViticulturaAtual).filter_by(ano=2021).update({"viticultura_id": antiga.id, "data_raspagem": antiga.data_raspagem})
+    sqlite_session.query(ViticulturaModel).filter_by(ano=2022).delete()
+    sqlite_session.commit()
+
+    instrucoes = []
+    def registrar(conn, cursor, statement, *args):
+        instrucoes.append(" ".join(statement.split()))
+    event.listen(sqlite_session.get_bind(), "before_cursor_execute", registrar)
+    try:
+        assert viticulture_repo.rebuild_current_sections(sqlite_session) == 1
+    finally:
+        event.remove(sqlite_session.get_bind(), "before_cursor_execute", registrar)
+
+    assert [item.dados_list_json for item in viticulture_repo.get_latest_sections(sqlite_session)] == [[{"v": 2}]]
+    # Sem esvaziar a tabela antes de regravar: só os ponteiros órfãos são removidos
+    assert not [sql for sql in instrucoes if sql.startswith("DELETE FROM viticultura_atual") and "WHERE" not in sql]
+
+@pytest.fixture
+def sqlite_session():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from src.app.config.database import Base
+    from src.app.models.viticulture import ViticulturaAtual, ViticulturaConteudo, ViticulturaFato
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[ViticulturaConteudo.__table__, ViticulturaModel.__table__, ViticulturaAtual.__table__, ViticulturaFato.__table__])
+    session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+def test_build_fact_rows_normalizes_table_rows():
+    fatos = viticulture_repo.build_fact_rows([
+        {"paises": "Alemanha", "quantidade": 1200.0, "unidade_quantidade": "kg", "valor": 3500.0, "unidade_valor": "us", "categoria_tabela": None},
+        {"paises": "Angola", "quantidade": "nd", "valor": None},
+    ])
+
+    assert [(f["item_tipo"], f["item"], f["quantidade"], f["valor"]) for f in fatos] == [
+        ("paises", "Alemanha", 1200.0, 3500.0),
+        ("paises", "Angola", None, None),
+    ]
+    assert fatos[0]["unidade_quantidade"] == "kg"
+
+def test_save_bulk_writes_facts_and_yearly_totals_use_latest_scrape(sqlite_session):
+    antiga, nova = datetime(2024, 1, 1), datetime(2024, 2, 1)
+    viticulture_repo.save_bulk(sqlite_session, [
+        ViticulturaCreate(ano=2021, aba="producao", subopcao=None, dados=[{"produto": "Tinto", "quantidade": 10.0}, {"produto": "Branco", "quantidade": 5.0}], data_raspagem=antiga),
+        ViticulturaCreate(ano=2022, aba="producao", subopcao=None, dados=[{"produto": "Tinto", "quantidade": 7.0}], data_raspagem=antiga),
+        ViticulturaCreate(ano=2022, aba="exportacao", subopcao=None, dados=[{"paises": "Chile", "quantidade": 99.0}], data_raspagem=antiga),
+    ])
+    # Nova raspagem de 2022 substitui a anterior nos totais
+    viticulture_repo.save_bulk(sqlite_session, [
+        ViticulturaCreate(ano=2022, aba="producao", subopcao=None, dados=[{"produto": "Tinto", "quantidade": 8.0}], data_raspagem=nova),
+    ])
+
+    assert viticulture_repo.get_yearly_totals_by_option(sqlite_session, "producao", 2020) == [(2021, 15.0), (2022, 8.0)]
+    assert viticulture_repo.get_yearly_totals_by_option(sqlite_session, "producao", 2022) == [(2022, 8.0)]
+
+def test_yearly_totals_read_fact_measures_from_covering_index(sqlite_session):
+    from sqlalchemy import text
+
+    plano = " ".join(
+        str(linha[-1]) for linha in sqlite_session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT sum(coalesce(quantidade, valor)) FROM viticultura_fatos WHERE conteudo_id = 1"
+        ))
+    )
+    assert "COVERING INDEX ix_viticultura_fatos_conteudo_medidas" in plano
+
+def test_save_bulk_stores_unchanged_content_once(sqlite_session):
+    from src.app.models.viticulture import ViticulturaConteudo, ViticulturaFato
+    dados = [{"produto": "Tinto", "quantidade": 10.0}]
+    for data_raspagem in (datetime(2024, 1, 1), datetime(2024, 2, 1)):
+        viticulture_repo.save_bulk(sqlite_session, [
+            ViticulturaCreate(ano=2021, aba="producao", subopcao=None, dados=dados, data_raspagem=data_raspagem),
+            ViticulturaCreate(ano=2022, aba="producao", subopcao=None, dados=[{"quantidade": 10.0, "produto": "Tinto"}], data_raspagem=data_raspagem),
+        ])
+
+    # Quatro versões de seção, um único conteúdo (mesmo JSON canônico) e seus fatos
+    versoes = sqlite_session.query(ViticulturaModel).order_by(ViticulturaModel.id).all()
+    assert len(versoes) == 4
+    assert {versao.conteudo_id for versao in versoes} == {sqlite_session.query(ViticulturaConteudo.id).scalar()}
+    assert all(versao.dados_list_json == dados and versao.dados_inline is None for versao in versoes)
+    assert sqlite_session.query(ViticulturaFato).count() == 1
+    assert viticulture_repo.get_yearly_totals_by_option(sqlite_session, "producao", 2020) == [(2021, 10.0), (2022, 10.0)]
+
+def test_backfill_content_store_moves_inline_sections(sqlite_session):
+    from src.app.models.viticulture import ViticulturaConteudo, ViticulturaFato
+    sqlite_session.add_all([
+        ViticulturaModel(ano=2020, aba="producao", subopcao=None, dados_list_json=[{"produto": "Tinto", "quantidade": 3.0}], data_raspagem=datetime(2024, 1, 1)),
+        ViticulturaModel(ano=2020, aba="producao", subopcao=None, dados_list_json=[{"produto": "Tinto", "quantidade": 3.0}], data_raspagem=datetime(2024, 2, 1)),
+        ViticulturaModel(ano=2021, aba="producao", subopcao=None, dados_list_json=[], data_raspagem=datetime(2024, 1, 1)),
+    ])
+    sqlite_session.commit()
+
+    assert viticulture_repo.backfill_content_store(sqlite_session, batch_size=1) == 3
+    assert sqlite_session.query(ViticulturaConteudo).count() == 2
+    assert sqlite_session.query(ViticulturaFato).count() == 1
+    assert sqlite_session.query(ViticulturaModel).filter(ViticulturaModel.dados_inline.isnot(None)).count() == 0
+    assert [versao.dados_list_json for versao in sqlite_session.query(ViticulturaModel).order_by(ViticulturaModel.id)] == [
+        [{"produto": "Tinto", "quantidade": 3.0}], [{"produto": "Tinto", "quantidade": 3.0}], []
+    ]
+    assert viticulture_repo.backfill_content_store(sqlite_session) == 0
+
+def test_save_bulk_stores_option_code_and_exact_lookup_by_option(sqlite_session):
+    viticulture_repo.save_bulk(sqlite_session, [
+        ViticulturaCreate(ano=2022, aba="producao", subopcao=None, dados=[], data_raspagem=datetime(2024, 1, 1)),
+        ViticulturaCreate(ano=2022, aba="processamento", subopcao="Viníferas", dados=[], data_raspagem=datetime(2024, 1, 1)),
+    ])
+
+    item = sqlite_session.query(ViticulturaModel).filter_by(aba="processamento").one()
+    assert (item.option_code, item.subopcao_key) == ("opt_03", "viniferas")
+    # 'Produção', 'producao' e 'opt_02' são a mesma opção; nomes não reconhecidos usam busca parcial pela aba
+    assert [r.aba for r in viticulture_repo.get_specific_data_from_db(sqlite_session, 2020, 2023, "Produção")] == ["producao"]
+    assert [r["aba"] for r in viticulture_repo.get_all_data_by_option(sqlite_session, "opt_02", 2020)] == ["producao"]
+    assert [r.aba for r in viticulture_repo.get_specific_data_from_db(sqlite_session, 2020, 2023, "process")] == ["processamento"]
+
+def test_lookup_by_option_keeps_sections_with_unrecognized_aba(sqlite_session):
+    from sqlalchemy import text
+    viticulture_repo.save_bulk(sqlite_session, [
+        ViticulturaCreate(ano=2022, aba="producao", subopcao=None, dados=[{"v": 1}], data_raspagem=datetime(2024, 1, 1)),
+        ViticulturaCreate(ano=2021, aba="producao_historica", subopcao=None, dados=[{"v": 2}], data_raspagem=datetime(2024, 1, 1)),
+    ])
+    # Seção legada ainda não examinada pelo backfill
+    sqlite_session.execute(text(
+        "INSERT INTO viticultura_data (ano, aba, subopcao_key, dados_list_json, data_raspagem) "
+        "VALUES (2020, 'producao_antiga', '', '[]', '2024-01-01 00:00:00')"
+    ))
+    sqlite_session.commit()
+
+    assert sqlite_session.query(ViticulturaModel.option_code).filter_by(aba="producao_historica").scalar() == viticulture_repo.OPCAO_NAO_RECONHECIDA
+    # A busca pelo nome da aba, usada antes do option_code, continua encontrando essas seções
+    encontradas = viticulture_repo.get_specific_data_from_db(sqlite_session, 2019, 2023, "producao")
+    assert sorted(r.aba for r in encontradas) == ["producao", "producao_antiga", "producao_historica"]
+    assert sorted(r["aba"] for r in viticulture_repo.get_all_data_by_option(sqlite_session, "producao", 2019)) == ["producao", "producao_antiga", "producao_historica"]
+
+def test_backfill_option_codes_and_upgrade_schema_cover_legacy_rows():
+    from sqlalchemy import inspect, text
+    from sqlalchemy.orm import sessionmaker
+    from src.app.config.database import build_engine, upgrade_schema
+
+    engine = build_engine("sqlite://", profile="auto")  # Com foreign_keys=ON
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE viticultura_data (id INTEGER PRIMARY KEY, ano INTEGER NOT NULL, aba VARCHAR NOT NULL, "
+            "subopcao VARCHAR, dados_list_json JSON NOT NULL, data_raspagem DATETIME NOT NULL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO viticultura_data (ano, aba, subopcao, dados_list_json, data_raspagem) VALUES "
+            "(2021, 'exportacao', 'Vinhos de mesa', '[]', '2024-01-01 00:00:00'), "
+            "(2022, 'exportacao', 'Vinhos de mesa', '[]', '2024-01-01 00:00:00'), "
+            "(2022, 'desconhecida', NULL, '[]', '2024-01-01 00:00:00')"
+        ))
+
+    from src.app.models.viticulture import ViticulturaAtual, ViticulturaConteudo
+    ViticulturaConteudo.__table__.create(bind=engine)
+    ViticulturaAtual.__table__.create(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO viticultura_atual (aba, subopcao_key, ano, viticultura_id, data_raspagem) "
+            "VALUES ('exportacao', 'vinhos_de_mesa', 2021, 1, '2024-01-01 00:00:00')"
+        ))
+    upgrade_schema([ViticulturaModel.__table__], bind=engine)
+    upgrade_schema([ViticulturaModel.__table__], bind=engine)  # Idempotente
+    indices = {ix["name"] for ix in inspect(engine).get_indexes("viticultura_data")}
+    assert "ix_viticultura_data_option_ano_raspagem" in indices
+    colunas = {coluna["name"]: coluna for coluna in inspect(engine).get_columns("viticultura_data")}
+    assert colunas["dados_list_json"]["nullable"] and "conteudo_id" in colunas
+    # A recriação da tabela mantém as chaves estrangeiras das outras tabelas apontando para ela
+    assert [fk["referred_table"] for fk in inspect(engine).get_foreign_keys("viticultura_atual")] == ["viticultura_data"]
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA foreign_keys")).scalar() == 1
+
+    session = sessionmaker(bind=engine)()
+    try:
+        assert viticulture_repo.backfill_option_codes(session) == 2
+        linhas = session.query(ViticulturaModel.aba, ViticulturaModel.option_code, ViticulturaModel.subopcao_key).order_by(ViticulturaModel.id).all()
+        assert linhas == [
+            ("exportacao", "opt_06", "vinhos_de_mesa"),
+            ("exportacao", "opt_06", "vinhos_de_mesa"),
+            ("desconhecida", "", ""),
+        ]
+        # Abas não reconhecidas ficam marcadas: a próxima execução não encontra nada a examinar
+        assert session.query(ViticulturaModel).filter(ViticulturaModel.option_code.is_(None)).count() == 0
+        assert viticulture_repo.backfill_option_codes(session) == 0
+        assert viticulture_repo.backfill_content_store(session) == 3
+    finally:
+        session.close()
+        engine.dispose()
+
+def test_keyset_pagination_orders_on_subopcao_key_with_covering_index(sqlite_session):
+    from sqlalchemy import text
+    from src.app.utils.pagination import cursor_key, encode_cursor, decode_cursor, split_page
+
+    viticulture_repo.save_bulk(sqlite_session, [
+        ViticulturaCreate(ano=2023, aba="comercializacao", subopcao=None, dados=[{"v": 1}], data_raspagem=datetime(2024, 1, 1)),
+        ViticulturaCreate(ano=2023, aba="processamento", subopcao="Tintas", dados=[{"v": 2}], data_raspagem=datetime(2024, 1, 1)),
+        ViticulturaCreate(ano=2023, aba="processamento", subopcao="Brancas e Rosadas", dados=[{"v": 3}], data_raspagem=datetime(2024, 1, 1)),
+    ])
+
+    paginas, after = [], None
+    while True:
+        linhas = viticulture_repo.get_latest_scrape_group(sqlite_session, after=after, limit=1)
+        pagina, cursor = split_page(linhas, 1)
+        paginas.extend(pagina)
+        if cursor is None:
+            break
+        after = decode_cursor(cursor)
+
+    # A ordem do banco (subopcao_key) coincide com a chave dos cursores
+    assert [item.subopcao for item in paginas] == [None, "Brancas e Rosadas", "Tintas"]
+    assert [cursor_key(item) for item in paginas] == sorted(cursor_key(item) for item in paginas)
+    assert decode_cursor(encode_cursor(paginas[1]))[2] == paginas[1].subopcao_key
 
-    mock_db_session.query(func.max(ViticulturaModel.data_raspagem)).scalar.assert_called_once()
-    mock_db_session.query(ViticulturaModel).filter(ViticulturaModel.data_raspagem == timestamp_latest).all.assert_called_once()
\ No newline at end of file
+    plano = " ".join(
+        str(linha[-1]) for linha in sqlite_session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM viticultura_data "
+            "WHERE (ano, aba, subopcao_key, id) > (2023, 'processamento', '', 0) "
+            "ORDER BY ano, aba, subopcao_key, id LIMIT 2"
+        ))
+    )
+    assert "ix_viticultura_data_keyset" in plano
+    assert "TEMP B-TREE" not in plano